@@ -0,0 +1,80 @@
+"""
+Clocks the render loop samples once per frame. A reading has the time since the epoch, which fades are
+measured in, and the time of day the schedule is evaluated at.
+
+Readings come from a monotonic source, the wall clock is only consulted now and then to follow time zone
+changes and clock adjustments, so a frame costs no datetime arithmetic.
+"""
+from collections import namedtuple
+import datetime
+import time
+
+SECONDS_IN_DAY = 24 * 60 * 60
+
+ClockReading = namedtuple('ClockReading', ['seconds', 'seconds_into_day'])
+
+
+class RealClock(object):
+    def __init__(self, monotonic=time.monotonic, resync_interval: float = 60.0):
+        """
+        :param resync_interval: seconds between looks at the wall clock for the time of day
+        """
+        self.monotonic = monotonic
+        self.resync_interval = resync_interval
+
+        start = monotonic()
+        # seconds only ever move with the monotonic source, so fades never jump
+        self._epoch_offset = time.time() - start
+        self._resync(start)
+
+    def _resync(self, monotonic: float):
+        now = datetime.datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        self._day_offset = (now - midnight).total_seconds() - monotonic
+        self._resync_at = monotonic + self.resync_interval
+
+    def sample(self) -> ClockReading:
+        monotonic = self.monotonic()
+        if monotonic >= self._resync_at:
+            self._resync(monotonic)
+
+        return ClockReading(monotonic + self._epoch_offset, (monotonic + self._day_offset) % SECONDS_IN_DAY)
+
+
+class WarpedClock(object):
+    def __init__(self, clock, speedup_factor: float, start: ClockReading = None):
+        """
+        Fast mode: the time of day runs speedup_factor times faster than the clock from start on,
+        on top of the normal passing of time. The seconds are the clock's.
+
+        :param start: reading of clock to warp from, now by default
+        """
+        self.clock = clock
+        self.speedup_factor = speedup_factor
+        self.start = start if start is not None else clock.sample()
+
+    def sample(self) -> ClockReading:
+        reading = self.clock.sample()
+        elapsed = reading.seconds - self.start.seconds
+
+        return ClockReading(
+            reading.seconds,
+            (self.start.seconds_into_day + elapsed * (1 + self.speedup_factor)) % SECONDS_IN_DAY,
+        )
+
+
+class SimulatedClock(object):
+    def __init__(self, seconds_into_day: float = 0.0, seconds: float = 0.0):
+        """
+        Only moves when advanced, for stepping through a day in tests and simulations
+        """
+        self.seconds = seconds
+        self.seconds_into_day = seconds_into_day % SECONDS_IN_DAY
+
+    def advance(self, seconds: float):
+        self.seconds += seconds
+        self.seconds_into_day = (self.seconds_into_day + seconds) % SECONDS_IN_DAY
+
+    def sample(self) -> ClockReading:
+        return ClockReading(self.seconds, self.seconds_into_day)
@@ -1,21 +1,28 @@
+from collections import namedtuple
 from typing import Tuple, List
 
 from lib.utils import interpolate_value, generate_ratios
 
 
-class Color(object):
-    def __init__(self, red: int, green: int, blue: int):
-        self._validate_color(red)
-        self._validate_color(green)
-        self._validate_color(blue)
+class Color(namedtuple('Color', ['red', 'green', 'blue'])):
+    """
+    Immutable 8 bit RGB color. Creating one does not check the channels, colors coming from outside
+    (the schedule file, http requests) are created with Color.validated.
+    """
+    __slots__ = ()
 
-        self.red = red
-        self.green = green
-        self.blue = blue
+    @classmethod
+    def validated(cls, red: int, green: int, blue: int) -> 'Color':
+        cls._validate_color(red)
+        cls._validate_color(green)
+        cls._validate_color(blue)
+
+        return cls(red, green, blue)
 
     @staticmethod
     def _validate_color(color):
-        assert 0 <= color <= 255
+        if not 0 <= color <= 255:
+            raise ValueError('Color channel out of range: {}'.format(color))
 
     def to_rgb_tuple(self) -> Tuple[int, int, int]:
         return self.red, self.green, self.blue
@@ -25,6 +32,25 @@ class Color(object):
             red=self.red, blue=self.blue, green=self.green)
 
 
+class ColorBuffer(object):
+    """
+    Mutable color for writing interpolation results into without allocating
+    """
+    __slots__ = ('red', 'green', 'blue')
+
+    def __init__(self, red: int = 0, green: int = 0, blue: int = 0):
+        self.red = red
+        self.green = green
+        self.blue = blue
+
+    def to_rgb_tuple(self) -> Tuple[int, int, int]:
+        return self.red, self.green, self.blue
+
+    def __repr__(self):
+        return '<ColorBuffer red={red} blue={blue} green={green} />'.format(
+            red=self.red, blue=self.blue, green=self.green)
+
+
 def interpolate_colors(color_1: Color, color_2: Color, ratio: float, brightness: float = 1) -> Color:
     """
 
@@ -43,6 +69,25 @@ def interpolate_colors(color_1: Color, color_2: Color, ratio: float, brightness:
     return color
 
 
+def interpolate_colors_into(
+        target: ColorBuffer,
+        color_1: Color,
+        color_2: Color,
+        ratio: float,
+        brightness: float = 1,
+) -> ColorBuffer:
+    """
+    interpolate_colors writing into target instead of a new Color
+
+    :return: target
+    """
+    target.red = round(interpolate_value(color_1.red, color_2.red, ratio) * brightness)
+    target.green = round(interpolate_value(color_1.green, color_2.green, ratio) * brightness)
+    target.blue = round(interpolate_value(color_1.blue, color_2.blue, ratio) * brightness)
+
+    return target
+
+
 def generate_color_gradient(
         color_1: Color,
         color_2: Color,
@@ -0,0 +1,255 @@
+"""
+Blends timed layers over the scheduled gradient. The schedule is the bottom of the stack, user gradients
+and alerts are layers on top of it that fade in, stay and fade out along an envelope. A new layer fades in
+over whatever is showing, including layers that are still fading, so nothing snaps.
+
+Layers are blended in one pass per frame into at most one gradient per effect. Blending frames weights each
+layer's colors by its opacity times its brightness, so layers with the same effect are merged into colors
+weighted the same way and a brightness weighted by opacity alone. As the effects are linear in the colors
+this renders the frame blending would, up to rounding; the merged colors are kept unrounded for that. Only
+layers with different effects are rendered separately and blended as frames, see
+lib.effects.render_blended_samples. Many layers cost about the same as one.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from math import inf
+from typing import List, Tuple
+
+from lib.color import ColorBuffer
+from lib.gradient import Gradient, GradientBuffer, copy_gradient_into
+from lib.utils import interpolate_value
+
+# easing curves from 0 to 1, sampled into a table once per envelope shape
+EASINGS = {
+    'linear': lambda x: x,
+    'smooth': lambda x: x * x * (3 - 2 * x),
+}
+
+ENVELOPE_STEPS = 256
+
+# ranks of the layers, higher ranks stay on top of lower ones whatever their age
+USER = 0
+ALERT = 1
+
+# oldest layers are dropped beyond this many
+MAX_LAYERS = 16
+
+# an alert flashes in and out quicker than a user gradient
+ALERT_FADE_IN_DURATION = 0.25
+ALERT_FADE_OUT_DURATION = 1.0
+
+# a Gradient shown over everything else for duration seconds, see lib.state.ControlState.alert
+Alert = namedtuple('Alert', ['gradient', 'duration'])
+
+
+def mix_colors_into(target: ColorBuffer, color, ratio: float) -> ColorBuffer:
+    """
+    Move target ratio of the way to color, without rounding
+    """
+    target.red += (color.red - target.red) * ratio
+    target.green += (color.green - target.green) * ratio
+    target.blue += (color.blue - target.blue) * ratio
+    return target
+
+
+def blend_gradient_into(target: GradientBuffer, target_weight: float, gradient, weight: float):
+    """
+    Blend gradient at weight into target at target_weight as their frames would blend: the colors by
+    weight times brightness, everything else by weight
+    """
+    total = target_weight + weight
+    if total <= 0:
+        return
+    ratio = weight / total
+    light = weight * gradient.brightness
+    total_light = target_weight * target.brightness + light
+    color_ratio = light / total_light if total_light > 0 else ratio
+
+    target.seconds = interpolate_value(target.seconds, gradient.seconds, ratio)
+    mix_colors_into(target.color_1, gradient.color_1, color_ratio)
+    mix_colors_into(target.color_2, gradient.color_2, color_ratio)
+    target.brightness = interpolate_value(target.brightness, gradient.brightness, ratio)
+    target.scroll_speed = interpolate_value(target.scroll_speed, gradient.scroll_speed, ratio)
+
+
+@lru_cache(maxsize=8)
+def get_easing_table(easing: str) -> Tuple[float, ...]:
+    curve = EASINGS[easing]
+    return tuple(curve(i / ENVELOPE_STEPS) for i in range(ENVELOPE_STEPS + 1))
+
+
+class Envelope(object):
+    def __init__(self, fade_in_duration: float, sustain_duration: float, fade_out_duration: float,
+                 easing: str = 'linear'):
+        """
+        Opacity of a layer over its lifetime. Use get_envelope, envelopes are shared between layers.
+
+        :param easing: one of EASINGS, for both fades
+        :raise ValueError: for durations that are negative or not finite, the layer would never end
+        """
+        if not all(0 <= duration < inf for duration in (fade_in_duration, sustain_duration, fade_out_duration)):
+            raise ValueError('Envelope durations must be finite and not negative')
+
+        self.fade_in_duration = fade_in_duration
+        self.fade_out_duration = fade_out_duration
+        self.sustain_end = fade_in_duration + sustain_duration
+        self.duration = self.sustain_end + fade_out_duration
+        self._table = get_easing_table(easing)
+
+    def _ease(self, ratio: float) -> float:
+        position = ratio * ENVELOPE_STEPS
+        step = int(position)
+        table = self._table
+        if step >= ENVELOPE_STEPS:
+            return table[ENVELOPE_STEPS]
+
+        return table[step] + (table[step + 1] - table[step]) * (position - step)
+
+    def opacity(self, elapsed: float) -> float:
+        """
+        :param elapsed: seconds since the layer started
+        :return: 0 before the start and after the end
+        """
+        if elapsed < 0 or elapsed >= self.duration:
+            return 0.0
+        if elapsed < self.fade_in_duration:
+            return self._ease(elapsed / self.fade_in_duration)
+        if elapsed < self.sustain_end:
+            return 1.0
+        return self._ease(1 - (elapsed - self.sustain_end) / self.fade_out_duration)
+
+
+@lru_cache(maxsize=16)
+def get_envelope(fade_in_duration: float, sustain_duration: float, fade_out_duration: float,
+                 easing: str = 'linear') -> Envelope:
+    return Envelope(fade_in_duration, sustain_duration, fade_out_duration, easing)
+
+
+class Layer(object):
+    __slots__ = ('gradient', 'start', 'envelope', 'rank')
+
+    def __init__(self, gradient: Gradient, start: float, envelope: Envelope, rank: int = USER):
+        self.gradient = gradient
+        self.start = start
+        self.envelope = envelope
+        self.rank = rank
+
+    def opacity(self, now: float) -> float:
+        return self.envelope.opacity(now - self.start)
+
+    def __repr__(self):
+        return '<Layer gradient={} start={} rank={} />'.format(self.gradient, self.start, self.rank)
+
+
+class Pass(object):
+    """
+    The visible layers of one effect merged into one gradient, and its weight in the frame. The weights
+    of a frame's passes add up to 1.
+    """
+    __slots__ = ('gradient', 'weight')
+
+    def __init__(self):
+        self.gradient = GradientBuffer()
+        self.weight = 0.0
+
+
+class Compositor(object):
+    def __init__(self, max_layers: int = MAX_LAYERS):
+        self.max_layers = max_layers
+
+        # timed layers above the schedule, bottom to top
+        self.layers = []  # type: List[Layer]
+        # layers dropped because there were more than max_layers
+        self.dropped_layers = 0
+
+        # passes of the last composed frame, reused every frame
+        self.passes = []  # type: List[Pass]
+        self._pool = []  # type: List[Pass]
+
+        # all passes of the last frame merged by their parameters, for the scroll speed and brightness
+        self.gradient = GradientBuffer()
+
+    def add(self, gradient: Gradient, start: float, envelope: Envelope, rank: int = USER) -> Layer:
+        """
+        Put a layer on top of the layers of its rank and below the ones of higher ranks
+        """
+        layer = Layer(gradient, start, envelope, rank)
+
+        layers = self.layers
+        i = len(layers)
+        while i > 0 and layers[i - 1].rank > rank:
+            i -= 1
+        layers.insert(i, layer)
+
+        if len(layers) > self.max_layers:
+            del layers[0]
+            self.dropped_layers += 1
+
+        return layer
+
+    def _merge(self, gradient, weight: float):
+        # into the pass of the same effect, or a new one
+        for layer_pass in self.passes:
+            if layer_pass.gradient.effect == gradient.effect:
+                blend_gradient_into(layer_pass.gradient, layer_pass.weight, gradient, weight)
+                layer_pass.weight += weight
+                return
+
+        if len(self._pool) == len(self.passes):
+            self._pool.append(Pass())
+        layer_pass = self._pool[len(self.passes)]
+        copy_gradient_into(layer_pass.gradient, gradient)
+        layer_pass.weight = weight
+        self.passes.append(layer_pass)
+
+    def compose(self, now: float, base) -> List[Pass]:
+        """
+        Blend the layers at now over base
+
+        :param base: the scheduled gradient
+        :return: the passes to render, valid until the next call
+        """
+        layers = self.layers
+        if layers and any(now - layer.start >= layer.envelope.duration for layer in layers):
+            layers[:] = [layer for layer in layers if now - layer.start < layer.envelope.duration]
+
+        opacities = [layer.opacity(now) for layer in layers]
+
+        # nothing under the topmost opaque layer shows
+        bottom = len(layers)
+        while bottom > 0 and opacities[bottom - 1] < 1:
+            bottom -= 1
+        bottom = max(bottom - 1, 0)
+
+        self.passes.clear()
+        if not opacities or opacities[bottom] < 1:
+            self._merge(base, 1.0)
+
+        for i in range(bottom, len(layers)):
+            opacity = opacities[i]
+            if opacity <= 0:
+                continue
+            for layer_pass in self.passes:
+                layer_pass.weight *= 1 - opacity
+            self._merge(layers[i].gradient, opacity)
+
+        self._merge_passes()
+        return self.passes
+
+    def _merge_passes(self):
+        passes = self.passes
+        gradient = self.gradient
+
+        heaviest = passes[0]
+        copy_gradient_into(gradient, heaviest.gradient)
+        total = heaviest.weight
+        for layer_pass in passes[1:]:
+            blend_gradient_into(gradient, total, layer_pass.gradient, layer_pass.weight)
+            total += layer_pass.weight
+            if layer_pass.weight > heaviest.weight:
+                heaviest = layer_pass
+
+        gradient.effect = heaviest.gradient.effect
+        # whole colors, like the gradients it describes
+        for color in (gradient.color_1, gradient.color_2):
+            color.red, color.green, color.blue = round(color.red), round(color.green), round(color.blue)
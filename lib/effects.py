@@ -0,0 +1,192 @@
+"""
+Effects a gradient can be rendered with, registered by name. Gradient.effect selects one, per schedule row
+or per user request.
+
+An effect kernel renders all samples of a layout in one array call:
+
+    kernel(positions, seconds, offset, gradient) -> float array of shape (len(positions), 3)
+
+positions are the samples' places along the strip in [0, 1), seconds the time of the frame, offset the
+scroll phase in [0, 1) that scroll_speed advances, and the gradient carries the colors. Kernels return
+colors in 0-255 before brightness, render_effect_samples applies the gradient's brightness and rounds.
+
+Kernels need numpy. Without it lib.writer renders every effect as the plain gradient.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from math import cos, pi
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lib.frame import generate_ratio_array
+from lib.gradient import DEFAULT_EFFECT, Gradient
+
+# animated effects change with seconds, so their frames are written even when the offset stands still
+Effect = namedtuple('Effect', ['name', 'kernel', 'animated'])
+
+EFFECTS = {}
+
+# number of heads running along the strip in the chase, and the length of their tails in periods
+CHASE_HEADS = 3
+CHASE_TAIL = 0.5
+
+# sparkles flash between these many times per second, the higher the exponent the shorter the flash
+SPARKLE_RATES = (0.2, 1.0)
+SPARKLE_EXPONENT = 16
+
+
+def register_effect(name: str, animated: bool = False):
+    """
+    Decorator adding a kernel to EFFECTS under name
+    """
+    def register(kernel):
+        EFFECTS[name] = Effect(name, kernel, animated)
+        return kernel
+
+    return register
+
+
+def get_effect(name: str) -> Effect:
+    """
+    :raise ValueError: if there is no effect of that name
+    """
+    try:
+        return EFFECTS[name]
+    except KeyError:
+        raise ValueError('Unknown effect {!r}, one of {}'.format(name, ', '.join(sorted(EFFECTS))))
+
+
+@lru_cache(maxsize=8)
+def get_sample_positions(resolution: int):
+    positions = np.arange(resolution) / resolution
+    positions.setflags(write=False)
+    return positions
+
+
+def blend_colors(gradient: Gradient, ratios):
+    """
+    :param ratios: array of 0 -> color_1, 1 -> color_2
+    :return: float array of shape (len(ratios), 3)
+    """
+    rgb_1 = np.array(gradient.color_1.to_rgb_tuple(), dtype=np.float64)
+    rgb_2 = np.array(gradient.color_2.to_rgb_tuple(), dtype=np.float64)
+    ratios = ratios[:, np.newaxis]
+
+    return rgb_2 * ratios + rgb_1 * (1 - ratios)
+
+
+def render_effect_samples(gradient: Gradient, resolution: int, offset: float = 0, seconds: float = 0,
+                          brightness: float = None):
+    """
+    The gradient's effect at resolution evenly spaced positions, for a lib.layout.Layout to map onto LEDs.
+    The plain gradient comes out the same as lib.color.generate_color_gradient.
+
+    :param brightness: instead of the gradient's brightness
+    :return: uint8 array of shape (resolution, 3)
+    """
+    if brightness is None:
+        brightness = gradient.brightness
+
+    colors = get_effect(gradient.effect).kernel(get_sample_positions(resolution), seconds, offset, gradient)
+
+    return np.clip(np.rint(colors * brightness), 0, 255).astype(np.uint8)
+
+
+def render_blended_samples(passes, resolution: int, offset: float = 0, seconds: float = 0,
+                           brightness: float = None):
+    """
+    Effects blended as frames, the passes of lib.compositor.Compositor.compose. Each pass is rendered at its
+    own brightness and weight and the results are summed.
+
+    :param brightness: scale the result to this brightness instead of the passes' own
+    :return: uint8 array of shape (resolution, 3)
+    """
+    positions = get_sample_positions(resolution)
+
+    scale = 1.0
+    if brightness is not None:
+        total = sum(layer_pass.weight * layer_pass.gradient.brightness for layer_pass in passes)
+        scale = brightness / total if total > 0 else 0.0
+
+    colors = np.zeros((resolution, 3))
+    for layer_pass in passes:
+        gradient = layer_pass.gradient
+        layer = get_effect(gradient.effect).kernel(positions, seconds, offset, gradient)
+        layer *= layer_pass.weight * gradient.brightness * scale
+        colors += layer
+
+    return np.clip(np.rint(colors), 0, 255).astype(np.uint8)
+
+
+@register_effect(DEFAULT_EFFECT)
+def gradient_kernel(positions, seconds: float, offset: float, gradient: Gradient):
+    """
+    color_1 fading into color_2 and back along the strip, scrolling
+    """
+    return blend_colors(gradient, generate_ratio_array(len(positions), offset))
+
+
+# channel that rises and channel that falls in each third of the color wheel
+_WHEEL_RISING = (0, 2, 1)
+_WHEEL_FALLING = (1, 0, 2)
+
+
+@register_effect('rainbow')
+def rainbow_kernel(positions, seconds: float, offset: float, gradient: Gradient):
+    """
+    The color wheel of led_test.py once along the strip, scrolling. Ignores the colors.
+    """
+    wheel = ((positions + offset) % 1.0) * 3
+    third = np.minimum(wheel.astype(np.intp), 2)
+    rising = (wheel - third) * 255
+
+    colors = np.zeros((len(positions), 3))
+    pixels = np.arange(len(positions))
+    colors[pixels, np.take(_WHEEL_RISING, third)] = rising
+    colors[pixels, np.take(_WHEEL_FALLING, third)] = 255 - rising
+    return colors
+
+
+@lru_cache(maxsize=8)
+def _sparkle_timing(resolution: int):
+    # the same sparkles every run, for recordings and simulations
+    random = np.random.RandomState(resolution)
+    rates = random.uniform(SPARKLE_RATES[0], SPARKLE_RATES[1], resolution)
+    phases = random.uniform(0, 1, resolution)
+    rates.setflags(write=False)
+    phases.setflags(write=False)
+    return rates, phases
+
+
+@register_effect('sparkle', animated=True)
+def sparkle_kernel(positions, seconds: float, offset: float, gradient: Gradient):
+    """
+    color_1 with samples flashing color_2, each at its own rate
+    """
+    rates, phases = _sparkle_timing(len(positions))
+    cycles = seconds * rates + phases
+    ratios = np.maximum(np.cos(2 * pi * cycles), 0) ** SPARKLE_EXPONENT
+    return blend_colors(gradient, ratios)
+
+
+@register_effect('breathing')
+def breathing_kernel(positions, seconds: float, offset: float, gradient: Gradient):
+    """
+    The whole strip fading from color_1 to color_2 and back, one breath per scroll period. A black
+    color_1 breathes color_2 in and out.
+    """
+    ratio = 0.5 - 0.5 * cos(2 * pi * offset)
+    return blend_colors(gradient, np.full(len(positions), ratio))
+
+
+@register_effect('chase')
+def chase_kernel(positions, seconds: float, offset: float, gradient: Gradient):
+    """
+    CHASE_HEADS heads of color_2 with fading tails running over color_1, once along the strip per scroll
+    period
+    """
+    behind = ((offset - positions) * CHASE_HEADS) % 1.0
+    return blend_colors(gradient, np.clip(1 - behind / CHASE_TAIL, 0, 1))
@@ -0,0 +1,65 @@
+"""
+Array helpers for rendering whole frames, see lib.effects and lib.layout.
+
+numpy is optional, callers check HAS_NUMPY and fall back to the per-pixel functions in lib.color.
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lib.utils import get_ratio_table, get_ratio_table_oversampling
+
+HAS_NUMPY = np is not None
+
+
+@lru_cache(maxsize=16)
+def get_ratio_table_array(num_steps: int, exponent: float = 20.0):
+    table = np.array(get_ratio_table(num_steps, exponent))
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=8)
+def _table_steps(num_steps: int):
+    steps = np.arange(num_steps) * get_ratio_table_oversampling(num_steps)
+    steps.setflags(write=False)
+    return steps
+
+
+def generate_ratio_array(num_steps: int, offset: float, exponent: float = 20.0, interpolate: bool = True):
+    """
+    Array version of lib.utils.generate_ratios, a circular index into the same cached ratio table
+    """
+    if num_steps == 0:
+        return np.zeros(1)
+
+    table = get_ratio_table_array(num_steps, exponent)
+    size = num_steps * get_ratio_table_oversampling(num_steps)
+
+    position = (offset % 1.0) * size
+    start = int(position) % size
+    fraction = position - int(position)
+
+    # the table is stored twice in a row, so start + step never wraps
+    indices = _table_steps(num_steps) + start
+    ratios = table[indices]
+    if not interpolate or fraction == 0:
+        return ratios
+
+    return ratios + (table[indices + 1] - ratios) * fraction
+
+
+@lru_cache(maxsize=8)
+def mirror_indices(num_pixels: int):
+    """
+    For each pixel, the index into a half length frame, for strips laid out like a snake where the first
+    pixel is next to the last pixel. An odd middle pixel repeats the last color of the half.
+    """
+    half = max(num_pixels // 2, 1)
+    pixel = np.arange(num_pixels)
+    indices = np.minimum(np.minimum(pixel, num_pixels - 1 - pixel), half - 1)
+    indices.setflags(write=False)
+    return indices
@@ -0,0 +1,215 @@
+"""
+Recording of what a writer sent to the strip, and replaying it.
+
+A frame log is a header, then records, then an index of the records' offsets:
+
+    HEADER                  magic, format version, pixels, wall clock time of the first record
+    RECORD + payload ...    kind, seconds since the first record, payload length
+    index                   offset of every record, 8 bytes each
+    FOOTER                  offset of the index, number of records, magic
+
+Frame payloads are the raw bytes passed to write_rgb. Event payloads are small JSON objects, for control
+state changes like new user gradients and fast mode. A log whose recorder was killed has no index, it is
+rebuilt by scanning the records.
+"""
+from array import array
+import json
+import mmap
+import struct
+import threading
+import time
+from typing import Iterator, Tuple
+
+from lib.gradient import Gradient
+from lib.pixel_order import BytesLike
+from lib.writer import Writer
+
+MAGIC = b'LHFL'
+INDEX_MAGIC = b'LHFI'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sHId')
+RECORD = struct.Struct('<BdI')
+FOOTER = struct.Struct('<QQ4s')
+
+FRAME = 1
+EVENT = 2
+
+
+class FrameRecorder(object):
+    def __init__(self, file_name: str, num_pixels: int, clock=time.monotonic):
+        """
+        Appends records to a new frame log. The render thread, the stream receiver and exit handlers may
+        record at the same time, so records are appended under a lock.
+        """
+        self.file_name = file_name
+        self.num_pixels = num_pixels
+        self.clock = clock
+
+        self._file = open(file_name, 'wb', buffering=1 << 16)
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, num_pixels, time.time()))
+        self._offset = HEADER.size
+        self._start = clock()
+
+        # offset of every record
+        self._index = array('Q')
+        self._lock = threading.Lock()
+
+    def _append(self, kind: int, payload: BytesLike):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._index.append(self._offset)
+            self._file.write(RECORD.pack(kind, self.clock() - self._start, len(payload)))
+            self._file.write(payload)
+            self._offset += RECORD.size + len(payload)
+
+    def record_frame(self, rgb: BytesLike):
+        self._append(FRAME, rgb)
+
+    def record_event(self, **event):
+        """
+        :param event: json serializable control state changes
+        """
+        self._append(EVENT, json.dumps(event, separators=(',', ':')).encode('utf-8'))
+
+    @property
+    def num_records(self) -> int:
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+
+            index_offset = self._offset
+            self._file.write(self._index.tobytes())
+            self._file.write(FOOTER.pack(index_offset, len(self._index), INDEX_MAGIC))
+            self._file.close()
+
+
+def gradient_to_dict(gradient: Gradient) -> dict:
+    return dict(
+        color_1=gradient.color_1.to_rgb_tuple(),
+        color_2=gradient.color_2.to_rgb_tuple(),
+        brightness=gradient.brightness,
+        scroll_speed=gradient.scroll_speed,
+        effect=gradient.effect,
+    )
+
+
+class RecordingWriter(Writer):
+    def __init__(self, writer: Writer, recorder: FrameRecorder):
+        """
+        Records every frame written through it, then passes it on to writer. Frames are recorded after
+        the writer's output lookup table, as they go to the strip.
+        """
+        super().__init__(writer.num_pixels, writer.layout)
+        self.writer = writer
+        self.recorder = recorder
+        self.output_lut = writer.output_lut
+
+    def write_rgb(self, rgb: BytesLike):
+        self.recorder.record_frame(rgb)
+        self.writer.write_rgb(rgb)
+
+    def close(self):
+        self.recorder.close()
+        self.writer.close()
+
+
+class FrameLog(object):
+    def __init__(self, file_name: str):
+        """
+        A frame log mapped into memory for reading
+        """
+        self.file_name = file_name
+        with open(file_name, 'rb') as log_file:
+            self._buffer = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.num_pixels, self.start_time = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('{} is not a version {} frame log'.format(file_name, FORMAT_VERSION))
+
+        self.offsets = self._read_index()
+        if self.offsets is None:
+            self.offsets = self._scan()
+
+    def _read_index(self):
+        if len(self._buffer) < HEADER.size + FOOTER.size:
+            return None
+
+        index_offset, count, magic = FOOTER.unpack_from(self._buffer, len(self._buffer) - FOOTER.size)
+        if magic != INDEX_MAGIC or index_offset + count * 8 + FOOTER.size != len(self._buffer):
+            return None
+
+        offsets = array('Q')
+        offsets.frombytes(self._buffer[index_offset:index_offset + count * 8])
+        return offsets
+
+    def _scan(self):
+        """
+        Offsets of the complete records, for logs without an index
+        """
+        offsets = array('Q')
+        offset = HEADER.size
+        while offset + RECORD.size <= len(self._buffer):
+            kind, _, length = RECORD.unpack_from(self._buffer, offset)
+            if kind not in (FRAME, EVENT) or offset + RECORD.size + length > len(self._buffer):
+                break
+            offsets.append(offset)
+            offset += RECORD.size + length
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def record(self, i: int) -> Tuple[int, float, memoryview]:
+        """
+        :return: (kind, seconds since the first record, payload)
+        """
+        offset = self.offsets[i]
+        kind, timestamp, length = RECORD.unpack_from(self._buffer, offset)
+        start = offset + RECORD.size
+        return kind, timestamp, memoryview(self._buffer)[start:start + length]
+
+    def __iter__(self) -> Iterator[Tuple[int, float, memoryview]]:
+        for i in range(len(self.offsets)):
+            yield self.record(i)
+
+    @property
+    def duration(self) -> float:
+        return self.record(len(self) - 1)[1] if len(self) else 0.0
+
+
+def replay(
+        log: FrameLog,
+        writer: Writer,
+        speed: float = 1.0,
+        on_event=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+) -> Tuple[int, float]:
+    """
+    Play a frame log back through a writer
+
+    :param speed: 1 for real time, 2 for twice as fast, 0 for as fast as the writer goes
+    :param on_event: called with (seconds, event dict) for every event record
+    :return: (frames written, seconds it took)
+    """
+    start = clock()
+    frames = 0
+
+    for kind, timestamp, payload in log:
+        if speed > 0:
+            delay = start + timestamp / speed - clock()
+            if delay > 0:
+                sleep(delay)
+
+        if kind == FRAME:
+            writer.write_rgb(payload)
+            frames += 1
+        elif on_event is not None:
+            on_event(timestamp, json.loads(bytes(payload).decode('utf-8')))
+
+    return frames, clock() - start
@@ -0,0 +1,72 @@
+import time
+
+
+class FrameScheduler(object):
+    def __init__(
+            self,
+            target_fps: float = 100.0,
+            clock=time.monotonic,
+            sleep=time.sleep,
+    ):
+        """
+        Paces a render loop to absolute frame deadlines, so the frame rate does not depend on how long
+        a frame took to render and sleep overshoot does not accumulate.
+
+        :param target_fps:
+        :param clock: monotonic clock in seconds
+        :param sleep: sleep function in seconds
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.target_fps = target_fps
+
+        # deadline of the next frame on the clock, None until the first frame
+        self.next_deadline = None
+        # clock time of the last frame
+        self.last_frame_time = None
+        # frames dropped because the loop fell behind
+        self.skipped_frames = 0
+
+    @property
+    def target_fps(self) -> float:
+        return 1.0 / self.frame_interval
+
+    @target_fps.setter
+    def target_fps(self, target_fps: float):
+        assert target_fps > 0
+        self.frame_interval = 1.0 / target_fps
+
+    def wake(self):
+        """
+        Render the next frame right away instead of at its deadline, the frame grid restarts from there
+        """
+        self.next_deadline = None
+
+    def wait(self, sleep=None) -> float:
+        """
+        Sleep until the next frame deadline. When the loop is more than a frame behind, the missed
+        deadlines are skipped instead of being rendered back to back.
+
+        :param sleep: sleep function to use for this frame instead of self.sleep. It may return early,
+            e.g. to wake up on a new message.
+        :return: seconds since the previous frame, 0 for the first frame
+        """
+        now = self.clock()
+
+        if self.next_deadline is None:
+            self.next_deadline = now
+        elif now < self.next_deadline:
+            (sleep or self.sleep)(self.next_deadline - now)
+            now = self.clock()
+        else:
+            missed_frames = int((now - self.next_deadline) / self.frame_interval)
+            if missed_frames:
+                self.skipped_frames += missed_frames
+                self.next_deadline += missed_frames * self.frame_interval
+
+        self.next_deadline += self.frame_interval
+
+        elapsed = 0.0 if self.last_frame_time is None else now - self.last_frame_time
+        self.last_frame_time = now
+
+        return elapsed
@@ -1,30 +1,81 @@
-from lib.color import Color, interpolate_colors
+from collections import namedtuple
+
+from lib.color import ColorBuffer, interpolate_colors, interpolate_colors_into
 from lib.utils import interpolate_value
 
-class Gradient(object):
-    def __init__(
-        self,
-        seconds: float,
-        color_1: Color,
-        color_2: Color,
-        brightness: float,
-        scroll_speed: float
-    ):
-        self.seconds = seconds
-        self.color_1 = color_1
-        self.color_2 = color_2
-        self.brightness = brightness
-        self.scroll_speed = scroll_speed
+# name of the effect in lib.effects that renders the two colors as the scrolling gradient
+DEFAULT_EFFECT = 'gradient'
+
+_Gradient = namedtuple('Gradient', ['seconds', 'color_1', 'color_2', 'brightness', 'scroll_speed', 'effect'])
+_Gradient.__new__.__defaults__ = (DEFAULT_EFFECT,)
+
+
+class Gradient(_Gradient):
+    """
+    Immutable, use _replace for a copy with e.g. other seconds
+
+    effect is the name of the lib.effects kernel the colors are rendered with
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<Gradient seconds={seconds} color_1={color_1} color_2={color_2} brightness={brightness} scroll_speed={scroll_speed} effect={effect} />'.format(
+            seconds=self.seconds,
+            color_1=self.color_1,
+            color_2=self.color_2,
+            brightness=self.brightness,
+            scroll_speed=self.scroll_speed,
+            effect=self.effect,
+            )
+
+
+class GradientBuffer(object):
+    """
+    Mutable gradient for writing interpolation results into without allocating. It is overwritten by
+    the next frame, nothing keeps it beyond that.
+    """
+    __slots__ = ('seconds', 'color_1', 'color_2', 'brightness', 'scroll_speed', 'effect')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.color_1 = ColorBuffer()
+        self.color_2 = ColorBuffer()
+        self.brightness = 0.0
+        self.scroll_speed = 0.0
+        self.effect = DEFAULT_EFFECT
 
     def __repr__(self):
-        return '<Gradient seconds={seconds} color_1={color_1} color_2={color_2} brightness={brightness} scroll_speed={scroll_speed} />'.format(
+        return '<GradientBuffer seconds={seconds} color_1={color_1} color_2={color_2} brightness={brightness} scroll_speed={scroll_speed} effect={effect} />'.format(
             seconds=self.seconds,
             color_1=self.color_1,
             color_2=self.color_2,
             brightness=self.brightness,
-            scroll_speed=self.scroll_speed
+            scroll_speed=self.scroll_speed,
+            effect=self.effect,
             )
 
+
+def copy_gradient_into(target: GradientBuffer, gradient) -> GradientBuffer:
+    """
+    Overwrite target with a Gradient or GradientBuffer
+
+    :return: target
+    """
+    target.seconds = gradient.seconds
+    target.color_1.red, target.color_1.green, target.color_1.blue = gradient.color_1.to_rgb_tuple()
+    target.color_2.red, target.color_2.green, target.color_2.blue = gradient.color_2.to_rgb_tuple()
+    target.brightness = gradient.brightness
+    target.scroll_speed = gradient.scroll_speed
+    target.effect = gradient.effect
+
+    return target
+
+
+def interpolate_effects(gradient_1: Gradient, gradient_2: Gradient, ratio: float) -> str:
+    # effects do not blend, the nearer gradient's is used
+    return gradient_1.effect if ratio < 0.5 else gradient_2.effect
+
+
 def interpolate_gradients(gradient_1: Gradient, gradient_2: Gradient, ratio: float) -> Gradient:
     gradient = Gradient(
             seconds=interpolate_value(gradient_1.seconds, gradient_2.seconds, ratio),
@@ -32,5 +83,27 @@ def interpolate_gradients(gradient_1: Gradient, gradient_2: Gradient, ratio: flo
             color_2=interpolate_colors(gradient_1.color_2, gradient_2.color_2, ratio),
             brightness=interpolate_value(gradient_1.brightness, gradient_2.brightness, ratio),
             scroll_speed=interpolate_value(gradient_1.scroll_speed, gradient_2.scroll_speed, ratio),
+            effect=interpolate_effects(gradient_1, gradient_2, ratio),
         )
     return gradient
+
+
+def interpolate_gradients_into(
+        target: GradientBuffer,
+        gradient_1: Gradient,
+        gradient_2: Gradient,
+        ratio: float,
+) -> GradientBuffer:
+    """
+    interpolate_gradients writing into target instead of a new Gradient
+
+    :return: target
+    """
+    target.seconds = interpolate_value(gradient_1.seconds, gradient_2.seconds, ratio)
+    interpolate_colors_into(target.color_1, gradient_1.color_1, gradient_2.color_1, ratio)
+    interpolate_colors_into(target.color_2, gradient_1.color_2, gradient_2.color_2, ratio)
+    target.brightness = interpolate_value(gradient_1.brightness, gradient_2.brightness, ratio)
+    target.scroll_speed = interpolate_value(gradient_1.scroll_speed, gradient_2.scroll_speed, ratio)
+    target.effect = interpolate_effects(gradient_1, gradient_2, ratio)
+
+    return target
@@ -0,0 +1,197 @@
+"""
+Pixel maps: where each physical LED sits along the gradient.
+
+The gradient is rendered at a fixed resolution (samples over one period of the pattern), and a compiled
+Layout maps those samples onto the LEDs in wire order. Each LED has a position in sample units; a
+fractional position blends the two samples on either side. Compiling turns the positions into index and
+weight arrays once, so mapping a frame is one gather no matter how many LEDs or segments there are.
+
+Pixel maps are read from JSON, as segments of LEDs spaced evenly between two positions:
+
+    {
+        "resolution": 60,
+        "segments": [
+            {"count": 60, "start": 0, "end": 59},
+            {"count": 60, "start": 59, "end": 0, "strip": 0}
+        ]
+    }
+
+or from CSV, one row per LED in wire order with a position and optionally a strip column.
+"""
+import csv
+import io
+import json
+import math
+from typing import List, Sequence, Tuple
+
+from lib.frame import HAS_NUMPY, mirror_indices, np
+
+# blend weights are in 1/WEIGHT_SCALE steps, so blending is integer math on uint16
+WEIGHT_SCALE = 256
+
+
+class Layout(object):
+    def __init__(self, positions: Sequence[float], resolution: int, strips: Sequence[int] = None):
+        """
+        :param positions: per LED in wire order, the position along the gradient in samples. Positions
+            wrap around at resolution.
+        :param resolution: number of gradient samples rendered per frame
+        :param strips: per LED, the strip it is on, all on strip 0 by default
+        """
+        if resolution < 1:
+            raise ValueError('Layout resolution must be at least 1, got {}'.format(resolution))
+        if not positions:
+            raise ValueError('Layout has no pixels')
+        if strips is not None and len(strips) != len(positions):
+            raise ValueError('Layout has {} strips for {} pixels'.format(len(strips), len(positions)))
+
+        self.resolution = resolution
+        self.num_pixels = len(positions)
+        self.positions = tuple(float(position) for position in positions)
+        self.strips = tuple(strips) if strips is not None else (0,) * self.num_pixels
+
+        indices = []
+        next_indices = []
+        weights = []
+        for position in self.positions:
+            if not math.isfinite(position):
+                raise ValueError('Bad pixel position {}'.format(position))
+            base = math.floor(position)
+            weight = round((position - base) * WEIGHT_SCALE)
+            if weight == WEIGHT_SCALE:
+                base, weight = base + 1, 0
+
+            indices.append(base % resolution)
+            next_indices.append((base + 1) % resolution)
+            weights.append(weight)
+
+        # every LED sits exactly on a sample, mapping is a plain gather
+        self.exact = not any(weights)
+
+        if HAS_NUMPY:
+            self.indices = np.array(indices, dtype=np.intp)
+            self.next_indices = np.array(next_indices, dtype=np.intp)
+            self.weights = np.array(weights, dtype=np.uint16)[:, np.newaxis]
+            for array in (self.indices, self.next_indices, self.weights):
+                array.setflags(write=False)
+        else:
+            self.indices = indices
+            self.next_indices = next_indices
+            self.weights = weights
+
+    def strip(self, strip: int) -> 'Layout':
+        """
+        The LEDs on one strip, for the writer driving that strip
+        """
+        positions = [position for position, on in zip(self.positions, self.strips) if on == strip]
+        return Layout(positions, self.resolution)
+
+    @property
+    def strip_numbers(self) -> List[int]:
+        return sorted(set(self.strips))
+
+    def apply(self, samples):
+        """
+        :param samples: uint8 array of shape (resolution, 3)
+        :return: uint8 array of shape (num_pixels, 3)
+        """
+        if self.exact:
+            return samples[self.indices]
+
+        weights = self.weights
+        low = samples[self.indices].astype(np.uint16)
+        high = samples[self.next_indices].astype(np.uint16)
+        blended = (low * (WEIGHT_SCALE - weights) + high * weights + WEIGHT_SCALE // 2) >> 8
+
+        return blended.astype(np.uint8)
+
+    def apply_colors(self, samples: Sequence[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """
+        apply for lists of rgb tuples, used without numpy
+
+        :param samples: resolution rgb tuples
+        """
+        if self.exact:
+            return [samples[i] for i in self.indices]
+
+        pixels = []
+        for i, j, weight in zip(self.indices, self.next_indices, self.weights):
+            low = samples[i]
+            high = samples[j]
+            pixels.append(tuple(
+                (low[c] * (WEIGHT_SCALE - weight) + high[c] * weight + WEIGHT_SCALE // 2) >> 8 for c in range(3)))
+        return pixels
+
+    def __repr__(self):
+        return '<Layout num_pixels={} resolution={} strips={} />'.format(
+            self.num_pixels, self.resolution, self.strip_numbers)
+
+
+def snake_layout(num_pixels: int) -> Layout:
+    """
+    The original strip, laid out like a snake so the first pixel is next to the last pixel. Half the strip
+    length is rendered and mirrored onto the other half, an odd middle pixel repeats the last sample.
+    """
+    if HAS_NUMPY:
+        positions = mirror_indices(num_pixels).tolist()
+    else:
+        half = max(num_pixels // 2, 1)
+        positions = [min(i, num_pixels - 1 - i, half - 1) for i in range(num_pixels)]
+
+    return Layout(positions, resolution=max(num_pixels // 2, 1))
+
+
+def parse_layout_json(text: str) -> Layout:
+    """
+    Raises ValueError, TypeError or KeyError for malformed pixel maps
+    """
+    pixel_map = json.loads(text)
+
+    positions = []
+    strips = []
+    for segment in pixel_map['segments']:
+        count = int(segment['count'])
+        if count < 1:
+            raise ValueError('Segment without pixels: {}'.format(segment))
+        start = float(segment['start'])
+        end = float(segment.get('end', start))
+        strip = int(segment.get('strip', 0))
+
+        step = (end - start) / (count - 1) if count > 1 else 0.0
+        positions.extend(start + step * i for i in range(count))
+        strips.extend([strip] * count)
+
+    resolution = int(pixel_map.get('resolution', 0)) or _default_resolution(positions)
+
+    return Layout(positions, resolution, strips)
+
+
+def parse_layout_csv(text: str, resolution: int = None) -> Layout:
+    """
+    One row per LED in wire order, with a position column and optionally a strip column
+
+    :param resolution: defaults to one more than the largest position
+    """
+    positions = []
+    strips = []
+    for line in csv.DictReader(io.StringIO(text)):
+        positions.append(float(line['position']))
+        strips.append(int(line.get('strip') or 0))
+
+    return Layout(positions, resolution or _default_resolution(positions), strips)
+
+
+def _default_resolution(positions: Sequence[float]) -> int:
+    return int(math.floor(max(positions, default=0))) + 1
+
+
+def load_layout(file_name: str) -> Layout:
+    """
+    :param file_name: a .json segment map or a .csv per LED map
+    """
+    with open(file_name) as layout_file:
+        text = layout_file.read()
+
+    if file_name.endswith('.csv'):
+        return parse_layout_csv(text)
+    return parse_layout_json(text)
@@ -0,0 +1,194 @@
+"""
+Lightweight timing of the render loop, served in the Prometheus text format.
+
+Observing a sample is a bisect and a few integer updates, so instrumenting every stage of every frame
+stays well under 1% of the frame time.
+"""
+from bisect import bisect_left
+from typing import Dict, List
+
+# upper bounds of the latency buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+# stages of a frame, in the order they run
+FRAME_STAGES = ('state', 'schedule', 'blend', 'render', 'show')
+
+RECENT_QUANTILES = (0.5, 0.9, 0.99)
+
+# latencies of streamed frames
+STREAM_PATHS = ('receive_to_show', 'input_to_photon')
+
+
+class LatencyHistogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 1024):
+        """
+        Bucket counts since start, plus the same counts over the last `window` samples
+
+        :param buckets: sorted upper bounds in seconds
+        :param window: number of recent samples the rolling counts cover
+        """
+        assert len(buckets) < 255
+
+        self.buckets = buckets
+        # per bucket, the last one is everything above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.recent_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+        # bucket index of each recent sample, as a ring
+        self._recent = bytearray(window)
+        self._recent_position = 0
+
+    def observe(self, seconds: float):
+        bucket = bisect_left(self.buckets, seconds)
+
+        self.counts[bucket] += 1
+        self.count += 1
+        self.sum += seconds
+
+        position = self._recent_position
+        if self.count > len(self._recent):
+            self.recent_counts[self._recent[position]] -= 1
+        self._recent[position] = bucket
+        self.recent_counts[bucket] += 1
+        self._recent_position = (position + 1) % len(self._recent)
+
+    def recent_quantile(self, quantile: float) -> float:
+        """
+        :return: upper bound of the bucket the quantile of the recent samples falls in, inf if it is
+            above the last bucket and 0 without samples
+        """
+        total = sum(self.recent_counts)
+        if total == 0:
+            return 0.0
+
+        rank = quantile * total
+        seen = 0
+        for bound, count in zip(self.buckets, self.recent_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class FrameMetrics(object):
+    def __init__(self, fps_smoothing: float = 0.05):
+        """
+        :param fps_smoothing: weight of the newest frame in the moving average of the frame time
+        """
+        self.stages = {stage: LatencyHistogram() for stage in FRAME_STAGES}  # type: Dict[str, LatencyHistogram]
+        self.fps_smoothing = fps_smoothing
+
+        self.frames = 0
+        self.average_frame_time = 0.0
+        self.missed_deadlines = 0
+        self.skipped_writes = 0
+        self.state_version = 0
+        self.coalesced_snapshots = 0
+        # user gradients and alerts blended over the schedule in the last frame
+        self.layers = 0
+
+        # streamed frames, see lib.stream. receive_to_show is measured here, input_to_photon from the
+        # sender's timestamp and so only as good as the clocks' sync.
+        self.stream_latency = {path: LatencyHistogram() for path in STREAM_PATHS}  # type: Dict[str, LatencyHistogram]
+        self.stream_frames = 0
+        self.stream_dropped_packets = 0
+        self.stream_bad_packets = 0
+        self.coalesced_inputs = 0
+        self.rate_limited_requests = 0
+        # seconds from process start until the modules were imported and until the first frame was written
+        self.startup_import_seconds = 0.0
+        self.startup_first_frame_seconds = 0.0
+
+    def observe(self, stage: str, seconds: float):
+        self.stages[stage].observe(seconds)
+
+    def frame(self, elapsed: float):
+        """
+        Count a frame
+
+        :param elapsed: seconds since the previous frame
+        """
+        self.frames += 1
+        if elapsed <= 0:
+            return
+
+        if self.average_frame_time == 0:
+            self.average_frame_time = elapsed
+        else:
+            self.average_frame_time += (elapsed - self.average_frame_time) * self.fps_smoothing
+
+    @property
+    def fps(self) -> float:
+        return 1.0 / self.average_frame_time if self.average_frame_time > 0 else 0.0
+
+    def to_prometheus(self) -> str:
+        lines = _histogram_lines('lighthaus_stage_latency_seconds', 'Time spent in each stage of a frame',
+                                 'stage', self.stages)
+        lines += _histogram_lines('lighthaus_stream_latency_seconds',
+                                  'Time from a stream packet to its frame on the strip', 'path', self.stream_latency)
+
+        for name, metric_type, help_text, value in [
+            ('lighthaus_frames_total', 'counter', 'Frames rendered', self.frames),
+            ('lighthaus_fps', 'gauge', 'Achieved frames per second', self.fps),
+            ('lighthaus_missed_deadlines_total', 'counter', 'Frame deadlines skipped because the loop was behind',
+             self.missed_deadlines),
+            ('lighthaus_skipped_writes_total', 'counter', 'Frames not written because nothing changed',
+             self.skipped_writes),
+            ('lighthaus_state_version', 'gauge', 'Version of the control state the last frame used',
+             self.state_version),
+            ('lighthaus_coalesced_snapshots_total', 'counter',
+             'Control state snapshots replaced by a newer one before a frame used them', self.coalesced_snapshots),
+            ('lighthaus_stream_frames_total', 'counter', 'Frames written from the stream', self.stream_frames),
+            ('lighthaus_stream_dropped_packets_total', 'counter', 'Stream packets older than the last one',
+             self.stream_dropped_packets),
+            ('lighthaus_stream_bad_packets_total', 'counter', 'Stream packets that could not be read',
+             self.stream_bad_packets),
+            ('lighthaus_layers', 'gauge', 'User gradients and alerts showing over the schedule', self.layers),
+            ('lighthaus_coalesced_inputs_total', 'counter',
+             'User gradients replaced by a newer one before they were published', self.coalesced_inputs),
+            ('lighthaus_rate_limited_requests_total', 'counter', 'Requests turned away by the rate limit',
+             self.rate_limited_requests),
+            ('lighthaus_startup_import_seconds', 'gauge', 'Seconds from start until the modules were imported',
+             self.startup_import_seconds),
+            ('lighthaus_startup_first_frame_seconds', 'gauge', 'Seconds from start until the first frame',
+             self.startup_first_frame_seconds),
+        ]:
+            lines += [
+                '# HELP {} {}'.format(name, help_text),
+                '# TYPE {} {}'.format(name, metric_type),
+                '{} {}'.format(name, value),
+            ]
+
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name: str, help_text: str, label: str, histograms: Dict[str, LatencyHistogram]) -> List[str]:
+    """
+    A histogram family with one histogram per label value, plus its recent quantiles as a gauge
+    """
+    lines = [
+        '# HELP {} {}'.format(name, help_text),
+        '# TYPE {} histogram'.format(name),
+    ]
+    for value, histogram in histograms.items():
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(name, label, value, bound, cumulative))
+        lines.append('{}_bucket{{{}="{}",le="+Inf"}} {}'.format(name, label, value, histogram.count))
+        lines.append('{}_sum{{{}="{}"}} {}'.format(name, label, value, histogram.sum))
+        lines.append('{}_count{{{}="{}"}} {}'.format(name, label, value, histogram.count))
+
+    recent_name = name.replace('_seconds', '_recent_seconds')
+    lines += [
+        '# HELP {} {}, quantiles over the recent samples'.format(recent_name, help_text),
+        '# TYPE {} gauge'.format(recent_name),
+    ]
+    for value, histogram in histograms.items():
+        for quantile in RECENT_QUANTILES:
+            lines.append('{}{{{}="{}",quantile="{}"}} {}'.format(
+                recent_name, label, value, quantile, histogram.recent_quantile(quantile)))
+
+    return lines
@@ -1,11 +1,10 @@
-from typing import List
+from lib.layout import Layout
+from lib.output_lut import GAMMA, OutputLUT
+from lib.pixel_order import BytesLike, get_channel_offsets, pack_frame
+from lib.writer import Writer
 
-from lib.color import generate_color_gradient, Color
-from lib.gradient import Gradient
-from lib.utils import rotate_list
 
-
-class NeoPixelWriter(object):
+class NeoPixelWriter(Writer):
     def __init__(
             self,
             num_pixels: int,
@@ -13,54 +12,91 @@ class NeoPixelWriter(object):
             pixel_order,
             brightness: float = 1.0,
             auto_write: bool = False,
+            layout: Layout = None,
+            gamma: float = GAMMA,
+            dither: bool = True,
     ):
         import neopixel
 
-        self.num_pixels = num_pixels
+        super().__init__(num_pixels, layout)
+        self.channel_offsets = get_channel_offsets(pixel_order)
 
+        # brightness and gamma are applied by the output lookup table once per frame, so the driver does
+        # not scale every pixel again
         self.pixels = neopixel.NeoPixel(
             pin=pixel_pin,
             n=num_pixels,
-            brightness=brightness,
+            brightness=1.0,
             auto_write=auto_write,
             pixel_order=pixel_order,
         )
+        self.output_lut = OutputLUT(brightness=brightness, gamma=gamma, dither=dither)
 
-    def _write(self, color_list: List[Color]):
-        assert len(color_list) == self.num_pixels
+        # last frame sent to the strip, an identical frame is not shown again
+        self._last_wire_frame = None
+        self.skipped_shows = 0
 
-        for i, color in enumerate(color_list):
-            self.pixels[i] = color.to_rgb_tuple()
+    @property
+    def brightness(self) -> float:
+        return self.output_lut.brightness
 
-        self.pixels.show()
+    @brightness.setter
+    def brightness(self, brightness: float):
+        self.output_lut.brightness = brightness
 
-    def write_gradient(self, gradient: Gradient, offset: float):
+    def _get_driver_buffer(self):
         """
-        The pixels are set up like a snake, so the first pixel is next to the last pixel
-
-        Pixel Layout Example
-        3 4
-        2 5
-        1 6
-        0 7
+        The byte buffer the driver transmits on show(). Its name differs between driver versions, and
+        None means the driver has no buffer we can write to directly.
+        """
+        for name in ('_post_brightness_buffer', 'buf'):
+            buf = getattr(self.pixels, name, None)
+            if isinstance(buf, bytearray):
+                offset = getattr(self.pixels, '_offset', 0)
+                return memoryview(buf)[offset:offset + self.num_pixels * len(self.channel_offsets)]
+        return None
+
+    def write_frame(self, wire_frame: BytesLike):
+        """
+        Show a frame that is already in the strip's wire order with brightness applied, in one copy.
+        Nothing is sent when the frame is byte for byte the same as the last one.
 
-        :param gradient:
-        :return:
+        :param wire_frame: len(channel_offsets) bytes per pixel, see lib.pixel_order.pack_frame
         """
-        half_color_list = generate_color_gradient(
-            gradient.color_1,
-            gradient.color_2,
-            int(self.num_pixels / 2),
-            brightness=gradient.brightness,
-            offset=offset,
-        )
+        bytes_per_pixel = len(self.channel_offsets)
+        assert len(wire_frame) == self.num_pixels * bytes_per_pixel
+
+        if wire_frame == self._last_wire_frame:
+            self.skipped_shows += 1
+            return
+        self._last_wire_frame = bytes(wire_frame)
+
+        driver_buffer = self._get_driver_buffer()
+        if driver_buffer is not None:
+            driver_buffer[:] = wire_frame
+        else:
+            # slow path for drivers without a buffer, undo the wire order per pixel
+            for i in range(self.num_pixels):
+                pixel = wire_frame[i * bytes_per_pixel:(i + 1) * bytes_per_pixel]
+                self.pixels[i] = tuple(pixel[offset] for offset in self.channel_offsets[:3])
 
-        color_list = half_color_list + list(reversed(half_color_list))
+        self.pixels.show()
 
-        self._write(color_list)
+    def write_rgb(self, rgb: BytesLike):
+        """
+        :param rgb: output codes, 3 bytes per pixel in RGB order
+        """
+        self.write_frame(pack_frame(rgb, self.channel_offsets))
 
 
-def create_neopixel_writer(pixel_pin=None, num_pixels=None, pixel_order=None) -> NeoPixelWriter:
+def create_neopixel_writer(
+        pixel_pin=None,
+        num_pixels=None,
+        pixel_order=None,
+        layout: Layout = None,
+        gamma: float = GAMMA,
+        dither: bool = True,
+) -> NeoPixelWriter:
     import board
     import neopixel
 
@@ -77,5 +113,6 @@ def create_neopixel_writer(pixel_pin=None, num_pixels=None, pixel_order=None) ->
         # For RGBW NeoPixels, simply change the ORDER to RGBW or GRBW.
         pixel_order = neopixel.GRB
 
-    writer = NeoPixelWriter(num_pixels=num_pixels, pixel_pin=pixel_pin, pixel_order=pixel_order)
+    writer = NeoPixelWriter(num_pixels=num_pixels, pixel_pin=pixel_pin, pixel_order=pixel_order, layout=layout,
+                            gamma=gamma, dither=dither)
     return writer
@@ -0,0 +1,116 @@
+"""
+Output stage of the LED writers: maps the rendered 8 bit values of a frame to the codes sent to the
+strip. Strip brightness, gradient brightness and gamma are folded into one lookup table, so a frame is one
+table lookup, and the table is only rebuilt when one of them changes.
+
+The table holds the output codes with FRACTION_BITS of fraction. With dithering, each channel of each
+pixel carries the fraction it could not show over to the next frame, so dim colors average out to the
+exact level instead of collapsing onto a handful of codes. A frame that stays on the strip for long is
+settled to rounded codes instead, dithering it slowly would flicker.
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# gamma of the LEDs, rendered values are perceptual and the strip's PWM is linear
+GAMMA = 2.2
+
+# brightness is quantized to this many steps, each step has its own table
+BRIGHTNESS_STEPS = 1024
+
+FRACTION_BITS = 8
+_FRACTION_MASK = (1 << FRACTION_BITS) - 1
+
+
+@lru_cache(maxsize=64)
+def get_output_levels(brightness_step: int, gamma: float):
+    """
+    :param brightness_step: brightness in 1 / BRIGHTNESS_STEPS
+    :return: for every 8 bit value, the output code with FRACTION_BITS of fraction
+    """
+    brightness = brightness_step / BRIGHTNESS_STEPS
+    scale = 255 << FRACTION_BITS
+
+    levels = tuple(round(scale * brightness * (value / 255) ** gamma) for value in range(256))
+    if np is None:
+        return levels
+
+    levels = np.array(levels, dtype=np.uint16)
+    levels.setflags(write=False)
+    return levels
+
+
+@lru_cache(maxsize=64)
+def get_output_table(brightness_step: int, gamma: float) -> bytes:
+    """
+    get_output_levels rounded to 8 bit codes, as a table for bytes.translate
+    """
+    half = 1 << (FRACTION_BITS - 1)
+    return bytes((int(level) + half) >> FRACTION_BITS for level in get_output_levels(brightness_step, gamma))
+
+
+class OutputLUT(object):
+    def __init__(self, brightness: float = 1.0, gamma: float = GAMMA, dither: bool = True):
+        """
+        :param brightness: of the strip, multiplies the brightness of every gradient
+        :param gamma: 1 for no gamma correction
+        :param dither: carry the fraction of every code over to the next frame, needs numpy
+        """
+        self.brightness = brightness
+        self.gamma = gamma
+        self.dither = dither and np is not None
+
+        # per channel of every pixel, the fraction not shown yet
+        self._error = None
+        # output levels of the last frame, for refresh
+        self._levels = None
+        # the last frame has fractions that dithering spreads over the next frames
+        self.needs_refresh = False
+
+    def _brightness_step(self, brightness: float) -> int:
+        return round(min(max(self.brightness * brightness, 0.0), 1.0) * BRIGHTNESS_STEPS)
+
+    def apply(self, rgb, brightness: float = 1.0) -> bytes:
+        """
+        :param rgb: rendered frame, 3 bytes per pixel
+        :param brightness: of the gradient the frame was rendered from
+        :return: output codes, 3 bytes per pixel
+        """
+        step = self._brightness_step(brightness)
+        if not self.dither:
+            return bytes(rgb).translate(get_output_table(step, self.gamma))
+
+        levels = get_output_levels(step, self.gamma)[np.frombuffer(rgb, dtype=np.uint8)]
+        self._levels = levels
+        self.needs_refresh = bool((levels & _FRACTION_MASK).any())
+
+        return self._dither(levels)
+
+    def refresh(self) -> bytes:
+        """
+        The last frame again, with the next step of dithering
+        """
+        return self._dither(self._levels)
+
+    def settle(self) -> bytes:
+        """
+        The last frame rounded, without dithering. No refresh is needed after it.
+        """
+        self.needs_refresh = False
+        self._error = None
+        half = 1 << (FRACTION_BITS - 1)
+        return ((self._levels + half) >> FRACTION_BITS).astype(np.uint8).tobytes()
+
+    def _dither(self, levels) -> bytes:
+        error = self._error
+        if error is None or len(error) != len(levels):
+            error = self._error = np.zeros(len(levels), dtype=np.uint16)
+
+        # at most 255.255 + 0.255, which fits 16 bits
+        total = levels + error
+        np.bitwise_and(total, _FRACTION_MASK, out=error)
+
+        return (total >> FRACTION_BITS).astype(np.uint8).tobytes()
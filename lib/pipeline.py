@@ -0,0 +1,311 @@
+"""
+Multi-process mode: the control plane (http server, schedule reloading) stays in the main process, each
+strip gets a render process and an output process. Rendered frames go through a FrameRing in shared
+memory, so the output process reads them in place and frames are never pickled or sent over a pipe.
+
+    main process            render process (per strip)         output process (per strip)
+    SharedState  --pipe-->  LighthausController + RingWriter   FrameRing --> Writer
+                            --> FrameRing ------------------->
+
+Only control state snapshots cross a pipe, and of those only the fields that changed, see SHARED_FIELDS.
+"""
+import multiprocessing
+import sys
+import threading
+import time
+from typing import List
+
+from lib.layout import Layout
+from lib.output_lut import GAMMA, OutputLUT
+from lib.pixel_order import BytesLike
+from lib.state import ControlState, SharedState
+from lib.writer import Writer, create_writer
+
+# frame slots in a ring, the producer can be this many frames ahead before it overwrites unread frames
+RING_SLOTS = 4
+
+# header slots: sequence number of the last published frame, frames the consumer found overwritten
+_LATEST = 0
+_TORN = 1
+HEADER_SLOTS = 8
+
+# ControlState fields the render loop compares by identity. Only the ones that changed are sent to the
+# render processes, the others are kept from the snapshot before.
+SHARED_FIELDS = ('schedule', 'user_gradient', 'fast_mode_ref', 'alert')
+
+
+class FrameRing(object):
+    def __init__(self, frame_size: int, slots: int = RING_SLOTS, name: str = None):
+        """
+        Single producer, single consumer ring of fixed size frames in shared memory. The consumer always
+        takes the newest frame, older unread frames are simply overwritten.
+
+        Each slot carries the sequence number of the frame in it, written after the frame. A reader
+        copies a frame out and then checks that the slot still holds the same sequence number, so a
+        frame the producer overwrote while it was being copied is detected and dropped.
+
+        :param frame_size: bytes per frame
+        :param name: of an existing ring to attach to, a new ring is created if None
+        """
+        from multiprocessing import shared_memory
+
+        self.frame_size = frame_size
+        self.slots = slots
+        self._slot_size = 8 + frame_size
+
+        size = HEADER_SLOTS * 8 + slots * self._slot_size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        buf = self.shm.buf
+        self._header = buf[:HEADER_SLOTS * 8].cast('Q')
+        self._frames = buf[HEADER_SLOTS * 8:size]
+        if self.owner:
+            self._frames[:] = bytes(len(self._frames))
+            self._header[_LATEST] = 0
+            self._header[_TORN] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def latest(self) -> int:
+        """
+        Sequence number of the newest frame, 0 before the first one
+        """
+        return self._header[_LATEST]
+
+    @property
+    def torn_frames(self) -> int:
+        return self._header[_TORN]
+
+    def _slot(self, sequence: int):
+        start = (sequence % self.slots) * self._slot_size
+        return self._frames[start:start + 8].cast('Q'), self._frames[start + 8:start + self._slot_size]
+
+    def write(self, frame: BytesLike) -> int:
+        """
+        :return: sequence number of the frame
+        """
+        sequence = self._header[_LATEST] + 1
+        slot_sequence, slot = self._slot(sequence)
+
+        slot_sequence[0] = 0
+        slot[:] = frame
+        slot_sequence[0] = sequence
+        self._header[_LATEST] = sequence
+
+        return sequence
+
+    def read_latest(self, last_sequence: int, into: bytearray) -> int:
+        """
+        Copy the newest frame into `into` if it is newer than last_sequence
+
+        :return: its sequence number, 0 if there was no new intact frame
+        """
+        sequence = self._header[_LATEST]
+        if sequence <= last_sequence:
+            return 0
+
+        slot_sequence, slot = self._slot(sequence)
+        if slot_sequence[0] != sequence:
+            self._header[_TORN] += 1
+            return 0
+        into[:] = slot
+        if slot_sequence[0] != sequence:
+            self._header[_TORN] += 1
+            return 0
+
+        return sequence
+
+    def close(self):
+        self._header.release()
+        self._frames.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingWriter(Writer):
+    def __init__(self, ring: FrameRing, layout: Layout, frame_ready=None, first_frame=None):
+        """
+        Writer of the render process, renders like any writer and publishes the RGB frame to the ring
+
+        :param frame_ready: multiprocessing.Event set after each frame
+        :param first_frame: multiprocessing.Event set after the first frame only, for the startup time
+        """
+        super().__init__(layout.num_pixels, layout)
+        self.ring = ring
+        self.frame_ready = frame_ready
+        self.first_frame = first_frame
+
+    def write_rgb(self, rgb: BytesLike):
+        self.ring.write(rgb)
+        if self.frame_ready is not None:
+            self.frame_ready.set()
+        if self.first_frame is not None:
+            self.first_frame.set()
+            self.first_frame = None
+
+
+def _snapshot_message(previous: ControlState, snapshot: ControlState):
+    """
+    :return: (snapshot without the shared fields that did not change, names of the ones that did)
+    """
+    changed = tuple(field for field in SHARED_FIELDS if getattr(snapshot, field) is not getattr(previous, field))
+    return snapshot._replace(**{field: None for field in SHARED_FIELDS if field not in changed}), changed
+
+
+def _receive_snapshots(connection, state: SharedState):
+    while True:
+        snapshot, changed = connection.recv()
+        # the render loop spots changes by identity, unpickled copies of unchanged fields would look new
+        current = state.current
+        snapshot = snapshot._replace(**{
+            field: getattr(current, field) for field in SHARED_FIELDS if field not in changed})
+        state.adopt(snapshot)
+
+
+def _render(controller_factory, controller_kwargs, layout: Layout, ring_name: str, frame_ready, first_frame,
+            connection, initial: ControlState, output_lut_kwargs: dict = None):
+    ring = FrameRing(layout.num_pixels * 3, name=ring_name)
+    writer = RingWriter(ring, layout, frame_ready, first_frame)
+    if output_lut_kwargs is not None:
+        writer.output_lut = OutputLUT(**output_lut_kwargs)
+
+    controller = controller_factory(writer=writer, **controller_kwargs)
+    controller.state.adopt(initial)
+
+    threading.Thread(target=_receive_snapshots, args=(connection, controller.state), daemon=True).start()
+
+    controller._run()
+
+
+def _output(backend: str, layout: Layout, ring_name: str, frame_ready, stop):
+    ring = FrameRing(layout.num_pixels * 3, name=ring_name)
+    writer = create_writer(backend, num_pixels=layout.num_pixels, layout=layout)
+    frame = bytearray(ring.frame_size)
+    last_sequence = 0
+
+    try:
+        while not stop.is_set():
+            if not frame_ready.wait(timeout=0.5):
+                continue
+            frame_ready.clear()
+
+            sequence = ring.read_latest(last_sequence, frame)
+            if sequence:
+                last_sequence = sequence
+                writer.write_rgb(frame)
+    finally:
+        writer.close()
+        ring.close()
+
+
+class RenderPipeline(object):
+    def __init__(
+            self,
+            controller_factory,
+            backend: str,
+            layouts: List[Layout],
+            controller_kwargs: dict = None,
+            gamma: float = GAMMA,
+            dither: bool = True,
+    ):
+        """
+        :param controller_factory: called with writer= and controller_kwargs in each render process, e.g.
+            LighthausController. The controller's own state is replaced by the main process' state.
+        :param backend: writer backend of the output processes, one of lib.writer.WRITER_BACKENDS
+        :param layouts: one per strip, each strip gets a render and an output process
+        :param gamma: for the output lookup table, which the render process applies for LED backends
+        """
+        if backend == 'neopixel' and len(layouts) > 1:
+            raise ValueError('A unit drives one neopixel strip, run one unit per strip with --strip')
+
+        self.controller_factory = controller_factory
+        self.backend = backend
+        self.layouts = layouts
+        self.controller_kwargs = controller_kwargs or {}
+        # the output process only copies frames to the strip, so the render process applies the table
+        self.output_lut_kwargs = dict(gamma=gamma, dither=dither) if backend == 'neopixel' else None
+
+        self.rings = []
+        self.processes = []
+        # set by each render process after its first frame, frame_ready is cleared by the output process
+        self.first_frames = []
+        self._connections = []
+        self._stop = multiprocessing.Event()
+
+    def start(self, state: SharedState):
+        """
+        Start the render and output processes, and a thread forwarding the state's snapshots to them
+        """
+        initial = state.current
+
+        for layout in self.layouts:
+            ring = FrameRing(layout.num_pixels * 3)
+            frame_ready = multiprocessing.Event()
+            first_frame = multiprocessing.Event()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+
+            self.processes += [
+                multiprocessing.Process(
+                    target=_render,
+                    args=(self.controller_factory, self.controller_kwargs, layout, ring.name, frame_ready,
+                          first_frame, receiver, initial, self.output_lut_kwargs),
+                    daemon=True,
+                ),
+                multiprocessing.Process(
+                    target=_output,
+                    args=(self.backend, layout, ring.name, frame_ready, self._stop),
+                    daemon=True,
+                ),
+            ]
+            self.rings.append(ring)
+            self.first_frames.append(first_frame)
+            self._connections.append(sender)
+
+        for process in self.processes:
+            process.start()
+
+        threading.Thread(target=self._forward_snapshots, args=(state, initial), daemon=True).start()
+
+        print('Started {} render and output processes'.format(len(self.processes)))
+        sys.stdout.flush()
+
+    def wait_for_first_frame(self, timeout: float = None) -> bool:
+        """
+        Block until every strip has rendered its first frame
+
+        :param timeout: seconds to wait in total
+        :return: False if the timeout ran out first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for first_frame in self.first_frames:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not first_frame.wait(timeout=remaining):
+                return False
+        return True
+
+    def _forward_snapshots(self, state: SharedState, snapshot: ControlState):
+        while True:
+            state.wait_for_change(snapshot.version)
+
+            previous, snapshot = snapshot, state.current
+            message = _snapshot_message(previous, snapshot)
+            for connection in self._connections:
+                connection.send(message)
+
+    def stop(self):
+        self._stop.set()
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for ring in self.rings:
+            ring.close()
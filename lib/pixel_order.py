@@ -0,0 +1,46 @@
+"""
+Conversion of RGB frames into the byte order a strip expects on the wire (GRB, RGBW, ...).
+
+All of these work on whole frames with bytes/bytearray slicing, so a frame costs
+a handful of C level copies no matter how long the strip is.
+"""
+from typing import Tuple, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def get_channel_offsets(pixel_order) -> Tuple[int, ...]:
+    """
+    Byte offset of the red, green, blue (and white) channel within one pixel.
+
+    :param pixel_order: a neopixel pixel order, either a string like 'GRB' or 'GRBW' (newer drivers) or
+        a tuple of channel offsets like (1, 0, 2) (older drivers)
+    :return:
+    """
+    if isinstance(pixel_order, str):
+        channels = 'RGBW' if len(pixel_order) == 4 else 'RGB'
+        return tuple(pixel_order.index(channel) for channel in channels)
+
+    return tuple(pixel_order)
+
+
+def pack_frame(rgb: BytesLike, channel_offsets: Tuple[int, ...]) -> bytearray:
+    """
+    Reorder a packed RGB frame into wire order, once for the whole frame. Brightness is already applied,
+    see lib.output_lut.
+
+    :param rgb: 3 bytes per pixel in RGB order
+    :param channel_offsets: from get_channel_offsets
+    :return: len(channel_offsets) bytes per pixel, the white channel of RGBW strips is left off
+    """
+    bytes_per_pixel = len(channel_offsets)
+    num_pixels = len(rgb) // 3
+
+    if channel_offsets == (0, 1, 2):
+        return bytearray(rgb)
+
+    wire = bytearray(num_pixels * bytes_per_pixel)
+    for channel, offset in enumerate(channel_offsets[:3]):
+        wire[offset::bytes_per_pixel] = rgb[channel::3]
+
+    return wire
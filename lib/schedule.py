@@ -1,182 +1,406 @@
+from array import array
+from bisect import bisect_right
 import csv
 import datetime
+import hashlib
+import io
+import os
 from collections import namedtuple
-import queue
-from typing import Tuple, List
+import sys
+from typing import Tuple
 import threading
 import time
 
-import maya
-import requests
-
-from lib.gradient import Gradient, interpolate_gradients
+from lib.effects import get_effect
+from lib.gradient import DEFAULT_EFFECT, Gradient, GradientBuffer, interpolate_gradients, interpolate_gradients_into
 from lib.color import Color
+from lib.solar import Location, SAN_FRANCISCO, get_sun_times
+from lib.state import SharedState
+from lib.timeline import Timeline, build_timeline, load_timeline
 
 
-def get_seconds_into_day(warp_reference = None, speed = 1.0):
-    now = datetime.datetime.now()
-    if not warp_reference is None:
-        warp_diff = now - warp_reference
-        now += warp_diff * speed
-    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+SUNRISE_SUNSET_QUERY_URL = (
+    'https://api.sunrise-sunset.org/json?lat={lat}&lng={lng}&date={date_string}&formatted=0'
+)
 
-    seconds_into_day = (now - midnight).total_seconds()
-    return seconds_into_day
+# difference between the offline solar calculation and the web api that is worth reporting
+SUN_TIMES_TOLERANCE_SECONDS = 5 * 60
 
 
-def get_seconds_since_epoch():
-    now = datetime.datetime.now()
-    epoch = datetime.datetime.utcfromtimestamp(0)
+def get_sunrise_and_sunset_seconds(
+        date: datetime.date = None,
+        location: Location = SAN_FRANCISCO,
+) -> Tuple[int, int]:
+    if date is None:
+        date = datetime.date.today()
 
-    seconds_now = (now - epoch).total_seconds()
-    return seconds_now
+    return get_sun_times(date, location)
 
 
-SUNRISE_SUNSET_QUERY_URL = (
-    'https://api.sunrise-sunset.org/json?lat=37.7749&lng=-122.4194&date={date_string}&formatted=0'
-)
+def get_sunrise_and_sunset_seconds_from_api(
+        date: datetime.date = None,
+        location: Location = SAN_FRANCISCO,
+) -> Tuple[int, int]:
+    """
+    Sunrise and sunset from api.sunrise-sunset.org. This blocks on the network, so it is only used
+    to cross-check the offline calculation.
+    """
+    import maya
+    import requests
 
+    if date is None:
+        date = datetime.date.today()
 
-def get_sunrise_and_sunset_seconds() -> Tuple[int, int]:
-    query_url = SUNRISE_SUNSET_QUERY_URL.format(date_string=datetime.date.today().isoformat())
-    json_resp = requests.get(query_url).json()
+    query_url = SUNRISE_SUNSET_QUERY_URL.format(
+        lat=location.latitude, lng=location.longitude, date_string=date.isoformat())
+    json_resp = requests.get(query_url, timeout=10).json()
 
-    midnight = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    midnight = datetime.datetime.combine(date, datetime.time())
 
-    sunrise_dt = maya.parse(json_resp['results']['sunrise']).datetime(to_timezone='US/Pacific', naive=True)
+    sunrise_dt = maya.parse(json_resp['results']['sunrise']).datetime(to_timezone=location.timezone, naive=True)
     sunrise_secs = (sunrise_dt - midnight).total_seconds()
 
-    sunset_dt = maya.parse(json_resp['results']['sunset']).datetime(to_timezone='US/Pacific', naive=True)
+    sunset_dt = maya.parse(json_resp['results']['sunset']).datetime(to_timezone=location.timezone, naive=True)
     sunset_secs = (sunset_dt - midnight).total_seconds()
 
     return int(sunrise_secs), int(sunset_secs)
 
 
-def get_gradients_from_schedule_file(schedule_file_name: str) -> List[Gradient]:
-    sunrise_secs, sunset_secs = get_sunrise_and_sunset_seconds()
+def cross_check_sun_times(date: datetime.date = None, location: Location = SAN_FRANCISCO) -> bool:
+    """
+    Compare the offline sun times with the web api and report if they disagree. Network failures
+    are reported and otherwise ignored.
 
-    gradients = []
+    :return: True if the two sources agree
+    """
+    offline = get_sunrise_and_sunset_seconds(date, location)
+    try:
+        online = get_sunrise_and_sunset_seconds_from_api(date, location)
+    except Exception as e:
+        print('Could not cross-check sun times: {!r}'.format(e))
+        sys.stdout.flush()
+        return False
 
-    with open(schedule_file_name) as schedule_file:
-        reader = csv.DictReader(schedule_file)
+    agree = all(abs(a - b) <= SUN_TIMES_TOLERANCE_SECONDS for a, b in zip(offline, online))
+    if not agree:
+        print('Sun times disagree: offline {} vs api {}'.format(offline, online))
+        sys.stdout.flush()
 
-        for line in reader:
-            time_string = line['timeslot']
+    return agree
 
-            if time_string == 'SR':
-                seconds = sunrise_secs
-            elif time_string == 'SS':
-                seconds = sunset_secs
-            else:
-                [hour, minute] = time_string.split(':')
-                seconds = int(hour) * 3600 + int(minute) * 60
 
-            color_1 = Color(
-                red=int(line['red_1']),
-                green=int(line['green_1']),
-                blue=int(line['blue_1']),
-            )
+def parse_schedule(schedule_text: str, sunrise_secs: int, sunset_secs: int) -> Tuple[Gradient, ...]:
+    """
+    Parse the csv text of a schedule file into gradients sorted by time of day. Raises csv.Error,
+    ValueError, TypeError, KeyError or AssertionError for malformed schedules.
+    """
+    gradients = []
 
-            color_2 = Color(
-                red=int(line['red_2']),
-                green=int(line['green_2']),
-                blue=int(line['blue_2']),
-            )
+    reader = csv.DictReader(io.StringIO(schedule_text))
+
+    for line in reader:
+        time_string = line['timeslot']
 
-            gradients.append(
-                Gradient(
-                    seconds=seconds,
-                    color_1=color_1,
-                    color_2=color_2,
-                    brightness=float(line['brightness']) / 100.0,
-                    scroll_speed=float(line['scroll_speed']),
-                )
+        if time_string == 'SR':
+            seconds = sunrise_secs
+        elif time_string == 'SS':
+            seconds = sunset_secs
+        else:
+            [hour, minute] = time_string.split(':')
+            seconds = int(hour) * 3600 + int(minute) * 60
+
+        color_1 = Color.validated(
+            red=int(line['red_1']),
+            green=int(line['green_1']),
+            blue=int(line['blue_1']),
+        )
+
+        color_2 = Color.validated(
+            red=int(line['red_2']),
+            green=int(line['green_2']),
+            blue=int(line['blue_2']),
+        )
+
+        # the effect column is optional, empty for the plain gradient
+        effect = line.get('effect') or DEFAULT_EFFECT
+        get_effect(effect)
+
+        gradients.append(
+            Gradient(
+                seconds=seconds,
+                color_1=color_1,
+                color_2=color_2,
+                brightness=float(line['brightness']) / 100.0,
+                scroll_speed=float(line['scroll_speed']),
+                effect=effect,
             )
-        return sorted(gradients, key=lambda gradient: gradient.seconds)
+        )
 
+    if not gradients:
+        raise ValueError('Schedule has no timeslots')
 
-SECONDS_IN_DAY = 24 * 60 * 60
+    return tuple(sorted(gradients, key=lambda gradient: gradient.seconds))
 
 
-# Returns a functions that will quickly interpolate based on "now"
-def get_scheduled_gradient_interpolator(
-        schedule_file_name: str = 'color_schedule.csv'
+SECONDS_IN_DAY = 24 * 60 * 60
+
+# A parsed schedule for one day. Never mutated once built, a changed file or day builds a new one.
+#
+# times/keyframes are the gradients' times of day with a wrap-around sentinel on each side (the last
+# keyframe of the previous day and the first keyframe of the next day), so any time of day lies
+# between keyframes[i] and keyframes[i + 1] for the i found by one bisect of times.
+#
+# timeline is the day precomputed by lib.timeline, None to interpolate the keyframes every lookup.
+#
+# effects are the names of the effects the gradients use, sorted, which timeline records refer to by index.
+CompiledSchedule = namedtuple(
+    'CompiledSchedule',
+    ['gradients', 'date', 'sun_times', 'content_hash', 'times', 'keyframes', 'timeline', 'effects'])
+
+
+def compile_schedule(
+        gradients: Tuple[Gradient, ...],
+        date: datetime.date = None,
+        sun_times: Tuple[int, int] = None,
+        content_hash: str = None,
+        timeline: Timeline = None,
+) -> CompiledSchedule:
+    """
+    :param gradients: sorted by time of day
+    """
+    first = gradients[0]
+    last = gradients[-1]
+
+    times = array('d', [last.seconds - SECONDS_IN_DAY])
+    times.extend(gradient.seconds for gradient in gradients)
+    times.append(first.seconds + SECONDS_IN_DAY)
+
+    return CompiledSchedule(
+        gradients=gradients,
+        date=date,
+        sun_times=sun_times,
+        content_hash=content_hash,
+        times=times,
+        keyframes=(last,) + tuple(gradients) + (first,),
+        timeline=timeline,
+        effects=tuple(sorted({gradient.effect for gradient in gradients})),
+    )
+
+
+class ScheduleLoader(object):
+    def __init__(
+            self,
+            schedule_file_name: str = 'color_schedule.csv',
+            location: Location = SAN_FRANCISCO,
+            timeline_resolution: float = 1.0,
+            timeline_file_name: str = None,
+            defer_timeline: bool = False,
+    ):
+        """
+        Keeps the last good compiled schedule and only recompiles when the schedule file or the day
+        (and so sunrise/sunset) changes.
+
+        :param schedule_file_name:
+        :param location: where to compute sunrise (SR) and sunset (SS) for
+        :param timeline_resolution: seconds between the steps of the precomputed day, see lib.timeline.
+            None to interpolate the schedule every frame instead.
+        :param timeline_file_name: defaults to the schedule file name with .timeline appended
+        :param defer_timeline: only map a timeline that is already on disk in poll, building a new one is
+            left to build_pending_timeline. The schedule interpolates until then.
+        """
+        self.schedule_file_name = schedule_file_name
+        self.location = location
+        self.timeline_resolution = timeline_resolution
+        self.timeline_file_name = timeline_file_name or schedule_file_name + '.timeline'
+        self.defer_timeline = defer_timeline
+        # the current schedule still needs its timeline built
+        self.timeline_pending = False
+
+        # last schedule that parsed, kept when the file is broken
+        self.schedule = None
+        # last parse error, None when the file on disk compiled
+        self.error = None
+
+        # (mtime, size, date) of the last attempt, so an unchanged file is not even read
+        self._last_attempt = None
+
+    def poll(self, date: datetime.date = None) -> bool:
+        """
+        :param date: day to compile for, today by default
+        :return: True if a new schedule was compiled
+        """
+        if date is None:
+            date = datetime.date.today()
+
+        try:
+            stat = os.stat(self.schedule_file_name)
+            attempt = (stat.st_mtime_ns, stat.st_size, date)
+            if attempt == self._last_attempt:
+                return False
+
+            with open(self.schedule_file_name, 'rb') as schedule_file:
+                content = schedule_file.read()
+        except OSError as e:
+            return self._report_error(e)
+
+        self._last_attempt = attempt
+
+        content_hash = hashlib.sha1(content).hexdigest()
+        if (
+                self.schedule is not None
+                and self.schedule.content_hash == content_hash
+                and self.schedule.date == date
+        ):
+            # touched, but not changed
+            return False
+
+        try:
+            sun_times = get_sunrise_and_sunset_seconds(date, self.location)
+            gradients = parse_schedule(content.decode('utf-8'), *sun_times)
+        except (csv.Error, ValueError, TypeError, KeyError, AssertionError) as e:
+            return self._report_error(e)
+
+        schedule = compile_schedule(
+            gradients,
+            date=date,
+            sun_times=sun_times,
+            content_hash=content_hash,
+        )
+        self.schedule = schedule._replace(timeline=self._get_timeline(schedule, build=not self.defer_timeline))
+        self.timeline_pending = self.timeline_resolution is not None and self.schedule.timeline is None
+        self.error = None
+
+        print('Compiled schedule {} for {}'.format(self.schedule_file_name, date))
+        sys.stdout.flush()
+
+        return True
+
+    def build_pending_timeline(self) -> bool:
+        """
+        Build the timeline poll left to do
+
+        :return: True if the schedule now has its timeline
+        """
+        if not self.timeline_pending:
+            return False
+        self.timeline_pending = False
+
+        timeline = self._get_timeline(self.schedule, build=True)
+        if timeline is None:
+            return False
+
+        self.schedule = self.schedule._replace(timeline=timeline)
+        return True
+
+    def _get_timeline(self, schedule: CompiledSchedule, build: bool) -> Timeline:
+        if self.timeline_resolution is None:
+            return None
+
+        timeline = load_timeline(self.timeline_file_name, schedule.content_hash, schedule.date,
+                                 schedule.sun_times, self.timeline_resolution)
+        if timeline is not None or not build:
+            return timeline
+
+        try:
+            return build_timeline(self.timeline_file_name, schedule, self.timeline_resolution)
+        except OSError as e:
+            print('Could not write timeline {}, interpolating the schedule instead: {!r}'.format(
+                self.timeline_file_name, e))
+            sys.stdout.flush()
+            return None
+
+    def _report_error(self, error: Exception) -> bool:
+        if repr(error) != repr(self.error):
+            print('Bad schedule file {}, keeping the last good schedule: {!r}'.format(
+                self.schedule_file_name, error))
+            sys.stdout.flush()
+        self.error = error
+        return False
+
+
+def get_scheduled_gradient(
+        schedule: CompiledSchedule,
+        seconds_into_day: float,
+        target: GradientBuffer = None,
 ) -> Gradient:
     """
-    Get scheduled colors. The schedule file stores a series of points in the day. Each point of the day
-    has two colors.
+    Interpolate the schedule at a time of day. Finding the keyframes on either side is one bisect of
+    the compiled keyframe times, so dense schedules cost the same per frame as sparse ones.
 
-    We look at the current time of day, find the time points on either side, and interpolate between
-    those two time points.
+    With a precomputed timeline the lookup is an index into it instead, at the timeline's resolution.
 
-    This is the only part of the code where the time of day is in the seconds slot of Gradient. When
-    this returns it has seconds as now since epoch, as with all other gradients
+    The returned gradient has the time of day in its seconds slot.
 
-    :param schedule_file_name:
-    :return: (color_1, color_2, brightness, speed) - scheduled colors
+    :param target: buffer to write the result into instead of allocating a new Gradient
     """
-    gradients = get_gradients_from_schedule_file(schedule_file_name)
-
-    def schedule_interpolator(ref: datetime.datetime, speedup_factor: float):
-        # Get time points before and after the current time
-        min_seconds = gradients[0].seconds
-        max_seconds = gradients[-1].seconds
+    if schedule.timeline is not None:
+        return schedule.timeline.gradient_at(seconds_into_day, target, schedule.effects)
 
-        seconds_into_day = get_seconds_into_day(ref, speedup_factor)
+    times = schedule.times
 
-        if seconds_into_day <= min_seconds or seconds_into_day >= max_seconds:
-            gradient_1 = gradients[-1]
-            gradient_2 = gradients[0]
-
-            gradient_1_to_midnight = SECONDS_IN_DAY - gradient_1.seconds
-
-            # (seconds from midnight to gradient_2) + (seconds from gradient_1 to end of day)
-            delta_between_gradients = gradient_2.seconds + gradient_1_to_midnight
-
-            if seconds_into_day <= min_seconds:
-                ratio = (gradient_1_to_midnight + seconds_into_day) / delta_between_gradients
-            else:
-                assert seconds_into_day >= max_seconds
-                ratio = (seconds_into_day - gradient_1.seconds) / delta_between_gradients
-        else:
-            earlier_gradients = [
-                g for g in gradients
-                if g.seconds <= seconds_into_day
-            ]
-            later_gradients = [
-                g for g in gradients
-                if g.seconds >= seconds_into_day
-            ]
+    # last keyframe at or before now; the sentinels keep i and i + 1 in range
+    i = bisect_right(times, seconds_into_day) - 1
 
-            gradient_1 = earlier_gradients[-1]
-            gradient_2 = later_gradients[0]
+    delta_between_gradients = times[i + 1] - times[i]
+    if delta_between_gradients > 0:
+        ratio = (seconds_into_day - times[i]) / delta_between_gradients
+    else:
+        ratio = 0
 
-            if gradient_1 == gradient_2:
-                ratio = 0
-            else:
-                delta_between_gradients = gradient_2.seconds - gradient_1.seconds
-                ratio = (seconds_into_day - gradient_1.seconds) / delta_between_gradients
+    if target is not None:
+        return interpolate_gradients_into(target, schedule.keyframes[i], schedule.keyframes[i + 1], ratio)
+    return interpolate_gradients(schedule.keyframes[i], schedule.keyframes[i + 1], ratio)
 
-        scheduled_gradient = interpolate_gradients(gradient_1, gradient_2, ratio)
-        scheduled_gradient.seconds = get_seconds_since_epoch()
-
-        return scheduled_gradient
-
-    return schedule_interpolator
 
+def update_from_schedule_continuously(
+        state: SharedState,
+        schedule_file_name: str = 'color_schedule.csv',
+        location: Location = SAN_FRANCISCO,
+        cross_check: bool = False,
+        poll_interval: float = 1.0,
+        loader: ScheduleLoader = None,
+):
+    """
+    :param loader: to keep polling, e.g. the one the first schedule was loaded with at startup
+    """
+    if loader is None:
+        loader = ScheduleLoader(schedule_file_name, location, defer_timeline=True)
+    checked_date = None
 
-def update_from_schedule_continuously(out_q: queue.Queue):
     while True:
-        schedule_interpolator = get_scheduled_gradient_interpolator()
-
-        out_q.put({
-            'schedule_interpolator': schedule_interpolator 
-        })
-
-        time.sleep(1)
-
-
-def update_from_schedule_async(out_q: queue.Queue):
-    thread = threading.Thread(target=update_from_schedule_continuously, kwargs=dict(out_q=out_q), daemon=True)
+        # only republish when the file or the day actually changed
+        if loader.poll():
+            state.publish(schedule=loader.schedule)
+
+        # the schedule is already shown while its timeline is built
+        if loader.build_pending_timeline():
+            state.publish(schedule=loader.schedule)
+
+        # the network is only ever used after the schedule is up
+        if cross_check and checked_date != datetime.date.today():
+            checked_date = datetime.date.today()
+            cross_check_sun_times(checked_date, location)
+
+        time.sleep(poll_interval)
+
+
+def update_from_schedule_async(
+        state: SharedState,
+        schedule_file_name: str = 'color_schedule.csv',
+        location: Location = SAN_FRANCISCO,
+        cross_check: bool = False,
+        loader: ScheduleLoader = None,
+):
+    thread = threading.Thread(
+        target=update_from_schedule_continuously,
+        kwargs=dict(
+            state=state,
+            schedule_file_name=schedule_file_name,
+            location=location,
+            cross_check=cross_check,
+            loader=loader,
+        ),
+        daemon=True,
+    )
     thread.start()
 
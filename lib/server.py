@@ -1,63 +1,138 @@
+import datetime
+from math import isfinite
 from typing import Dict
 
-from flask import Flask, request, jsonify
-import queue
+from flask import Flask, Response, request, jsonify
 import sys
 
 from lib.color import Color
-from lib.gradient import Gradient
-from lib.schedule import get_seconds_since_epoch
+from lib.compositor import Alert
+from lib.effects import get_effect
+from lib.gradient import DEFAULT_EFFECT, Gradient
+from lib.metrics import FrameMetrics
+from lib.state import SharedState
+from lib.user_input import GradientInbox, RateLimiter
 from lib.utils import clamp
 
 
 def get_color_from_dict(color_dict: Dict[str, int]) -> Color:
-    return Color(
+    return Color.validated(
         red=color_dict['r'],
         green=color_dict['g'],
         blue=color_dict['b'],
     )
 
 
-def set_user_gradient(out_q: queue.Queue):
-    request_json = request.get_json()
-    color_1 = get_color_from_dict(request_json['color'][0])
-    color_2 = get_color_from_dict(request_json['color'][1])
+# most gradients one batch request can queue, and the latest one can start
+MAX_BATCH_LENGTH = 256
+MAX_BATCH_DELAY = 24 * 60 * 60.0
 
-    scroll_speed = request_json.get('scroll_speed', 0.5)
+# seconds an alert is shown for, by default and at most
+ALERT_DURATION = 3.0
+MAX_ALERT_DURATION = 60.0
+
+
+def get_finite(value) -> float:
+    """
+    :raise ValueError: for NaN and infinities, which would get through clamp
+    """
+    value = float(value)
+    if not isfinite(value):
+        raise ValueError('{!r} is not a finite number'.format(value))
+    return value
+
+
+def get_gradient_from_dict(gradient_dict: Dict) -> Gradient:
+    color_1 = get_color_from_dict(gradient_dict['color'][0])
+    color_2 = get_color_from_dict(gradient_dict['color'][1])
+
+    scroll_speed = get_finite(gradient_dict.get('scroll_speed', 0.5))
     scroll_speed = clamp(scroll_speed, 0, 1)
 
-    brightness = request_json.get('brightness', 0.5)
+    brightness = get_finite(gradient_dict.get('brightness', 0.5))
     brightness = clamp(brightness, 0, 1)
 
+    effect = get_effect(gradient_dict.get('effect', DEFAULT_EFFECT)).name
+
+    # the render loop times layers by its own clock from when it picks the gradient up
+    return Gradient(
+        seconds=0,
+        color_1=color_1,
+        color_2=color_2,
+        scroll_speed=scroll_speed,
+        brightness=brightness,
+        effect=effect,
+    )
+
+
+def set_user_gradient(inbox: GradientInbox, limiter: RateLimiter):
+    # Nothing is printed per request, a busy color picker would back up stdout and the journal
+    if not limiter.allow(request.remote_addr):
+        return jsonify({'success': False}), 429
+
     try:
-        user_gradient = Gradient(
-            seconds=get_seconds_since_epoch(),
-            color_1=color_1,
-            color_2=color_2,
-            scroll_speed=scroll_speed,
-            brightness=brightness,
-        )
+        user_gradient = get_gradient_from_dict(request.get_json())
+    except (TypeError, ValueError, KeyError, IndexError, AttributeError):
+        return jsonify({'success': False}), 400
 
-        out_q.put({
-            'user_gradient': user_gradient
-        })
+    # accepted, the render loop picks up the latest gradient within the inbox window
+    inbox.submit(user_gradient)
 
-        print('Received new gradient: {}'.format(user_gradient))
-        sys.stdout.flush()
+    return jsonify({'success': True}), 202
 
-        return jsonify({'success': True}), 201
-    except:
-        print('Received bad request: {}'.format(request.json))
-        sys.stdout.flush()
+
+def set_user_gradient_sequence(inbox: GradientInbox, limiter: RateLimiter):
+    """
+    Queue a timed sequence of gradients, {"gradients": [{"delay": seconds from now, "color": ...}, ...]}
+    with non decreasing delays. It replaces any gradients still queued.
+    """
+    if not limiter.allow(request.remote_addr):
+        return jsonify({'success': False}), 429
+
+    try:
+        sequence = []
+        for gradient_dict in request.get_json()['gradients']:
+            delay = get_finite(gradient_dict.get('delay', 0))
+            if not 0 <= delay <= MAX_BATCH_DELAY:
+                raise ValueError('delays must be 0 to {} seconds'.format(MAX_BATCH_DELAY))
+            if sequence and delay < sequence[-1][0]:
+                raise ValueError('delays must not decrease')
+            sequence.append((delay, get_gradient_from_dict(gradient_dict)))
+
+        if not 0 < len(sequence) <= MAX_BATCH_LENGTH:
+            raise ValueError('batch must have 1 to {} gradients'.format(MAX_BATCH_LENGTH))
+    except (TypeError, ValueError, KeyError, IndexError, AttributeError):
         return jsonify({'success': False}), 400
 
-def set_fast_mode(out_q: queue.Queue):
+    inbox.submit_sequence(sequence)
+
+    return jsonify({'success': True, 'queued': len(sequence)}), 202
+
+def set_alert(state: SharedState, limiter: RateLimiter):
+    """
+    Show a gradient over the schedule and user gradients, {"color": ..., "duration": seconds}
+    """
+    if not limiter.allow(request.remote_addr):
+        return jsonify({'success': False}), 429
+
+    try:
+        alert_dict = request.get_json()
+        duration = clamp(get_finite(alert_dict.get('duration', ALERT_DURATION)), 0, MAX_ALERT_DURATION)
+        alert = Alert(gradient=get_gradient_from_dict(alert_dict), duration=duration)
+    except (TypeError, ValueError, KeyError, IndexError, AttributeError):
+        return jsonify({'success': False}), 400
+
+    state.publish(alert=alert)
+
+    return jsonify({'success': True}), 202
+
+def set_fast_mode(state: SharedState):
     try:
         print(request.json)
         sys.stdout.flush()
-        out_q.put({
-            'fast_mode': request.json['fast_mode']
-        })
+        state.publish(
+            fast_mode_ref=datetime.datetime.now() if request.json['fast_mode'] else None
+        )
 
         print('Received new fast mode: {}'.format(request.json['fast_mode']))
         sys.stdout.flush()
@@ -68,15 +143,56 @@ def set_fast_mode(out_q: queue.Queue):
         sys.stdout.flush()
         return jsonify({'success': False}), 400
 
-def setup_endpoint(app, out_q: queue.Queue):
+def get_metrics(metrics: FrameMetrics, inbox: GradientInbox, limiter: RateLimiter):
+    metrics.coalesced_inputs = inbox.coalesced
+    metrics.rate_limited_requests = limiter.limited
+    return Response(metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def add_routes(
+        app,
+        state: SharedState,
+        metrics: FrameMetrics = None,
+        inbox: GradientInbox = None,
+        limiter: RateLimiter = None,
+) -> GradientInbox:
+    """
+    :return: the inbox user gradients go through, started unless one was passed in
+    """
+    if inbox is None:
+        inbox = GradientInbox(state)
+        inbox.start()
+    if limiter is None:
+        limiter = RateLimiter()
+
     app.add_url_rule(
         '/',
         view_func=set_user_gradient,
-        defaults={'out_q': out_q},
+        defaults={'inbox': inbox, 'limiter': limiter},
+        methods=['POST'])
+    app.add_url_rule(
+        '/batch',
+        view_func=set_user_gradient_sequence,
+        defaults={'inbox': inbox, 'limiter': limiter},
+        methods=['POST'])
+    app.add_url_rule(
+        '/alert',
+        view_func=set_alert,
+        defaults={'state': state, 'limiter': limiter},
         methods=['POST'])
     app.add_url_rule(
         '/fast_mode',
         view_func=set_fast_mode,
-        defaults={'out_q': out_q},
+        defaults={'state': state},
         methods=['POST'])
-    app.run(host='0.0.0.0', debug=False)
+    if metrics is not None:
+        app.add_url_rule(
+            '/metrics',
+            view_func=get_metrics,
+            defaults={'metrics': metrics, 'inbox': inbox, 'limiter': limiter},
+            methods=['GET'])
+
+    return inbox
+
+def setup_endpoint(app, state: SharedState, metrics: FrameMetrics = None):
+    add_routes(app, state, metrics=metrics)
+    app.run(host='0.0.0.0', debug=False, threaded=True)
@@ -0,0 +1,195 @@
+"""
+Runs the controller against simulated time, as fast as it goes, to check a schedule without a strip and
+without waiting for the day to pass. Used by simulate.py.
+"""
+from collections import namedtuple
+import struct
+from time import perf_counter
+from typing import List
+import zlib
+
+from lib.clock import SECONDS_IN_DAY, SimulatedClock
+from lib.gradient import Gradient
+from lib.pixel_order import BytesLike
+from lib.writer import Writer
+
+SimulationResult = namedtuple('SimulationResult', ['frames', 'samples', 'simulated_seconds', 'elapsed'])
+
+# a user gradient sent at a time of day
+UserInput = namedtuple('UserInput', ['seconds_into_day', 'gradient'])
+
+CSV_COLUMNS = [
+    'time', 'seconds_into_day', 'red_1', 'green_1', 'blue_1', 'red_2', 'green_2', 'blue_2', 'brightness',
+    'scroll_speed', 'offset', 'effect',
+]
+
+
+def parse_time_of_day(text: str) -> float:
+    """
+    :param text: H:MM or H:MM:SS, 24:00 for the end of the day
+    """
+    parts = [float(part) for part in text.split(':')]
+    if not 2 <= len(parts) <= 3:
+        raise ValueError('Not a time of day: {}'.format(text))
+
+    seconds = parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0)
+    if not 0 <= seconds <= 24 * 3600:
+        raise ValueError('Not a time of day: {}'.format(text))
+    return seconds
+
+
+def format_time_of_day(seconds_into_day: float) -> str:
+    seconds = int(seconds_into_day)
+    return '{:02d}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class CaptureWriter(Writer):
+    """
+    Keeps the last frame written, which is also the frame on the strip when a frame was skipped
+    """
+    def __init__(self, num_pixels: int):
+        super().__init__(num_pixels)
+        self.frame = bytes(num_pixels * 3)
+        self.frames = 0
+
+    def write_rgb(self, rgb: BytesLike):
+        self.frame = bytes(rgb)
+        self.frames += 1
+
+
+class StripImage(object):
+    def __init__(self, file_name: str, width: int, height: int):
+        """
+        An image with one row per sample of the strip, written row by row. PNG if the file name ends in
+        .png, binary PPM otherwise.
+        """
+        self.file_name = file_name
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.is_png = file_name.lower().endswith('.png')
+
+        self._file = open(file_name, 'wb')
+        if self.is_png:
+            self._file.write(b'\x89PNG\r\n\x1a\n')
+            self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            self._compressor = zlib.compressobj()
+            self._data = bytearray()
+        else:
+            self._file.write('P6\n{} {}\n255\n'.format(width, height).encode('ascii'))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self._file.write(struct.pack('>I', len(data)) + kind + data)
+        self._file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def add_row(self, rgb: BytesLike):
+        assert len(rgb) == self.width * 3 and self.rows < self.height
+        self.rows += 1
+
+        if not self.is_png:
+            self._file.write(rgb)
+            return
+
+        # filter type 0 per row
+        self._data += self._compressor.compress(b'\x00' + bytes(rgb))
+        if len(self._data) > 1 << 16:
+            self._chunk(b'IDAT', bytes(self._data))
+            self._data.clear()
+
+    def close(self):
+        if self.is_png:
+            self._chunk(b'IDAT', bytes(self._data + self._compressor.flush()))
+            self._chunk(b'IEND', b'')
+        self._file.close()
+
+
+def simulate(
+        controller_factory,
+        schedule,
+        start: float = 0.0,
+        end: float = 24 * 3600,
+        fps: float = 10.0,
+        sample_interval: float = 1.0,
+        num_pixels: int = 120,
+        user_inputs: List[UserInput] = (),
+        on_sample=None,
+) -> SimulationResult:
+    """
+    Render frames from start to end of the day at fps simulated frames per second, without sleeping
+
+    :param controller_factory: called with writer= and clock=, e.g. LighthausController
+    :param schedule: lib.schedule.CompiledSchedule
+    :param end: at or before start to run across midnight into the next day
+    :param sample_interval: simulated seconds between calls of on_sample
+    :param user_inputs: sent at the first frame at or after their time of day
+    :param on_sample: called with (seconds_into_day, gradient written, scroll offset, rgb frame)
+    """
+    clock = SimulatedClock(seconds_into_day=start)
+    writer = CaptureWriter(num_pixels)
+    controller = controller_factory(writer=writer, clock=clock)
+    controller.state.publish(schedule=schedule)
+
+    frame_interval = 1.0 / fps
+    num_frames = get_num_frames(start, end, fps)
+    frames_per_sample = get_frames_per_sample(fps, sample_interval)
+    samples = 0
+    # in order of the seconds since start they are due at
+    pending_inputs = sorted(
+        (((user_input.seconds_into_day - start) % SECONDS_IN_DAY, user_input.gradient)
+         for user_input in user_inputs),
+        key=lambda pending_input: pending_input[0],
+    )
+
+    started = perf_counter()
+    for frame in range(num_frames):
+        simulated = frame * frame_interval
+        seconds_into_day = (start + simulated) % SECONDS_IN_DAY
+        if frame:
+            clock.advance(frame_interval)
+
+        while pending_inputs and pending_inputs[0][0] <= simulated:
+            controller.state.publish(user_gradient=pending_inputs.pop(0)[1])
+
+        controller.render_frame(frame_interval)
+
+        if frame % frames_per_sample == 0:
+            if on_sample is not None:
+                on_sample(seconds_into_day, controller.current_gradient, controller.current_offset, writer.frame)
+            samples += 1
+    elapsed = perf_counter() - started
+
+    return SimulationResult(frames=num_frames, samples=samples, simulated_seconds=get_simulated_seconds(start, end),
+                            elapsed=elapsed)
+
+
+def csv_row(seconds_into_day: float, gradient: Gradient, offset: float) -> List:
+    return (
+        [format_time_of_day(seconds_into_day), round(seconds_into_day, 3)]
+        + list(gradient.color_1.to_rgb_tuple())
+        + list(gradient.color_2.to_rgb_tuple())
+        + [round(gradient.brightness, 6), round(gradient.scroll_speed, 6), round(offset, 6), gradient.effect]
+    )
+
+
+def get_simulated_seconds(start: float, end: float) -> float:
+    """
+    :param end: at or before start for a range across midnight
+    """
+    if end > start:
+        return end - start
+    return end - start + SECONDS_IN_DAY
+
+
+def get_num_frames(start: float, end: float, fps: float) -> int:
+    return int(round(get_simulated_seconds(start, end) * fps))
+
+
+def get_frames_per_sample(fps: float, sample_interval: float) -> int:
+    return max(1, int(round(sample_interval * fps)))
+
+
+def count_samples(start: float, end: float, fps: float, sample_interval: float) -> int:
+    """
+    Number of times simulate calls on_sample, for sizing images up front
+    """
+    return -(-get_num_frames(start, end, fps) // get_frames_per_sample(fps, sample_interval))
@@ -0,0 +1,132 @@
+import datetime
+from collections import namedtuple
+from functools import lru_cache
+from math import acos, asin, cos, degrees, radians, sin, tan
+from typing import Tuple
+
+# timezone is either a tzinfo or a name like 'US/Pacific'. None means the local time of the machine.
+Location = namedtuple('Location', ['latitude', 'longitude', 'timezone'])
+
+SAN_FRANCISCO = Location(latitude=37.7749, longitude=-122.4194, timezone='US/Pacific')
+
+# zenith of the sun's center at sunrise/sunset, accounting for refraction and the solar disc
+SUNRISE_ZENITH = 90.833
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def _julian_day(date: datetime.date) -> float:
+    # julian day at 00:00 UTC of the given date
+    return date.toordinal() + 1721424.5
+
+
+def _sun_declination_and_equation_of_time(julian_day: float) -> Tuple[float, float]:
+    """
+    NOAA solar position equations (from the NOAA solar calculator spreadsheet)
+
+    :param julian_day:
+    :return: (declination in degrees, equation of time in minutes)
+    """
+    t = (julian_day - 2451545.0) / 36525.0
+
+    mean_longitude = (280.46646 + t * (36000.76983 + t * 0.0003032)) % 360
+    mean_anomaly = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    equation_of_center = (
+        sin(radians(mean_anomaly)) * (1.914602 - t * (0.004817 + 0.000014 * t))
+        + sin(radians(2 * mean_anomaly)) * (0.019993 - 0.000101 * t)
+        + sin(radians(3 * mean_anomaly)) * 0.000289
+    )
+    true_longitude = mean_longitude + equation_of_center
+
+    omega = 125.04 - 1934.136 * t
+    apparent_longitude = true_longitude - 0.00569 - 0.00478 * sin(radians(omega))
+
+    mean_obliquity = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    obliquity = mean_obliquity + 0.00256 * cos(radians(omega))
+
+    declination = degrees(asin(sin(radians(obliquity)) * sin(radians(apparent_longitude))))
+
+    y = tan(radians(obliquity / 2)) ** 2
+    l0 = radians(mean_longitude)
+    m = radians(mean_anomaly)
+    equation_of_time = 4 * degrees(
+        y * sin(2 * l0)
+        - 2 * eccentricity * sin(m)
+        + 4 * eccentricity * y * sin(m) * cos(2 * l0)
+        - 0.5 * y * y * sin(4 * l0)
+        - 1.25 * eccentricity * eccentricity * sin(2 * m)
+    )
+
+    return declination, equation_of_time
+
+
+def _event_minutes_utc(date: datetime.date, latitude: float, longitude: float, rising: bool) -> float:
+    """
+    Minutes after 00:00 UTC of date when the sun rises or sets at the location. Evaluated once at
+    noon and refined once at the event time, which is well within a minute of the NOAA tables.
+
+    In polar day/night the hour angle is clamped, so sunrise and sunset collapse onto solar noon
+    (polar night) or midnight (midnight sun) instead of raising.
+    """
+    sign = -1 if rising else 1
+    minutes = 720.0
+
+    for _ in range(2):
+        declination, equation_of_time = _sun_declination_and_equation_of_time(
+            _julian_day(date) + minutes / MINUTES_IN_DAY)
+
+        cos_hour_angle = (
+            cos(radians(SUNRISE_ZENITH)) / (cos(radians(latitude)) * cos(radians(declination)))
+            - tan(radians(latitude)) * tan(radians(declination))
+        )
+        hour_angle = degrees(acos(max(-1.0, min(1.0, cos_hour_angle))))
+
+        solar_noon = 720 - 4 * longitude - equation_of_time
+        minutes = solar_noon + sign * 4 * hour_angle
+
+    return minutes
+
+
+def _resolve_timezone(timezone):
+    if timezone is None or isinstance(timezone, datetime.tzinfo):
+        return timezone
+
+    from dateutil import tz
+
+    tzinfo = tz.gettz(timezone)
+    if tzinfo is None:
+        raise ValueError('Unknown timezone: {}'.format(timezone))
+    return tzinfo
+
+
+def _minutes_utc_to_local_seconds(date: datetime.date, minutes_utc: float, tzinfo) -> float:
+    utc_dt = (
+        datetime.datetime.combine(date, datetime.time(tzinfo=datetime.timezone.utc))
+        + datetime.timedelta(minutes=minutes_utc)
+    )
+    local_dt = utc_dt.astimezone(tzinfo).replace(tzinfo=None)
+    local_midnight = datetime.datetime.combine(date, datetime.time())
+
+    return (local_dt - local_midnight).total_seconds()
+
+
+@lru_cache(maxsize=16)
+def get_sun_times(date: datetime.date, location: Location = SAN_FRANCISCO) -> Tuple[int, int]:
+    """
+    Sunrise and sunset as seconds after local midnight of date. Computed offline and cached per
+    (date, location), so calling this every second is free.
+
+    :param date:
+    :param location:
+    :return: (sunrise_secs, sunset_secs)
+    """
+    tzinfo = _resolve_timezone(location.timezone)
+
+    sunrise_secs = _minutes_utc_to_local_seconds(
+        date, _event_minutes_utc(date, location.latitude, location.longitude, rising=True), tzinfo)
+    sunset_secs = _minutes_utc_to_local_seconds(
+        date, _event_minutes_utc(date, location.latitude, location.longitude, rising=False), tzinfo)
+
+    return int(sunrise_secs), int(sunset_secs)
@@ -0,0 +1,90 @@
+import threading
+from collections import namedtuple
+
+# Everything the render loop needs from the control plane. A snapshot is never mutated, publishing a
+# change builds a new snapshot with a higher version.
+ControlState = namedtuple('ControlState', [
+    'version',
+    # lib.schedule.CompiledSchedule, None until the schedule file compiled
+    'schedule',
+    # latest Gradient sent by a user, None if there was none yet
+    'user_gradient',
+    # datetime fast mode was switched on at, None when off. The render loop warps its clock from the
+    # frame it sees a new one.
+    'fast_mode_ref',
+    'speedup_factor',
+    'fade_in_duration',
+    'sustain_user_duration',
+    'fade_out_duration',
+    # latest lib.compositor.Alert, None if there was none yet
+    'alert',
+])
+ControlState.__new__.__defaults__ = (None,)
+
+
+def initial_control_state(
+        speedup_factor: float = 5000.0,
+        fade_in_duration: float = 5.0,
+        sustain_user_duration: float = 30.0,
+        fade_out_duration: float = 20.0,
+) -> ControlState:
+    return ControlState(
+        version=0,
+        schedule=None,
+        user_gradient=None,
+        fast_mode_ref=None,
+        speedup_factor=speedup_factor,
+        fade_in_duration=fade_in_duration,
+        sustain_user_duration=sustain_user_duration,
+        fade_out_duration=fade_out_duration,
+    )
+
+
+class SharedState(object):
+    def __init__(self, initial: ControlState):
+        """
+        Hands control state from producers (the schedule thread and the http handlers) to the render
+        loop. Producers publish a new immutable snapshot and swap the reference to it, the render loop
+        reads the reference once per frame. A reference read or write is atomic in Python, so the
+        reader never takes a lock or sees a half updated state.
+
+        :param initial: version is normally 0
+        """
+        self._current = initial
+
+        # only serializes producers against each other, and lets an idle reader sleep until a change
+        self._changed = threading.Condition(threading.Lock())
+
+    @property
+    def current(self) -> ControlState:
+        return self._current
+
+    def publish(self, **changes) -> ControlState:
+        """
+        :param changes: ControlState fields to change, except version
+        :return: the new snapshot
+        """
+        with self._changed:
+            snapshot = self._current._replace(version=self._current.version + 1, **changes)
+            self._current = snapshot
+            self._changed.notify_all()
+
+        return snapshot
+
+    def adopt(self, snapshot: ControlState):
+        """
+        Swap in a snapshot published elsewhere as is, keeping its version. Used to mirror the state of
+        another process.
+        """
+        with self._changed:
+            self._current = snapshot
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: float = None) -> bool:
+        """
+        Block until a snapshot newer than version is published. Not meant for the hot path.
+
+        :return: True if there is a newer snapshot
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: self._current.version != version, timeout)
@@ -0,0 +1,239 @@
+"""
+Real-time input over UDP, for music visualizers and lighting desks that send a new frame 60 or more times
+a second. Every datagram is one packet:
+
+    HEADER      magic, kind, sequence number, sender's wall clock time (0 if unknown)
+    payload     FRAME: 3 bytes per LED in RGB order, LEDs in the order they are wired
+                PARAMS: colors, brightness, scroll offset and effect rendered like a gradient
+
+Packets are written to the writer from the receiving thread as they arrive, nothing is parsed beyond the
+header and nothing is queued. Packets older than the last one are dropped. While packets keep coming the
+render loop leaves the strip to the stream, timeout seconds after the last packet it falls back to the
+schedule.
+
+Frames go through the writer's output lookup table like rendered frames, at full brightness.
+"""
+from math import isfinite
+import socket
+import struct
+import sys
+import threading
+import time
+
+from lib.color import Color
+from lib.effects import get_effect
+from lib.gradient import Gradient
+from lib.metrics import FrameMetrics
+from lib.writer import Writer
+
+MAGIC = b'LH'
+
+# magic, kind, sequence number, sender's time.time()
+HEADER = struct.Struct('<2sBxId')
+
+# color_1, color_2, brightness, scroll offset, effect name
+PARAMS = struct.Struct('<6B2xff16s')
+
+FRAME = 1
+PARAMS_KIND = 2
+
+STREAM_PORT = 7777
+STREAM_TIMEOUT = 1.0
+
+# largest UDP payload
+MAX_PACKET_SIZE = 65507
+
+SEQUENCE_MODULO = 1 << 32
+
+
+class StreamReceiver(object):
+    def __init__(
+            self,
+            writer: Writer,
+            port: int = STREAM_PORT,
+            host: str = '0.0.0.0',
+            timeout: float = STREAM_TIMEOUT,
+            lock: threading.Lock = None,
+            metrics: FrameMetrics = None,
+            clock=time.monotonic,
+            wall_clock=time.time,
+    ):
+        """
+        :param port: 0 for any free port, see bind
+        :param timeout: seconds without packets after which the stream is over
+        :param lock: held around every write, shared with the render loop writing to the same writer
+        :param wall_clock: compared with the senders' timestamps for the input to photon latency
+        """
+        self.writer = writer
+        self.port = port
+        self.host = host
+        self.timeout = timeout
+        self.lock = lock if lock is not None else threading.Lock()
+        self.metrics = metrics
+        self.clock = clock
+        self.wall_clock = wall_clock
+
+        self.frame_size = writer.num_pixels * 3
+        # sequence number and arrival of the last packet written
+        self.sequence = None
+        self.last_packet = None
+
+        self.frames = 0
+        self.dropped_packets = 0
+        self.bad_packets = 0
+
+        self._socket = None
+
+    def bind(self) -> int:
+        """
+        :return: the port bound to
+        """
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.host, self.port))
+        self.port = self._socket.getsockname()[1]
+        return self.port
+
+    def is_active(self) -> bool:
+        """
+        True while the stream owns the strip
+        """
+        last_packet = self.last_packet
+        return last_packet is not None and self.clock() - last_packet < self.timeout
+
+    def _bad_packet(self) -> bool:
+        self.bad_packets += 1
+        if self.metrics is not None:
+            self.metrics.stream_bad_packets = self.bad_packets
+        return False
+
+    def handle(self, packet: memoryview, received: float) -> bool:
+        """
+        Write a packet to the writer
+
+        :param received: clock() when the packet arrived
+        :return: True if it was written
+        """
+        if len(packet) < HEADER.size:
+            return self._bad_packet()
+        magic, kind, sequence, sent = HEADER.unpack_from(packet)
+        if magic != MAGIC:
+            return self._bad_packet()
+
+        # a sender that restarts after the timeout may start counting from anywhere
+        if self.is_active() and not 0 < (sequence - self.sequence) % SEQUENCE_MODULO < SEQUENCE_MODULO // 2:
+            self.dropped_packets += 1
+            if self.metrics is not None:
+                self.metrics.stream_dropped_packets = self.dropped_packets
+            return False
+
+        payload = packet[HEADER.size:]
+        writer = self.writer
+        if kind == FRAME:
+            if len(payload) != self.frame_size:
+                return self._bad_packet()
+            with self.lock:
+                output_lut = writer.output_lut
+                writer.write_rgb(payload if output_lut is None else output_lut.apply(payload))
+        elif kind == PARAMS_KIND:
+            try:
+                gradient, offset = unpack_params(payload)
+            except (struct.error, ValueError):
+                return self._bad_packet()
+            with self.lock:
+                writer.write_gradient(gradient, offset, seconds=received)
+        else:
+            return self._bad_packet()
+        shown = self.clock()
+
+        self.sequence = sequence
+        self.last_packet = received
+        self.frames += 1
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.stream_frames = self.frames
+            metrics.stream_latency['receive_to_show'].observe(shown - received)
+            if sent > 0:
+                metrics.stream_latency['input_to_photon'].observe(self.wall_clock() - sent)
+
+        return True
+
+    def _run(self):
+        buffer = bytearray(MAX_PACKET_SIZE)
+        view = memoryview(buffer)
+        while True:
+            size = self._socket.recv_into(buffer)
+            self.handle(view[:size], self.clock())
+
+    def start(self):
+        if self._socket is None:
+            self.bind()
+
+        print('Receiving frames on udp port {}'.format(self.port))
+        sys.stdout.flush()
+
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+
+
+def pack_frame(sequence: int, rgb, sent: float = 0.0) -> bytes:
+    """
+    :param rgb: 3 bytes per pixel in RGB order
+    """
+    return HEADER.pack(MAGIC, FRAME, sequence % SEQUENCE_MODULO, sent) + bytes(rgb)
+
+
+def pack_params(sequence: int, gradient: Gradient, offset: float, sent: float = 0.0) -> bytes:
+    return HEADER.pack(MAGIC, PARAMS_KIND, sequence % SEQUENCE_MODULO, sent) + PARAMS.pack(
+        *gradient.color_1.to_rgb_tuple(),
+        *gradient.color_2.to_rgb_tuple(),
+        gradient.brightness,
+        offset,
+        gradient.effect.encode('ascii'),
+    )
+
+
+def unpack_params(payload: memoryview):
+    """
+    :return: (gradient, scroll offset)
+    :raise ValueError: for an unknown effect or a brightness or offset that is not a number
+    """
+    r1, g1, b1, r2, g2, b2, brightness, offset, effect = PARAMS.unpack(payload)
+    if not isfinite(brightness) or not isfinite(offset):
+        raise ValueError('brightness and offset must be finite')
+
+    gradient = Gradient(
+        seconds=0,
+        color_1=Color(r1, g1, b1),
+        color_2=Color(r2, g2, b2),
+        brightness=min(max(brightness, 0.0), 1.0),
+        scroll_speed=0.0,
+        effect=get_effect(effect.rstrip(b'\x00').decode('ascii')).name,
+    )
+    return gradient, offset % 1.0
+
+
+class StreamSender(object):
+    def __init__(self, host: str, port: int = STREAM_PORT, wall_clock=time.time):
+        """
+        Sends packets to a StreamReceiver, numbering them
+        """
+        self.address = (host, port)
+        self.wall_clock = wall_clock
+        self.sequence = 0
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send_frame(self, rgb):
+        self.sequence += 1
+        self._socket.sendto(pack_frame(self.sequence, rgb, self.wall_clock()), self.address)
+
+    def send_params(self, gradient: Gradient, offset: float = 0.0):
+        self.sequence += 1
+        self._socket.sendto(pack_params(self.sequence, gradient, offset, self.wall_clock()), self.address)
+
+    def close(self):
+        self._socket.close()
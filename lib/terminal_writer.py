@@ -0,0 +1,98 @@
+import shutil
+import sys
+from typing import Tuple
+
+from lib.color import Color
+from lib.layout import Layout
+from lib.pixel_order import BytesLike
+from lib.writer import Writer
+
+PIXEL_CHARACTER = '█'
+RESET = '\x1b[0m'
+SAVE_CURSOR = '\x1b7'
+RESTORE_CURSOR = '\x1b8'
+
+
+def get_escape_code_for_color(color: Color) -> str:
+    """
+    ANSI truecolor escape code that sets the foreground to color
+    """
+    return '\x1b[38;2;{};{};{}m'.format(*color.to_rgb_tuple())
+
+
+def _escape_code_for_rgb(rgb: Tuple[int, int, int]) -> str:
+    return '\x1b[38;2;{};{};{}m'.format(*rgb)
+
+
+class TerminalWriter(Writer):
+    def __init__(self, num_pixels: int, out=None, columns: int = None, layout: Layout = None):
+        """
+        Preview of the strip in a truecolor terminal, one character per pixel. After the first frame
+        only the pixels that changed are redrawn, so it keeps up with the full frame rate.
+
+        :param num_pixels:
+        :param out: text stream, stdout by default
+        :param columns: pixels per row, the terminal width by default
+        :param layout: see lib.layout, pixels are drawn in wire order
+        """
+        super().__init__(num_pixels, layout)
+        self.out = out or sys.stdout
+
+        if not columns:
+            columns = shutil.get_terminal_size().columns
+        self.columns = max(1, min(columns, num_pixels))
+        self.rows = -(-num_pixels // self.columns)
+
+        self._last_rgb = None
+
+    def _draw_full(self, rgb: BytesLike):
+        lines = []
+        for row in range(self.rows):
+            start = row * self.columns
+            end = min(start + self.columns, self.num_pixels)
+            lines.append(''.join(
+                _escape_code_for_rgb(rgb[i * 3:i * 3 + 3]) + PIXEL_CHARACTER
+                for i in range(start, end)
+            ))
+        return RESET + '\n'.join(lines) + RESET + '\n'
+
+    def _draw_changes(self, rgb: BytesLike):
+        last_rgb = self._last_rgb
+        parts = [SAVE_CURSOR]
+
+        previous = None
+        for i in range(self.num_pixels):
+            pixel = rgb[i * 3:i * 3 + 3]
+            if pixel == last_rgb[i * 3:i * 3 + 3]:
+                continue
+
+            # continue a run of changed pixels on the same row without moving the cursor
+            if previous is None or previous != i - 1 or i % self.columns == 0:
+                row, column = divmod(i, self.columns)
+                parts.append('{}\x1b[{}A\x1b[{}G'.format(RESTORE_CURSOR, self.rows - row, column + 1))
+            parts.append(_escape_code_for_rgb(pixel) + PIXEL_CHARACTER)
+            previous = i
+
+        if previous is None:
+            return ''
+
+        parts.append(RESTORE_CURSOR + RESET)
+        return ''.join(parts)
+
+    def write_rgb(self, rgb: BytesLike):
+        rgb = bytes(rgb)
+        assert len(rgb) == self.num_pixels * 3
+
+        if self._last_rgb is None:
+            output = self._draw_full(rgb)
+        else:
+            output = self._draw_changes(rgb)
+        self._last_rgb = rgb
+
+        if output:
+            self.out.write(output)
+            self.out.flush()
+
+    def close(self):
+        self.out.write(RESET)
+        self.out.flush()
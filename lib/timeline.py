@@ -0,0 +1,169 @@
+"""
+A day of the schedule rendered ahead of time. The scheduled gradient only depends on the time of day and
+the day's sunrise and sunset, so once per day (or schedule change) it is evaluated every `resolution`
+seconds into a flat binary file, and looking it up in the render loop is an index into that file.
+
+The file is memory mapped, so a restart on the same day with the same schedule maps the existing
+timeline instead of computing it, and other processes map the same pages.
+
+File layout: a header (see HEADER) followed by one RECORD per step of the day.
+"""
+import datetime
+import mmap
+import os
+import struct
+from typing import Tuple
+
+from lib.color import Color
+from lib.gradient import DEFAULT_EFFECT, Gradient, GradientBuffer
+
+MAGIC = b'LHTL'
+FORMAT_VERSION = 2
+
+# magic, format version, resolution, date ordinal, sunrise, sunset, number of records, schedule sha1
+HEADER = struct.Struct('<4sHdiiiI20s')
+
+# color_1, color_2, index of the effect in the schedule's effects, brightness, scroll_speed
+RECORD = struct.Struct('<6BBxff')
+
+SECONDS_IN_DAY = 24 * 60 * 60
+
+
+class Timeline(object):
+    def __init__(self, file_name: str, buffer, resolution: float, key: tuple):
+        """
+        Use build_timeline or load_timeline
+
+        :param buffer: the whole file, usually an mmap
+        :param key: (content_hash, date, sun_times, resolution) the timeline was built for
+        """
+        self.file_name = file_name
+        self.resolution = resolution
+        self.key = key
+        self._buffer = buffer
+        self._records = memoryview(buffer)[HEADER.size:]
+        self.num_records = len(self._records) // RECORD.size
+
+    def index(self, seconds_into_day: float) -> int:
+        return int(seconds_into_day / self.resolution) % self.num_records
+
+    def gradient_at(self, seconds_into_day: float, target: GradientBuffer = None,
+                    effects: Tuple[str, ...] = (DEFAULT_EFFECT,)):
+        """
+        The scheduled gradient at the time of day, rounded down to the timeline's resolution. The
+        gradient has the time of day in its seconds slot, like lib.schedule.get_scheduled_gradient.
+
+        :param target: buffer to write the result into instead of allocating a new Gradient
+        :param effects: of the schedule the timeline was built from, the records index into them
+        """
+        r1, g1, b1, r2, g2, b2, effect, brightness, scroll_speed = RECORD.unpack_from(
+            self._records, self.index(seconds_into_day) * RECORD.size)
+
+        if target is None:
+            return Gradient(seconds_into_day, Color(r1, g1, b1), Color(r2, g2, b2), brightness, scroll_speed,
+                            effects[effect])
+
+        target.seconds = seconds_into_day
+        color_1 = target.color_1
+        color_1.red, color_1.green, color_1.blue = r1, g1, b1
+        color_2 = target.color_2
+        color_2.red, color_2.green, color_2.blue = r2, g2, b2
+        target.brightness = brightness
+        target.scroll_speed = scroll_speed
+        target.effect = effects[effect]
+        return target
+
+    def __reduce__(self):
+        # processes map the same file instead of pickling its contents
+        return load_timeline, (self.file_name,) + self.key
+
+    def __repr__(self):
+        return '<Timeline file_name={} resolution={} records={} />'.format(
+            self.file_name, self.resolution, self.num_records)
+
+
+def _key(content_hash: str, date: datetime.date, sun_times: Tuple[int, int], resolution: float) -> tuple:
+    return content_hash, date, tuple(sun_times), float(resolution)
+
+
+def _num_records(resolution: float) -> int:
+    return int(-(-SECONDS_IN_DAY // resolution))
+
+
+def _header(key: tuple, num_records: int) -> bytes:
+    content_hash, date, (sunrise, sunset), resolution = key
+    return HEADER.pack(MAGIC, FORMAT_VERSION, resolution, date.toordinal(), int(sunrise), int(sunset),
+                       num_records, bytes.fromhex(content_hash))
+
+
+def _map(file_name: str):
+    with open(file_name, 'rb') as timeline_file:
+        return mmap.mmap(timeline_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_timeline(
+        file_name: str,
+        content_hash: str,
+        date: datetime.date,
+        sun_times: Tuple[int, int],
+        resolution: float,
+) -> Timeline:
+    """
+    Map an existing timeline file
+
+    :return: None if there is no file or it was built for another schedule, day or resolution
+    """
+    key = _key(content_hash, date, sun_times, resolution)
+
+    try:
+        buffer = _map(file_name)
+    except (OSError, ValueError):
+        return None
+
+    num_records = _num_records(key[3])
+    expected_size = HEADER.size + num_records * RECORD.size
+    if len(buffer) != expected_size or buffer[:HEADER.size] != _header(key, num_records):
+        buffer.close()
+        return None
+
+    return Timeline(file_name, buffer, key[3], key)
+
+
+def build_timeline(
+        file_name: str,
+        schedule,
+        resolution: float = 1.0,
+) -> Timeline:
+    """
+    Evaluate a lib.schedule.CompiledSchedule every resolution seconds of its day and write it to
+    file_name, replacing any older timeline there.
+
+    :param schedule: with date, sun_times and content_hash set, at most 256 effects
+    """
+    from lib.schedule import get_scheduled_gradient
+
+    key = _key(schedule.content_hash, schedule.date, schedule.sun_times, resolution)
+    num_records = _num_records(key[3])
+
+    data = bytearray(HEADER.size + num_records * RECORD.size)
+    data[:HEADER.size] = _header(key, num_records)
+
+    buffer = GradientBuffer()
+    for i in range(num_records):
+        gradient = get_scheduled_gradient(schedule, i * key[3], target=buffer)
+        RECORD.pack_into(
+            data, HEADER.size + i * RECORD.size,
+            *gradient.color_1.to_rgb_tuple(),
+            *gradient.color_2.to_rgb_tuple(),
+            schedule.effects.index(gradient.effect),
+            gradient.brightness,
+            gradient.scroll_speed,
+        )
+
+    # a reader never sees a half written file
+    temporary_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(temporary_file_name, 'wb') as timeline_file:
+        timeline_file.write(data)
+    os.replace(temporary_file_name, file_name)
+
+    return Timeline(file_name, _map(file_name), key[3], key)
@@ -0,0 +1,173 @@
+"""
+Admission of user gradients from the http endpoint. Requests are rate limited per client and only the
+latest gradient within a short window is published, so a few phones dragging color pickers cost the
+render loop one snapshot per window instead of one per request.
+"""
+from collections import OrderedDict, deque
+import threading
+import time
+from typing import Iterable, Tuple
+
+from lib.gradient import Gradient
+from lib.state import SharedState
+
+# longest the flush thread sleeps, also when the next queued gradient is due later than that
+MAX_FLUSH_WAIT = 60.0
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, burst: float, now: float):
+        """
+        :param rate: tokens added per second
+        :param burst: most tokens the bucket holds
+        :param now: clock reading the bucket starts full at
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float, tokens: float = 1.0) -> bool:
+        """
+        :return: True if there were enough tokens, which are then used up
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class RateLimiter(object):
+    def __init__(self, rate: float = 20.0, burst: float = 40.0, max_clients: int = 256, clock=time.monotonic):
+        """
+        A token bucket per client. Only the most recently seen max_clients are tracked, a forgotten
+        client starts with a full bucket again.
+
+        :param rate: sustained requests per second per client
+        :param burst: requests a client can make at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        # requests turned away since start
+        self.limited = 0
+
+    def allow(self, client) -> bool:
+        now = self.clock()
+
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+
+            if bucket.take(now):
+                return True
+
+            self.limited += 1
+            return False
+
+
+class GradientInbox(object):
+    def __init__(self, state: SharedState, window: float = 0.05, clock=time.monotonic):
+        """
+        Publishes user gradients to the render loop at most once per window, latest wins. A timed
+        sequence of gradients can be queued too, a newer submission replaces whatever is still queued.
+
+        :param window: seconds between publishes, gradients submitted in between replace each other
+        """
+        self.state = state
+        self.window = window
+        self.clock = clock
+
+        # (due, gradient) in due order
+        self._queue = deque()
+        self._last_publish = None
+        # set by a submission the flush thread has not looked at yet
+        self._submitted = False
+        self._changed = threading.Condition(threading.Lock())
+
+        # gradients replaced before they were published
+        self.coalesced = 0
+        self.published = 0
+
+        self._thread = None
+
+    def submit(self, gradient: Gradient):
+        self.submit_sequence([(0.0, gradient)])
+
+    def submit_sequence(self, sequence: Iterable[Tuple[float, Gradient]]):
+        """
+        :param sequence: (seconds from now, gradient) with non decreasing delays
+        """
+        now = self.clock()
+
+        with self._changed:
+            self.coalesced += len(self._queue)
+            self._queue = deque((now + delay, gradient) for delay, gradient in sequence)
+            self._submitted = True
+            self._changed.notify()
+
+    def flush(self, now: float = None) -> float:
+        """
+        Publish the latest gradient that is due, unless the last publish was less than a window ago.
+
+        :return: clock reading of the next flush that has something to do, None if nothing is queued
+        """
+        if now is None:
+            now = self.clock()
+
+        with self._changed:
+            self._submitted = False
+            queue = self._queue
+            if not queue:
+                return None
+
+            if self._last_publish is not None and now < self._last_publish + self.window:
+                return max(self._last_publish + self.window, queue[0][0])
+
+            gradient = None
+            while queue and queue[0][0] <= now:
+                if gradient is not None:
+                    self.coalesced += 1
+                gradient = queue.popleft()[1]
+
+            if gradient is not None:
+                self._last_publish = now
+                self.published += 1
+
+            next_flush = queue[0][0] if queue else None
+
+        if gradient is not None:
+            self.state.publish(user_gradient=gradient)
+
+        return next_flush
+
+    def _run(self):
+        while True:
+            next_flush = self.flush()
+
+            with self._changed:
+                # a submission may have arrived between the flush and taking the lock
+                if not self._submitted:
+                    timeout = None
+                    if next_flush is not None:
+                        timeout = next_flush - self.clock()
+                        # also for due times that are not finite, Condition.wait raises for huge timeouts
+                        timeout = max(timeout, 0) if timeout < MAX_FLUSH_WAIT else MAX_FLUSH_WAIT
+                    self._changed.wait(timeout)
+
+    def start(self):
+        assert self._thread is None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
@@ -1,4 +1,5 @@
-from typing import List, Union
+from functools import lru_cache
+from typing import List, Tuple, Union
 from math import exp
 
 
@@ -30,13 +31,66 @@ def sigmoid(ratio: float, exponent: float = 20.0) -> float:
     return 1.0 / (1.0 + exp(- (ratio - 0.5) * exponent))
 
 
-def generate_ratios(num_steps: int, offset: float) -> List[float]:
+# ratio table entries per pixel, so sub-pixel scroll offsets land between pixels. Short strips get more
+# entries per pixel so that the table always has at least RATIO_TABLE_MIN_SIZE entries.
+RATIO_TABLE_OVERSAMPLING = 16
+RATIO_TABLE_MIN_SIZE = 1024
+
+
+def get_ratio_table_oversampling(num_steps: int) -> int:
+    return max(RATIO_TABLE_OVERSAMPLING, -(-RATIO_TABLE_MIN_SIZE // num_steps))
+
+
+@lru_cache(maxsize=16)
+def get_ratio_table(num_steps: int, exponent: float = 20.0) -> Tuple[float, ...]:
+    """
+    The sigmoid/triangle profile sampled get_ratio_table_oversampling(num_steps) times per pixel over
+    one period, stored twice in a row so that any rotation of it is a plain slice.
+
+    Cached per (num_steps, exponent), the least recently used tables are evicted when strip lengths
+    or exponents change.
+    """
+    size = num_steps * get_ratio_table_oversampling(num_steps)
+    table = tuple(sigmoid(line_to_triangle(i / size), exponent) for i in range(size))
+
+    return table + table
+
+
+def generate_ratios(
+        num_steps: int,
+        offset: float,
+        exponent: float = 20.0,
+        interpolate: bool = True,
+) -> List[float]:
+    """
+    Equivalent to sigmoid(line_to_triangle(shift(step / num_steps, offset))) for every step, read from
+    the cached ratio table instead of being computed.
+
+    :param num_steps:
+    :param offset: scroll offset, wraps around at 1
+    :param exponent: sigmoid exponent
+    :param interpolate: linearly interpolate offsets between table entries, else round down
+    :return:
+    """
     if num_steps == 0:
         return [0]
 
+    table = get_ratio_table(num_steps, exponent)
+    oversampling = get_ratio_table_oversampling(num_steps)
+    size = num_steps * oversampling
+
+    position = (offset % 1.0) * size
+    start = int(position) % size
+    fraction = position - int(position)
+
+    ratios = table[start:start + size:oversampling]
+    if not interpolate or fraction == 0:
+        return list(ratios)
+
+    next_ratios = table[start + 1:start + 1 + size:oversampling]
     return [
-        sigmoid(line_to_triangle(shift(step / num_steps, offset)))
-        for step in range(num_steps)
+        ratio + (next_ratio - ratio) * fraction
+        for ratio, next_ratio in zip(ratios, next_ratios)
     ]
 
 
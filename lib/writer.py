@@ -0,0 +1,230 @@
+import time
+from time import perf_counter
+
+from lib.color import generate_color_gradient
+from lib.effects import render_blended_samples, render_effect_samples
+from lib.frame import HAS_NUMPY
+from lib.gradient import Gradient
+from lib.layout import Layout, snake_layout
+from lib.output_lut import GAMMA
+from lib.pixel_order import BytesLike
+
+WRITER_BACKENDS = ('neopixel', 'terminal', 'null')
+
+
+class Writer(object):
+    """
+    Base class of the output backends. Subclasses implement write_rgb, rendering gradients is shared.
+    """
+    # lib.metrics.FrameMetrics timing the render and show stages, if set
+    metrics = None
+
+    def __init__(self, num_pixels: int, layout: Layout = None):
+        """
+        :param layout: where the LEDs sit along the gradient, the snake strip by default
+        """
+        if layout is None:
+            layout = snake_layout(num_pixels)
+        if layout.num_pixels != num_pixels:
+            raise ValueError('Layout has {} pixels, the writer {}'.format(layout.num_pixels, num_pixels))
+
+        self.num_pixels = num_pixels
+        self.layout = layout
+
+        # lib.output_lut.OutputLUT of writers driving LEDs, None to write rendered values as they are
+        self.output_lut = None
+
+    def write_rgb(self, rgb: BytesLike):
+        """
+        :param rgb: 3 bytes per pixel in RGB order
+        """
+        raise NotImplementedError
+
+    def write_gradient(self, gradient: Gradient, offset: float, seconds: float = 0.0):
+        """
+        :param seconds: time of the frame, for animated effects
+        """
+        self._write(self.render_output, gradient, offset, seconds)
+
+    def write_passes(self, passes, offset: float, seconds: float = 0.0):
+        """
+        Write the passes of lib.compositor.Compositor.compose, one pass is written as its gradient
+        """
+        if len(passes) == 1:
+            self.write_gradient(passes[0].gradient, offset, seconds)
+        else:
+            self._write(self.render_passes_output, passes, offset, seconds)
+
+    def _write(self, render, *args):
+        metrics = self.metrics
+        if metrics is None:
+            self.write_rgb(render(*args))
+            return
+
+        start = perf_counter()
+        rgb = render(*args)
+        rendered = perf_counter()
+        self.write_rgb(rgb)
+        metrics.observe('render', rendered - start)
+        metrics.observe('show', perf_counter() - rendered)
+
+    def render_output(self, gradient: Gradient, offset: float, seconds: float = 0.0) -> bytes:
+        """
+        The frame as it goes to write_rgb: rendered, then mapped through the output lookup table if there
+        is one. The table applies the gradient's brightness at its own precision.
+        """
+        output_lut = self.output_lut
+        if output_lut is None:
+            return self.render_gradient(gradient, offset, seconds=seconds)
+
+        return output_lut.apply(self.render_gradient(gradient, offset, brightness=1.0, seconds=seconds),
+                                gradient.brightness)
+
+    def render_passes_output(self, passes, offset: float, seconds: float = 0.0) -> bytes:
+        """
+        render_output of several passes, the output lookup table applies their combined brightness
+        """
+        output_lut = self.output_lut
+        if output_lut is None:
+            return self.render_passes(passes, offset, seconds=seconds)
+
+        brightness = sum(layer_pass.weight * layer_pass.gradient.brightness for layer_pass in passes)
+        return output_lut.apply(self.render_passes(passes, offset, brightness=1.0, seconds=seconds), brightness)
+
+    def render_passes(self, passes, offset: float, brightness: float = None, seconds: float = 0.0) -> bytes:
+        """
+        Blend the passes' effects as frames. Without numpy only the heaviest pass is rendered.
+
+        :param brightness: instead of the passes' combined brightness
+        """
+        if not HAS_NUMPY:
+            heaviest = max(passes, key=lambda layer_pass: layer_pass.weight)
+            if brightness is None:
+                brightness = sum(layer_pass.weight * layer_pass.gradient.brightness for layer_pass in passes)
+            return self.render_gradient(heaviest.gradient, offset, brightness=brightness, seconds=seconds)
+
+        samples = render_blended_samples(passes, self.layout.resolution, offset=offset, seconds=seconds,
+                                         brightness=brightness)
+        return self.layout.apply(samples).tobytes()
+
+    @property
+    def needs_refresh(self) -> bool:
+        """
+        True if the output keeps changing although the rendered frame does not, because of dithering
+        """
+        return self.output_lut is not None and self.output_lut.needs_refresh
+
+    def refresh(self):
+        """
+        Write the last frame again with the next step of dithering
+        """
+        self.write_rgb(self.output_lut.refresh())
+
+    def settle(self):
+        """
+        Write the last frame again rounded, for a frame that stays. needs_refresh is False after it.
+        """
+        self.write_rgb(self.output_lut.settle())
+
+    def render_gradient(self, gradient: Gradient, offset: float, brightness: float = None,
+                        seconds: float = 0.0) -> bytes:
+        """
+        Render the gradient at the layout's resolution and map it onto the LEDs. With the default layout
+        the pixels are set up like a snake, so the first pixel is next to the last pixel
+
+        Pixel Layout Example
+        3 4
+        2 5
+        1 6
+        0 7
+
+        Renders the whole frame as one array with the gradient's effect when numpy is available, without
+        numpy every effect is rendered as the plain gradient.
+
+        :param gradient:
+        :param offset: scroll offset
+        :param brightness: instead of the gradient's brightness
+        :param seconds: time of the frame, for animated effects
+        :return: 3 bytes per pixel in RGB order
+        """
+        layout = self.layout
+        if brightness is None:
+            brightness = gradient.brightness
+
+        if HAS_NUMPY:
+            samples = render_effect_samples(
+                gradient,
+                layout.resolution,
+                offset=offset,
+                seconds=seconds,
+                brightness=brightness,
+            )
+            return layout.apply(samples).tobytes()
+
+        samples = generate_color_gradient(
+            gradient.color_1,
+            gradient.color_2,
+            layout.resolution,
+            brightness=brightness,
+            offset=offset,
+        )
+
+        return bytes(channel for rgb in layout.apply_colors([color.to_rgb_tuple() for color in samples])
+                     for channel in rgb)
+
+    def close(self):
+        pass
+
+
+class NullWriter(Writer):
+    """
+    Discards frames and counts them, for measuring how fast the rest of the pipeline runs
+    """
+    def __init__(self, num_pixels: int, clock=time.monotonic, layout: Layout = None):
+        super().__init__(num_pixels, layout)
+        self.clock = clock
+        self.start_time = clock()
+        self.frames = 0
+        self.bytes = 0
+
+    def write_rgb(self, rgb: BytesLike):
+        self.frames += 1
+        self.bytes += len(rgb)
+
+    @property
+    def fps(self) -> float:
+        elapsed = self.clock() - self.start_time
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+
+def create_writer(
+        backend: str = 'neopixel',
+        num_pixels: int = None,
+        layout: Layout = None,
+        gamma: float = GAMMA,
+        dither: bool = True,
+) -> Writer:
+    """
+    :param backend: one of WRITER_BACKENDS
+    :param num_pixels: defaults to the layout's pixels, or the 120 pixel strip
+    :param layout: pixel map of the strip, see lib.layout
+    :param gamma: of the LEDs, only used by backends driving LEDs
+    :param dither: temporally dither the LED output, see lib.output_lut
+    """
+    if not num_pixels and layout is not None:
+        num_pixels = layout.num_pixels
+
+    if backend == 'neopixel':
+        from lib.neopixel_writer import create_neopixel_writer
+        return create_neopixel_writer(num_pixels=num_pixels, layout=layout, gamma=gamma, dither=dither)
+
+    if not num_pixels:
+        num_pixels = 120
+
+    if backend == 'terminal':
+        from lib.terminal_writer import TerminalWriter
+        return TerminalWriter(num_pixels, layout=layout)
+    if backend == 'null':
+        return NullWriter(num_pixels, layout=layout)
+
+    raise ValueError('Unknown writer backend: {}'.format(backend))
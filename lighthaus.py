@@ -1,19 +1,37 @@
 #!/usr/bin/python3
 
-import datetime
-from flask import Flask
-import itertools
-import queue
+# time to first frame is measured from here
+from time import monotonic, perf_counter
+STARTED = monotonic()
+
+import argparse
+import atexit
+import signal
 import sys
 import threading
-import time
 
+from lib.clock import RealClock, WarpedClock
 from lib.color import Color
-from lib.gradient import Gradient, interpolate_gradients
-from lib.neopixel_writer import create_neopixel_writer
-from lib.schedule import update_from_schedule_async, get_seconds_since_epoch
-from lib.server import setup_endpoint
-from lib.utils import clamp
+from lib.compositor import ALERT, ALERT_FADE_IN_DURATION, ALERT_FADE_OUT_DURATION, Compositor, get_envelope
+from lib.effects import get_effect
+from lib.frame_log import FrameRecorder, RecordingWriter, gradient_to_dict
+from lib.frame_scheduler import FrameScheduler
+from lib.gradient import Gradient, GradientBuffer
+from lib.layout import load_layout, snake_layout
+from lib.metrics import FrameMetrics
+from lib.output_lut import BRIGHTNESS_STEPS, GAMMA
+from lib.schedule import ScheduleLoader, get_scheduled_gradient, update_from_schedule_async
+from lib.solar import SAN_FRANCISCO
+from lib.state import ControlState, SharedState, initial_control_state
+from lib.stream import StreamReceiver
+from lib.writer import WRITER_BACKENDS, create_writer
+
+# scroll_speed is the offset scrolled per frame at this frame rate, so the look does not depend on the
+# frame rate a unit actually achieves
+SCROLL_REFERENCE_FPS = 100.0
+
+# scroll offset steps that are considered the same frame when looking for a static scene
+OFFSET_QUANTIZATION = 4096
 
 
 class LighthausController(object):
@@ -23,28 +41,52 @@ class LighthausController(object):
             initial_color_1: Color,
             initial_color_2: Color,
             initial_scroll_speed: float = 0,
-            sleep_time: float = 0.01,
+            target_fps: float = 100.0,
+            idle_fps: float = 2.0,
+            idle_after: float = 1.0,
             brightness: float = 1.0,
             fade_in_duration: float = 5.0,
             sustain_user_duration: float = 30.0,
             fade_out_duration: float = 20.0,
             speedup_factor: float = 5000.0,
+            metrics: FrameMetrics = None,
+            recorder: FrameRecorder = None,
+            clock=None,
     ):
+        """
+        :param clock: sampled once per frame, see lib.clock. A RealClock by default, fast mode warps it.
+        """
         self.writer = writer
 
+        self.clock = clock if clock is not None else RealClock()
+        # the clock frames are rendered by, a WarpedClock while in fast mode
+        self.frame_clock = self.clock
+
+        # frame log control state changes are recorded to, usually the one of a RecordingWriter
+        self.recorder = recorder
+
+        # per stage timing, None to not instrument the render loop
+        self.metrics = metrics
+        if metrics is not None:
+            writer.metrics = metrics
+
         # gradient coming from color schedule file
         self.scheduled_gradient = Gradient(
-                seconds=get_seconds_since_epoch(),
+                seconds=self.clock.sample().seconds,
                 color_1=initial_color_1,
                 color_2=initial_color_2,
                 scroll_speed=initial_scroll_speed,
                 brightness=brightness
             )
 
-        # gradient last set to leds
+        # gradient last set to leds, and when
         self.current_gradient = self.scheduled_gradient
+        self.last_frame_seconds = self.scheduled_gradient.seconds
+
+        # reused every frame for the scheduled gradient, so frames do not allocate
+        self._scheduled_buffer = GradientBuffer()
 
-        # gradient sent by user
+        # latest gradient sent by user
         self.user_gradient = Gradient(
                 seconds=0,
                 color_1=initial_color_1,
@@ -53,126 +95,323 @@ class LighthausController(object):
                 brightness=brightness
             )
 
-        # gradient set to leds when a new user gradient arrived
-        self.transition_gradient = Gradient(
-                seconds=0,
-                color_1=initial_color_1,
-                color_2=initial_color_2,
-                scroll_speed=initial_scroll_speed,
-                brightness=brightness
-            )
-        self.sleep_time = sleep_time
-        self.fade_in_duration = fade_in_duration
-        self.fade_out_duration = fade_out_duration
-        self.sustain_user_duration = sustain_user_duration
-        self.speedup_factor = speedup_factor
-        # float of time it was requested if needed, else None
-        self.fast_mode_ref = None
+        # user gradients and alerts fading in and out over the scheduled gradient
+        self.compositor = Compositor()
+        self.frame_scheduler = FrameScheduler(target_fps=target_fps)
+        self.target_fps = target_fps
+        # scroll phase of the gradient, advanced by elapsed time
+        self.current_offset = 0.0
+
+        # When nothing changed on the strip for idle_after seconds, drop to idle_fps until a message
+        # arrives or the scene changes again
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.is_idle = False
+        # seconds the written frame has stayed the same
+        self.unchanged_duration = 0.0
+        # quantized inputs of the last written frame
+        self._last_frame_key = None
+        # set when a new control state arrived since the last frame
+        self._woken = False
+        # frames not written because they were the same as the last one
+        self.skipped_writes = 0
+
+        # control state published by the schedule thread and the server
+        self.state = SharedState(initial_control_state(
+            speedup_factor=speedup_factor,
+            fade_in_duration=fade_in_duration,
+            sustain_user_duration=sustain_user_duration,
+            fade_out_duration=fade_out_duration,
+        ))
+        # snapshot the current frame is rendered from
+        self.snapshot = self.state.current
+        # snapshots published but never rendered because a newer one replaced them within a frame
+        self.coalesced_snapshots = 0
+
+        # lib.stream.StreamReceiver writing to the same writer, None without streaming. It holds
+        # write_lock while writing, and the strip is left to it while it is active.
+        self.stream = None
+        self.write_lock = threading.Lock()
 
         self.is_running = False
+        # set once the render thread wrote its first frame
+        self.first_frame = threading.Event()
+
+    def _apply_snapshot(self, snapshot: ControlState):
+        self.coalesced_snapshots += snapshot.version - self.snapshot.version - 1
+        self._woken = True
+
+        recorder = self.recorder
+
+        # nothing is printed here, the render loop must not block on stdout. The frame log records these.
+        if snapshot.user_gradient is not self.snapshot.user_gradient:
+            self.user_gradient = snapshot.user_gradient
+            # fades in over whatever shows, earlier user gradients keep fading underneath
+            self.compositor.add(snapshot.user_gradient, self.last_frame_seconds, get_envelope(
+                snapshot.fade_in_duration, snapshot.sustain_user_duration, snapshot.fade_out_duration))
+            if recorder is not None:
+                recorder.record_event(user_gradient=gradient_to_dict(snapshot.user_gradient))
+        if snapshot.alert is not self.snapshot.alert:
+            alert = snapshot.alert
+            self.compositor.add(alert.gradient, self.last_frame_seconds, get_envelope(
+                ALERT_FADE_IN_DURATION, alert.duration, ALERT_FADE_OUT_DURATION, 'smooth'), rank=ALERT)
+            if recorder is not None:
+                recorder.record_event(alert=gradient_to_dict(alert.gradient), duration=alert.duration)
+        if snapshot.fast_mode_ref is not self.snapshot.fast_mode_ref:
+            # the time of day warps from this frame on, fast mode restarts from the real time of day
+            if snapshot.fast_mode_ref is None:
+                self.frame_clock = self.clock
+            else:
+                self.frame_clock = WarpedClock(self.clock, snapshot.speedup_factor)
+            if recorder is not None:
+                recorder.record_event(fast_mode=snapshot.fast_mode_ref is not None)
+        if recorder is not None and snapshot.schedule not in (None, self.snapshot.schedule):
+            recorder.record_event(schedule=snapshot.schedule.content_hash)
+
+        self.snapshot = snapshot
+
+    def render_frame(self, elapsed: float) -> bool:
+        """
+        Render and write one frame. Frames with the same quantized inputs as the last written frame are
+        not written again.
+
+        :param elapsed: seconds since the previous frame
+        :return: True if the scene changed and a new frame was written, dithering refreshes do not count
+        """
+        metrics = self.metrics
+
+        # the one read of the shared control state this frame
+        start = perf_counter()
+        snapshot = self.state.current
+        if snapshot is not self.snapshot:
+            self._apply_snapshot(snapshot)
+        state_read = perf_counter()
+
+        # the one read of the clock this frame, warped in fast mode
+        reading = self.frame_clock.sample()
+        now = reading.seconds
+
+        # evaluate the schedule
+        if snapshot.schedule is not None:
+            self.scheduled_gradient = get_scheduled_gradient(
+                snapshot.schedule, reading.seconds_into_day, target=self._scheduled_buffer)
+            self.scheduled_gradient.seconds = now
+        scheduled = perf_counter()
+
+        # Fade the user gradients and alerts in and out over the schedule
+        passes = self.compositor.compose(now, self.scheduled_gradient)
+        gradient_to_write = self.compositor.gradient
+
+        if metrics is not None:
+            metrics.observe('state', state_read - start)
+            metrics.observe('schedule', scheduled - state_read)
+            metrics.observe('blend', perf_counter() - scheduled)
+
+        # Scroll the gradient by elapsed time
+        self.current_offset = (
+            self.current_offset + gradient_to_write.scroll_speed * elapsed * SCROLL_REFERENCE_FPS) % 1
+
+        animated = False
+        frame_key = [round(self.current_offset * OFFSET_QUANTIZATION) % OFFSET_QUANTIZATION]
+        for layer_pass in passes:
+            gradient = layer_pass.gradient
+            frame_key += (
+                gradient.color_1.to_rgb_tuple(),
+                gradient.color_2.to_rgb_tuple(),
+                round(gradient.brightness * layer_pass.weight * BRIGHTNESS_STEPS),
+                gradient.effect,
+            )
+            animated = animated or get_effect(gradient.effect).animated
+        # animated effects change every frame
+        if animated:
+            frame_key.append(now)
+        changed = frame_key != self._last_frame_key
+
+        stream = self.stream
+        with self.write_lock:
+            if stream is not None and stream.is_active():
+                # the stream writes its frames itself, the scene is written again once it times out
+                self._last_frame_key = None
+                changed = False
+            elif changed:
+                # scroll with current gradient
+                self.writer.write_passes(passes, offset=self.current_offset, seconds=now)
+                self._last_frame_key = frame_key
+            elif self.writer.needs_refresh:
+                # a dithered static frame is redrawn with the next dithering step. The scene did not
+                # change, so it does not keep the loop awake, and once idle the frame is settled to
+                # rounded codes, dithering at idle_fps would flicker.
+                if self.is_idle:
+                    self.writer.settle()
+                else:
+                    self.writer.refresh()
+            else:
+                self.skipped_writes += 1
 
-        # function for getting the schedule
-        self.schedule_interpolator = None
+        # the gradient parameters of the last frame, the blend of all passes
+        self.current_gradient = gradient_to_write
+        self.last_frame_seconds = now
 
-    def _run(self, in_q: queue.Queue):
-        current_offset = 0.0
+        return changed
 
-        while True:
+    def _update_idle(self, changed: bool, elapsed: float):
+        if changed or self._woken:
+            self._woken = False
+            self.unchanged_duration = 0.0
 
-            # evaluate interpolator, apply speedup only if set that way
-            if not self.schedule_interpolator is None:
-                self.scheduled_gradient = self.schedule_interpolator(self.fast_mode_ref, self.speedup_factor)
-
-            # Fade in/out the user inputs from the flask server
-            time_since_input = get_seconds_since_epoch() - self.transition_gradient.seconds
-
-            # default, be on schedule
-            gradient_to_write = self.scheduled_gradient
-
-            total_user_input_duration = (
-                    self.fade_in_duration + self.sustain_user_duration + self.fade_out_duration)
-            sustain_user_input_end = self.fade_in_duration + self.sustain_user_duration
-
-            is_fading_in = time_since_input < self.fade_in_duration
-            is_sustaining_user_input = self.fade_in_duration <= time_since_input < sustain_user_input_end
-            is_fading_out = sustain_user_input_end <= time_since_input < total_user_input_duration
-
-            if is_fading_in:
-                # in fade-in transition between the transition gradient and the selected user gradient
-                user_ratio = clamp(time_since_input / self.fade_in_duration, 0, 1)
-                gradient_to_write = interpolate_gradients(self.transition_gradient, self.user_gradient,
-                                                          user_ratio)
-            elif is_sustaining_user_input:
-                gradient_to_write = self.user_gradient
-            elif is_fading_out:
-                # in fade out go between user gradient and the scheduled gradient
-                time_into_fade_out = time_since_input - sustain_user_input_end
-                scheduled_ratio = clamp(time_into_fade_out / self.fade_out_duration, 0, 1)
-                gradient_to_write = interpolate_gradients(self.user_gradient, self.scheduled_gradient,
-                                                          scheduled_ratio)
-
-            # Run a counter to scroll the gradient
-            current_offset = (current_offset + gradient_to_write.scroll_speed) % 1
-            # scroll with current gradient
-            writer.write_gradient(gradient_to_write, offset=current_offset)
-
-            # store for passing to transition_gradient when a new color is received
-            self.current_gradient = gradient_to_write
-            self.current_gradient.seconds = get_seconds_since_epoch()
-
-            self._check_queue(in_q)
-            time.sleep(self.sleep_time)
-
-    def _check_queue(self, in_q: queue.Queue):
-        try:
-            new_config = in_q.get(block=False)
-
-            # silent message parsing
-            if 'schedule_interpolator' in new_config:
-                self.schedule_interpolator = new_config['schedule_interpolator']
-            else:
-                # print out other messages coming in
-                print('new_config', new_config)
-                sys.stdout.flush()
-
-            # logged message parsing
-            if 'user_gradient' in new_config:
-                self.user_gradient = new_config['user_gradient']
-                self.transition_gradient = self.current_gradient
-            if 'fast_mode' in new_config:
-                if (new_config['fast_mode']):
-                    self.fast_mode_ref = datetime.datetime.now()
-                else:
-                    self.fast_mode_ref = None
+            if self.is_idle:
+                self.is_idle = False
+                self.frame_scheduler.target_fps = self.target_fps
+                self.frame_scheduler.wake()
+        else:
+            self.unchanged_duration += elapsed
 
-            in_q.task_done()
-        except queue.Empty:
-            pass
+            if not self.is_idle and self.unchanged_duration >= self.idle_after:
+                self.is_idle = True
+                self.frame_scheduler.target_fps = self.idle_fps
 
-    def run(self) -> queue.Queue:
+    def _wait_for_change(self, timeout: float):
+        # idle sleep that returns as soon as new control state is published
+        self.state.wait_for_change(self.snapshot.version, timeout)
+
+    def _run(self):
+        while True:
+            # sleeps until the next frame deadline, skipping frames when behind
+            if self.is_idle:
+                elapsed = self.frame_scheduler.wait(sleep=self._wait_for_change)
+            else:
+                elapsed = self.frame_scheduler.wait()
+
+            changed = self.render_frame(elapsed)
+            self._update_idle(changed, elapsed)
+            if not self.first_frame.is_set():
+                self.first_frame.set()
+
+            metrics = self.metrics
+            if metrics is not None:
+                metrics.frame(elapsed)
+                metrics.missed_deadlines = self.frame_scheduler.skipped_frames
+                metrics.skipped_writes = self.skipped_writes
+                metrics.state_version = self.snapshot.version
+                metrics.coalesced_snapshots = self.coalesced_snapshots
+                metrics.layers = len(self.compositor.layers)
+
+    def run(self) -> SharedState:
         assert not self.is_running
         self.is_running = True
 
-        in_q = queue.Queue()
-
-        graphics_thread = threading.Thread(target=self._run, kwargs=dict(in_q=in_q), daemon=True)
+        graphics_thread = threading.Thread(target=self._run, daemon=True)
         graphics_thread.start()
 
-        return in_q
+        return self.state
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the lighthaus controller')
+    parser.add_argument('--writer', choices=WRITER_BACKENDS, default='neopixel',
+                        help='where frames go: the led strip, a terminal preview or nowhere')
+    parser.add_argument('--num-pixels', type=int, default=None)
+    parser.add_argument('--pixel-map', default=None,
+                        help='json or csv pixel map placing each led along the gradient, see lib/layout.py')
+    parser.add_argument('--strip', type=int, default=0,
+                        help='strip of the pixel map this unit drives')
+    parser.add_argument('--gamma', type=float, default=GAMMA,
+                        help='gamma of the leds, 1 to turn gamma correction off')
+    parser.add_argument('--no-dither', action='store_true',
+                        help='round led output instead of dithering it')
+    parser.add_argument('--record', default=None, metavar='FILE',
+                        help='record every frame and control state change to a frame log, see replay.py')
+    parser.add_argument('--processes', action='store_true',
+                        help='render and write each strip in their own processes, see lib/pipeline.py')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help='do not time the render loop or serve /metrics')
+    parser.add_argument('--stream-port', type=int, default=None, metavar='PORT',
+                        help='receive binary frames over udp on this port, see lib/stream.py')
+    parser.add_argument('--cross-check-sun-times', action='store_true',
+                        help='compare the computed sun times with sunrise-sunset.org once a day, in the background')
+    args = parser.parse_args()
+    if args.record and args.processes:
+        parser.error('--record records the render loop of this process, it does not work with --processes')
+    if args.stream_port is not None and args.processes:
+        parser.error('--stream-port writes to the strip from this process, it does not work with --processes')
+    return args
+
+
+CONTROLLER_KWARGS = dict(
+    initial_color_1=Color(red=255, blue=0, green=0),
+    initial_color_2=Color(red=0, blue=255, green=0),
+    initial_scroll_speed=0.01,
+)
 
 
 if __name__ == '__main__':
-    writer = create_neopixel_writer()
-
-    controller = LighthausController(
-        writer=writer,
-        initial_color_1=Color(red=255, blue=0, green=0),
-        initial_color_2=Color(red=0, blue=255, green=0),
-        initial_scroll_speed=0.01,
-    )
-
-    controller_in_q = controller.run()
-    update_from_schedule_async(controller_in_q)
+    imported = monotonic()
+    args = parse_args()
+    metrics = None if args.no_metrics else FrameMetrics()
+
+    # Today's schedule is restored from the timeline cached next to the schedule file when there is one,
+    # so the first frame is already on schedule. A new timeline is built in the background.
+    schedule_loader = ScheduleLoader('color_schedule.csv', SAN_FRANCISCO, defer_timeline=True)
+    schedule_loader.poll()
+
+    if args.processes:
+        # multiprocessing is only imported when it is used
+        from lib.pipeline import RenderPipeline
+
+        # the render loops run in other processes, /metrics only has the control plane counters there
+        if args.pixel_map:
+            pixel_map = load_layout(args.pixel_map)
+            layouts = [pixel_map.strip(strip) for strip in pixel_map.strip_numbers]
+        else:
+            layouts = [snake_layout(args.num_pixels or 120)]
+
+        controller_state = SharedState(initial_control_state())
+        if schedule_loader.schedule is not None:
+            controller_state.publish(schedule=schedule_loader.schedule)
+        pipeline = RenderPipeline(LighthausController, args.writer, layouts, CONTROLLER_KWARGS,
+                                  gamma=args.gamma, dither=not args.no_dither)
+        pipeline.start(controller_state)
+        atexit.register(pipeline.stop)
+        pipeline.wait_for_first_frame(timeout=5.0)
+    else:
+        layout = load_layout(args.pixel_map).strip(args.strip) if args.pixel_map else None
+        writer = create_writer(args.writer, num_pixels=args.num_pixels, layout=layout, gamma=args.gamma,
+                               dither=not args.no_dither)
+        recorder = None
+        if args.record:
+            recorder = FrameRecorder(args.record, writer.num_pixels)
+            writer = RecordingWriter(writer, recorder)
+            atexit.register(recorder.close)
+
+        controller = LighthausController(writer=writer, metrics=metrics, recorder=recorder, **CONTROLLER_KWARGS)
+        if schedule_loader.schedule is not None:
+            controller.state.publish(schedule=schedule_loader.schedule)
+        controller_state = controller.run()
+
+        if args.stream_port is not None:
+            controller.stream = StreamReceiver(writer, port=args.stream_port, lock=controller.write_lock,
+                                               metrics=metrics)
+            controller.stream.start()
+
+        controller.first_frame.wait(timeout=5.0)
+
+    first_frame = monotonic()
+    print('imported in {:.3f}s, first frame after {:.3f}s'.format(imported - STARTED, first_frame - STARTED))
+    sys.stdout.flush()
+    if metrics is not None:
+        metrics.startup_import_seconds = imported - STARTED
+        metrics.startup_first_frame_seconds = first_frame - STARTED
+
+    # systemd stops the service with SIGTERM, exit through atexit so the shared memory is unlinked and
+    # recordings are closed. Installed after the render processes started, they keep the default handler.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    update_from_schedule_async(controller_state, location=SAN_FRANCISCO, cross_check=args.cross_check_sun_times,
+                               loader=schedule_loader)
+
+    # flask is the slowest import, the strip is already lit while it loads
+    from flask import Flask
+    from lib.server import setup_endpoint
 
     app = Flask(__name__)
-    setup_endpoint(app, controller_in_q)
+    setup_endpoint(app, controller_state, metrics=metrics)
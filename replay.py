@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+
+import argparse
+import datetime
+import sys
+
+from lib.frame_log import FrameLog, replay
+from lib.writer import WRITER_BACKENDS, create_writer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Play back a frame log recorded with lighthaus.py --record')
+    parser.add_argument('log', help='frame log file')
+    parser.add_argument('--writer', choices=WRITER_BACKENDS, default='terminal')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='1 for real time, 2 for twice as fast, 0 for as fast as possible')
+    return parser.parse_args()
+
+
+def print_event(seconds, event):
+    print('{:10.3f}s {}'.format(seconds, event), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    log = FrameLog(args.log)
+    print('{} records, {:.1f}s, {} pixels, recorded {}'.format(
+        len(log), log.duration, log.num_pixels, datetime.datetime.fromtimestamp(log.start_time)),
+        file=sys.stderr)
+
+    # frames are replayed as they were sent to the strip, the writer's own output table is not applied
+    writer = create_writer(args.writer, num_pixels=log.num_pixels)
+    try:
+        frames, elapsed = replay(log, writer, speed=args.speed, on_event=print_event)
+    finally:
+        writer.close()
+
+    print('{} frames in {:.3f}s, {:.1f} fps'.format(frames, elapsed, frames / elapsed if elapsed > 0 else 0),
+          file=sys.stderr)
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+import argparse
+import csv
+import datetime
+from functools import partial
+import sys
+
+from lighthaus import CONTROLLER_KWARGS, LighthausController
+from lib.color import Color
+from lib.gradient import Gradient
+from lib.schedule import ScheduleLoader
+from lib.simulator import (
+    CSV_COLUMNS,
+    StripImage,
+    UserInput,
+    count_samples,
+    csv_row,
+    parse_time_of_day,
+    simulate,
+)
+from lib.solar import SAN_FRANCISCO
+
+
+def parse_color(text: str) -> Color:
+    return Color.validated(*(int(channel) for channel in text.split(',')))
+
+
+def parse_date(text: str) -> datetime.date:
+    return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run the controller over a simulated day, as fast as possible, to check a schedule')
+    parser.add_argument('--schedule', default='color_schedule.csv')
+    parser.add_argument('--date', type=parse_date, default=None,
+                        help='YYYY-MM-DD the sunrise and sunset are for, today by default')
+    parser.add_argument('--start', type=parse_time_of_day, default=0.0, help='H:MM[:SS]')
+    parser.add_argument('--end', type=parse_time_of_day, default=24 * 3600.0,
+                        help='H:MM[:SS], before --start to run across midnight')
+    parser.add_argument('--fps', type=float, default=10.0, help='simulated frames per second')
+    parser.add_argument('--sample-interval', type=float, default=1.0,
+                        help='simulated seconds between rows of the image and csv')
+    parser.add_argument('--num-pixels', type=int, default=120)
+    parser.add_argument('--image', default=None, help='.png or .ppm with one row of the strip per sample')
+    parser.add_argument('--csv', default=None, help='gradient parameters per sample')
+    parser.add_argument('--user-gradient', nargs=3, action='append', default=[],
+                        metavar=('TIME', 'R,G,B', 'R,G,B'),
+                        help='send a user gradient at a time of day, can be repeated')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    loader = ScheduleLoader(args.schedule, SAN_FRANCISCO, timeline_resolution=None)
+    if not loader.poll(args.date):
+        sys.exit('Could not compile {}: {!r}'.format(args.schedule, loader.error))
+
+    user_inputs = sorted(
+        (UserInput(
+            parse_time_of_day(time_of_day),
+            Gradient(seconds=0, color_1=parse_color(color_1), color_2=parse_color(color_2), brightness=0.5,
+                     scroll_speed=0.5),
+        ) for time_of_day, color_1, color_2 in args.user_gradient),
+        key=lambda user_input: user_input.seconds_into_day,
+    )
+
+    image = None
+    if args.image:
+        image = StripImage(args.image, args.num_pixels,
+                           count_samples(args.start, args.end, args.fps, args.sample_interval))
+    csv_file = csv_writer = None
+    if args.csv:
+        csv_file = open(args.csv, 'w', newline='')
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(CSV_COLUMNS)
+
+    def on_sample(seconds_into_day, gradient, offset, frame):
+        if image is not None:
+            image.add_row(frame)
+        if csv_writer is not None:
+            csv_writer.writerow(csv_row(seconds_into_day, gradient, offset))
+
+    try:
+        result = simulate(
+            partial(LighthausController, **CONTROLLER_KWARGS),
+            loader.schedule,
+            start=args.start,
+            end=args.end,
+            fps=args.fps,
+            sample_interval=args.sample_interval,
+            num_pixels=args.num_pixels,
+            user_inputs=user_inputs,
+            on_sample=on_sample,
+        )
+    finally:
+        if image is not None:
+            image.close()
+        if csv_file is not None:
+            csv_file.close()
+
+    print('{} frames, {:.0f} simulated seconds in {:.2f}s: {:.0f} simulated fps, {:.0f}x real time'.format(
+        result.frames, result.simulated_seconds, result.elapsed, result.frames / result.elapsed,
+        result.simulated_seconds / result.elapsed))
@@ -0,0 +1,20 @@
+import pytest
+
+
+class FakeClock(object):
+    """
+    Clock that only moves when a test sets or advances now, in place of time.monotonic
+    """
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
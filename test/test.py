@@ -1,9 +1,10 @@
-from dioturell import *
+from lib.color import Color, interpolate_colors
+from lib.terminal_writer import RESET, get_escape_code_for_color
 
 
 def test_printing_escape_colors():
-    color_1 = (0, 255, 0)
-    color_2 = (255, 0, 255)
+    color_1 = Color(0, 255, 0)
+    color_2 = Color(255, 0, 255)
 
     print(f'testing escape characters {color_1} to {color_2}')
 
@@ -14,7 +15,7 @@ def test_printing_escape_colors():
 
         color = interpolate_colors(color_1, color_2, ratio)
         escape_code = get_escape_code_for_color(color)
-        print(escape_code)
+        print(escape_code + '█' + RESET)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,32 @@
+from lib.clock import SECONDS_IN_DAY, RealClock, SimulatedClock, WarpedClock
+
+
+class FakeMonotonic(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_real_clock_moves_with_monotonic_source():
+    monotonic = FakeMonotonic()
+    clock = RealClock(monotonic=monotonic)
+    first = clock.sample()
+
+    monotonic.now += 1.5
+    second = clock.sample()
+
+    assert second.seconds - first.seconds == 1.5
+    assert (second.seconds_into_day - first.seconds_into_day) % SECONDS_IN_DAY == 1.5
+
+
+def test_warped_clock_keeps_seconds_and_wraps_day():
+    clock = SimulatedClock(seconds_into_day=SECONDS_IN_DAY - 10, seconds=50)
+    warped = WarpedClock(clock, speedup_factor=9)
+
+    clock.advance(2)
+    reading = warped.sample()
+
+    assert reading.seconds == 52
+    assert reading.seconds_into_day == 10
@@ -0,0 +1,129 @@
+import pytest
+
+from lib.color import Color
+from lib.compositor import ALERT, Compositor, get_envelope
+from lib.gradient import Gradient
+
+SCHEDULED = Gradient(seconds=0, color_1=Color(0, 0, 0), color_2=Color(0, 0, 100), brightness=1.0,
+                     scroll_speed=0.0)
+
+
+def user_gradient(red, effect='gradient'):
+    return Gradient(seconds=0, color_1=Color(red, 0, 0), color_2=Color(red, 0, 0), brightness=0.5,
+                    scroll_speed=0.01, effect=effect)
+
+
+def test_envelope_fades_in_sustains_and_fades_out():
+    envelope = get_envelope(2.0, 10.0, 4.0)
+    assert envelope is get_envelope(2.0, 10.0, 4.0)
+
+    assert [envelope.opacity(elapsed) for elapsed in [-1, 0, 1, 2, 11.9, 12, 13, 16]] == [
+        0.0, 0.0, 0.5, 1.0, 1.0, 1.0, 0.75, 0.0]
+
+    with pytest.raises(ValueError):
+        get_envelope(0.25, float('nan'), 1.0)
+
+    smooth = get_envelope(2.0, 0.0, 2.0, 'smooth')
+    assert smooth.opacity(0.5) == pytest.approx(0.15625)
+    assert smooth.opacity(1.0) == pytest.approx(0.5)
+
+
+def test_single_layer_blends_colors_by_their_light():
+    compositor = Compositor()
+    compositor.add(user_gradient(200), start=0.0, envelope=get_envelope(4.0, 10.0, 4.0))
+
+    # a quarter of the half bright layer over three quarters of the full bright schedule
+    passes = compositor.compose(1.0, SCHEDULED)
+    assert len(passes) == 1 and passes[0].weight == 1.0
+    assert passes[0].gradient.color_1.to_rgb_tuple() == pytest.approx((200 / 7, 0, 0))
+    assert passes[0].gradient.color_2.to_rgb_tuple() == pytest.approx((200 / 7, 0, 600 / 7))
+    assert passes[0].gradient.brightness == pytest.approx(0.875)
+    assert compositor.gradient.color_2.to_rgb_tuple() == (29, 0, 86)
+
+    assert compositor.compose(5.0, SCHEDULED)[0].gradient.color_2.to_rgb_tuple() == (200, 0, 0)
+
+    # expired layers are dropped and the schedule shows again
+    passes = compositor.compose(18.0, SCHEDULED)
+    assert not compositor.layers
+    assert passes[0].gradient.color_2.to_rgb_tuple() == (0, 0, 100)
+
+
+def test_new_layer_fades_in_over_a_fading_one_without_a_snap():
+    compositor = Compositor()
+    envelope = get_envelope(4.0, 10.0, 4.0)
+    compositor.add(user_gradient(200), start=0.0, envelope=envelope)
+    before = compositor.compose(2.0, SCHEDULED)[0].gradient.color_1.to_rgb_tuple()
+
+    compositor.add(user_gradient(0), start=2.0, envelope=envelope)
+    assert compositor.compose(2.0, SCHEDULED)[0].gradient.color_1.to_rgb_tuple() == before
+
+
+def test_layers_of_one_effect_make_one_pass():
+    compositor = Compositor()
+    for i in range(10):
+        compositor.add(user_gradient(20 * i), start=i * 0.1, envelope=get_envelope(4.0, 10.0, 4.0))
+
+    passes = compositor.compose(1.0, SCHEDULED)
+    assert len(passes) == 1
+    assert passes[0].weight == pytest.approx(1.0)
+
+    # alerts stay on top, an opaque layer hides everything under it
+    compositor.add(user_gradient(255, effect='rainbow'), start=0.0, envelope=get_envelope(0.0, 5.0, 1.0),
+                   rank=ALERT)
+    compositor.add(user_gradient(10), start=1.0, envelope=get_envelope(4.0, 10.0, 4.0))
+    assert compositor.layers[-1].rank == ALERT
+
+    passes = compositor.compose(1.5, SCHEDULED)
+    assert [(layer_pass.gradient.effect, layer_pass.weight) for layer_pass in passes] == [('rainbow', 1.0)]
+
+    passes = compositor.compose(5.5, SCHEDULED)
+    assert sorted(layer_pass.gradient.effect for layer_pass in passes) == ['gradient', 'rainbow']
+    assert sum(layer_pass.weight for layer_pass in passes) == pytest.approx(1.0)
+    assert compositor.gradient.effect == 'gradient'
+
+
+def test_writer_blends_passes_of_different_effects():
+    np = pytest.importorskip('numpy')
+    from lib.writer import NullWriter
+
+    compositor = Compositor()
+    compositor.add(user_gradient(200, effect='rainbow'), start=0.0, envelope=get_envelope(4.0, 10.0, 4.0))
+    passes = compositor.compose(1.0, SCHEDULED)
+    assert len(passes) == 2
+
+    writer = NullWriter(60)
+    blended = np.frombuffer(writer.render_passes(passes, 0.3), dtype=np.uint8).astype(float)
+    expected = sum(layer_pass.weight * np.frombuffer(writer.render_gradient(layer_pass.gradient, 0.3),
+                                                     dtype=np.uint8).astype(float)
+                   for layer_pass in passes)
+    assert np.abs(blended - expected).max() <= 1
+
+
+@pytest.mark.parametrize('effect', ['gradient', 'breathing'])
+def test_merged_layers_render_like_blended_frames(effect):
+    np = pytest.importorskip('numpy')
+    from lib.compositor import Pass
+    from lib.gradient import copy_gradient_into
+    from lib.writer import NullWriter
+
+    night = Gradient(seconds=0, color_1=Color(255, 0, 21), color_2=Color(255, 0, 21), brightness=0.01,
+                     scroll_speed=0.0, effect=effect)
+    user = Gradient(seconds=0, color_1=Color(0, 255, 0), color_2=Color(0, 255, 0), brightness=0.5,
+                    scroll_speed=0.0, effect=effect)
+
+    compositor = Compositor()
+    compositor.add(user, start=0.0, envelope=get_envelope(4.0, 10.0, 4.0))
+    merged = compositor.compose(2.0, night)
+    assert len(merged) == 1
+
+    frames = []
+    for gradient, weight in [(night, 0.5), (user, 0.5)]:
+        layer_pass = Pass()
+        copy_gradient_into(layer_pass.gradient, gradient)
+        layer_pass.weight = weight
+        frames.append(layer_pass)
+
+    writer = NullWriter(60)
+    for offset in [0.0, 0.25, 0.5]:
+        assert writer.render_passes(merged, offset) == writer.render_passes(frames, offset)
+    assert np.frombuffer(writer.render_passes(merged, 0.5), dtype=np.uint8)[:3].tolist() == [1, 64, 0]
@@ -0,0 +1,150 @@
+import datetime
+
+import pytest
+
+from lighthaus import LighthausController
+from lib.color import Color
+from lib.clock import SimulatedClock
+from lib.gradient import Gradient
+from lib.schedule import compile_schedule
+
+
+class CountingWriter(object):
+    needs_refresh = False
+
+    def __init__(self):
+        self.writes = 0
+
+    def write_passes(self, passes, offset, seconds=0.0):
+        self.writes += 1
+
+
+def make_controller(writer, scroll_speed=0.0, clock=None):
+    return LighthausController(
+        writer=writer,
+        initial_color_1=Color(red=255, green=0, blue=0),
+        initial_color_2=Color(red=0, green=0, blue=255),
+        initial_scroll_speed=scroll_speed,
+        target_fps=100,
+        idle_fps=2,
+        idle_after=0.5,
+        clock=clock,
+    )
+
+
+def run_frames(controller, num_frames, elapsed=0.01):
+    for _ in range(num_frames):
+        changed = controller.render_frame(elapsed)
+        controller._update_idle(changed, elapsed)
+
+
+def test_static_scene_is_written_once_and_goes_idle():
+    writer = CountingWriter()
+    controller = make_controller(writer)
+
+    run_frames(controller, 10)
+    assert writer.writes == 1
+    assert controller.skipped_writes == 9
+    assert not controller.is_idle
+
+    run_frames(controller, 50)
+    assert controller.is_idle
+    assert controller.frame_scheduler.target_fps == 2
+
+
+def user_gradient(green):
+    return Gradient(seconds=0, color_1=Color(red=0, green=green, blue=0),
+                    color_2=Color(red=0, green=green, blue=0), brightness=1.0, scroll_speed=0.0)
+
+
+def test_published_state_wakes_from_idle():
+    writer = CountingWriter()
+    controller = make_controller(writer)
+    run_frames(controller, 100)
+    assert controller.is_idle
+
+    controller.state.publish(user_gradient=user_gradient(255))
+    controller._wait_for_change(timeout=1.0)
+    run_frames(controller, 1)
+
+    assert not controller.is_idle
+    assert controller.frame_scheduler.target_fps == 100
+
+
+def test_scrolling_scene_is_written_every_frame():
+    writer = CountingWriter()
+    controller = make_controller(writer, scroll_speed=0.01)
+
+    run_frames(controller, 100)
+    assert writer.writes == 100
+    assert not controller.is_idle
+
+
+def test_snapshots_are_coalesced_per_frame():
+    writer = CountingWriter()
+    controller = make_controller(writer)
+
+    for green in range(10):
+        controller.state.publish(user_gradient=user_gradient(green))
+    controller.state.publish(fast_mode_ref=datetime.datetime.now())
+
+    run_frames(controller, 1)
+
+    assert controller.user_gradient.color_1.green == 9
+    assert controller.coalesced_snapshots == 10
+    assert controller.snapshot.fast_mode_ref is not None
+
+
+def test_simulated_day_and_fast_mode():
+    gradients = tuple(
+        Gradient(seconds=hour * 3600, color_1=Color(hour * 10, 0, 0), color_2=Color(0, 0, hour * 10),
+                 brightness=1.0, scroll_speed=0.0)
+        for hour in range(24)
+    )
+    schedule = compile_schedule(gradients)
+    clock = SimulatedClock(seconds_into_day=0)
+    controller = make_controller(CountingWriter(), clock=clock)
+    controller.state.publish(schedule=schedule)
+
+    for hour in range(24):
+        run_frames(controller, 1)
+        assert controller.scheduled_gradient.color_1.red == hour * 10
+        clock.advance(3600)
+
+    # fast mode runs the time of day speedup_factor times faster, on top of real time
+    controller.state.publish(fast_mode_ref=datetime.datetime.now(), speedup_factor=3599)
+    run_frames(controller, 1)
+    clock.advance(1)
+    run_frames(controller, 1)
+    assert controller.scheduled_gradient.color_1.red == 10
+
+    controller.state.publish(fast_mode_ref=None)
+    run_frames(controller, 1)
+    assert controller.scheduled_gradient.color_1.red == 0
+
+
+def test_dithered_static_scene_settles_when_idle():
+    pytest.importorskip('numpy')
+    from lib.output_lut import OutputLUT
+    from lib.writer import NullWriter
+
+    writer = NullWriter(8)
+    writer.output_lut = OutputLUT(dither=True)
+    controller = make_controller(writer)
+    night = Gradient(seconds=0, color_1=Color(255, 0, 21), color_2=Color(255, 0, 21), brightness=0.01,
+                     scroll_speed=0.0)
+    controller.state.publish(schedule=compile_schedule((night,)))
+
+    run_frames(controller, 100)
+    assert controller.is_idle
+    assert controller.frame_scheduler.target_fps == 2
+    assert not writer.output_lut.needs_refresh
+    # the dither steps until the loop goes idle, then one rounded frame stays on the strip
+    written = writer.frames
+    assert 1 < written < 100
+    settled = writer.output_lut.settle()
+
+    run_frames(controller, 100)
+    assert writer.frames == written
+    assert controller.is_idle
+    assert settled == OutputLUT(dither=False).apply(bytes([255, 0, 21] * 8), brightness=0.01)
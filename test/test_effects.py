@@ -0,0 +1,71 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from test_schedule import DATE, write_schedule
+
+from lib.color import Color
+from lib.effects import EFFECTS, get_effect, render_effect_samples
+from lib.color import generate_color_gradient
+from lib.gradient import Gradient
+from lib.schedule import ScheduleLoader, get_scheduled_gradient
+
+GRADIENT = Gradient(seconds=0, color_1=Color(255, 0, 0), color_2=Color(0, 0, 255), brightness=0.5,
+                    scroll_speed=0.01)
+
+SCHEDULE = '''timeslot,red_1,green_1,blue_1,red_2,green_2,blue_2,scroll_speed,brightness,effect
+3:00,255,0,21,255,0,234,0.01,20,
+12:00,0,0,0,255,255,255,0.002,80,chase
+18:00,0,0,0,255,255,255,0.002,80,sparkle
+'''
+
+
+def test_gradient_effect_matches_gradient_rendering():
+    for resolution in [1, 60, 301]:
+        for offset in [0, 0.3, 0.77]:
+            expected = [color.to_rgb_tuple() for color in
+                        generate_color_gradient(GRADIENT.color_1, GRADIENT.color_2, resolution, 0.5, offset)]
+            assert render_effect_samples(GRADIENT, resolution, offset).tolist() == [list(rgb) for rgb in expected]
+
+
+def test_every_effect_renders_a_frame():
+    assert {'gradient', 'rainbow', 'sparkle', 'breathing', 'chase'} <= set(EFFECTS)
+
+    for name in EFFECTS:
+        gradient = GRADIENT._replace(effect=name)
+        frame = render_effect_samples(gradient, 60, offset=0.25, seconds=12.5, brightness=1.0)
+        assert frame.shape == (60, 3) and frame.dtype == np.uint8
+
+        # the same inputs render the same frame, sparkles included
+        assert (frame == render_effect_samples(gradient, 60, offset=0.25, seconds=12.5, brightness=1.0)).all()
+
+    with pytest.raises(ValueError):
+        get_effect('strobe')
+
+
+def test_rainbow_and_chase():
+    rainbow = render_effect_samples(GRADIENT._replace(effect='rainbow'), 3, brightness=1.0)
+    assert rainbow.tolist() == [[0, 255, 0], [255, 0, 0], [0, 0, 255]]
+
+    chase = render_effect_samples(GRADIENT._replace(effect='chase'), 6, offset=0.5, brightness=1.0)
+    # heads of color_2 at 0.5 and every third of the strip behind it
+    assert [tuple(rgb) for rgb in chase[[1, 3, 5]]] == [(0, 0, 255)] * 3
+
+
+def test_schedule_rows_select_effects(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+
+    loader = ScheduleLoader(str(schedule_path), timeline_resolution=60)
+    assert loader.poll(DATE)
+    assert loader.schedule.effects == ('chase', 'gradient', 'sparkle')
+
+    interpolated = loader.schedule._replace(timeline=None)
+    for seconds_into_day, effect in [(4 * 3600, 'gradient'), (7 * 3600, 'gradient'), (12 * 3600, 'chase'),
+                                     (20 * 3600, 'sparkle')]:
+        assert get_scheduled_gradient(interpolated, seconds_into_day).effect == effect
+        assert get_scheduled_gradient(loader.schedule, seconds_into_day).effect == effect
+
+    write_schedule(schedule_path, SCHEDULE.replace('chase', 'strobe'), 2000)
+    assert not loader.poll(DATE)
+    assert isinstance(loader.error, ValueError)
@@ -0,0 +1,45 @@
+import pytest
+
+from lib.color import Color, generate_color_gradient
+from lib.utils import generate_ratios
+
+np = pytest.importorskip('numpy')
+
+from lib.effects import render_effect_samples
+from lib.frame import generate_ratio_array
+from lib.gradient import Gradient
+from lib.layout import snake_layout
+
+
+def render_snake_frame(color_1, color_2, num_pixels, brightness, offset=0):
+    gradient = Gradient(seconds=0, color_1=color_1, color_2=color_2, brightness=brightness, scroll_speed=0)
+    layout = snake_layout(num_pixels)
+    return layout.apply(render_effect_samples(gradient, layout.resolution, offset))
+
+
+def test_ratio_array_matches_generate_ratios():
+    for offset in [0, 0.1, 0.5, 0.99]:
+        assert np.allclose(generate_ratio_array(60, offset), generate_ratios(60, offset))
+
+
+def test_frame_matches_color_list():
+    color_1 = Color(red=255, green=0, blue=21)
+    color_2 = Color(red=11, green=53, blue=255)
+
+    for brightness, offset in [(1.0, 0), (0.2, 0.25), (0.01, 0.73)]:
+        half_color_list = generate_color_gradient(color_1, color_2, 60, brightness, offset)
+        color_list = half_color_list + list(reversed(half_color_list))
+        expected = np.array([color.to_rgb_tuple() for color in color_list])
+
+        frame = render_snake_frame(color_1, color_2, 120, brightness, offset)
+
+        assert frame.dtype == np.uint8
+        assert frame.shape == (120, 3)
+        assert np.abs(frame.astype(int) - expected).max() <= 1
+
+
+def test_odd_pixel_count():
+    frame = render_snake_frame(Color(255, 0, 0), Color(0, 0, 255), 7, 1.0)
+
+    assert frame.shape == (7, 3)
+    assert (frame[:3] == frame[::-1][:3]).all()
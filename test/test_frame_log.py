@@ -0,0 +1,93 @@
+import json
+import threading
+
+from lib.frame_log import EVENT, FRAME, FrameLog, FrameRecorder, RecordingWriter, replay
+from lib.writer import NullWriter
+
+
+class ListWriter(NullWriter):
+    def __init__(self, num_pixels):
+        super().__init__(num_pixels)
+        self.written = []
+
+    def write_rgb(self, rgb):
+        self.written.append(bytes(rgb))
+
+
+def record_session(path, clock):
+    recorder = FrameRecorder(str(path), 2, clock=clock)
+    writer = RecordingWriter(ListWriter(2), recorder)
+
+    writer.write_rgb(bytes([1] * 6))
+    clock.now += 0.5
+    recorder.record_event(fast_mode=True)
+    writer.write_rgb(bytes([2] * 6))
+    clock.now += 0.5
+    writer.write_rgb(bytes([3] * 6))
+
+    return recorder, writer
+
+
+def test_record_and_replay_in_real_time(tmp_path, clock):
+    path = tmp_path / 'session.lhf'
+    recorder, writer = record_session(path, clock)
+    writer.close()
+    assert writer.writer.written == [bytes([1] * 6), bytes([2] * 6), bytes([3] * 6)]
+
+    log = FrameLog(str(path))
+    assert len(log) == 4
+    assert log.num_pixels == 2
+    assert log.duration == 1.0
+    assert [kind for kind, _, _ in log] == [FRAME, EVENT, FRAME, FRAME]
+
+    events = []
+    target = ListWriter(2)
+    frames, elapsed = replay(log, target, speed=2, on_event=lambda *event: events.append(event),
+                             clock=clock, sleep=clock.sleep)
+
+    assert frames == 3
+    assert elapsed == 0.5
+    assert target.written == writer.writer.written
+    assert events == [(0.5, {'fast_mode': True})]
+
+
+def test_log_without_index_is_scanned(tmp_path, clock):
+    path = tmp_path / 'session.lhf'
+    recorder, writer = record_session(path, clock)
+
+    # killed before close, with half a record at the end
+    recorder._file.flush()
+    with open(str(path), 'ab') as log_file:
+        log_file.write(b'\x01\x00')
+
+    log = FrameLog(str(path))
+    assert len(log) == 4
+    assert bytes(log.record(3)[2]) == bytes([3] * 6)
+
+    frames, _ = replay(log, ListWriter(2), speed=0)
+    assert frames == 3
+
+
+def test_records_from_several_threads_stay_whole(tmp_path):
+    path = tmp_path / 'session.lhf'
+    recorder = FrameRecorder(str(path), 2)
+
+    def record(value):
+        for _ in range(500):
+            recorder.record_frame(bytes([value] * 6))
+            recorder.record_event(value=value)
+
+    threads = [threading.Thread(target=record, args=(value,)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.close()
+
+    log = FrameLog(str(path))
+    assert len(log) == 4000
+    for kind, _, payload in log:
+        if kind == FRAME:
+            assert len(set(payload)) == 1
+        else:
+            assert set(json.loads(bytes(payload).decode('utf-8'))) == {'value'}
@@ -0,0 +1,46 @@
+from lib.frame_scheduler import FrameScheduler
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_sleeps_to_absolute_deadlines():
+    fake_time = FakeTime()
+    scheduler = FrameScheduler(target_fps=100, clock=fake_time.clock, sleep=fake_time.sleep)
+
+    assert scheduler.wait() == 0.0
+
+    for _ in range(10):
+        # rendering takes 3ms
+        fake_time.now += 0.003
+        elapsed = scheduler.wait()
+        assert abs(elapsed - 0.01) < 1e-9
+
+    assert abs(fake_time.now - 0.1) < 1e-9
+    assert scheduler.skipped_frames == 0
+
+
+def test_skips_frames_when_behind():
+    fake_time = FakeTime()
+    scheduler = FrameScheduler(target_fps=100, clock=fake_time.clock, sleep=fake_time.sleep)
+    scheduler.wait()
+
+    # one very slow frame
+    fake_time.now += 0.055
+    assert abs(scheduler.wait() - 0.055) < 1e-9
+    assert scheduler.skipped_frames == 4
+
+    # back on the 10ms grid without rendering the missed frames back to back
+    fake_time.now += 0.001
+    scheduler.wait()
+    assert abs(fake_time.now - 0.06) < 1e-9
@@ -0,0 +1,41 @@
+import pytest
+
+from lib.color import Color
+from lib.gradient import Gradient, GradientBuffer, interpolate_gradients, interpolate_gradients_into
+
+GRADIENT_1 = Gradient(seconds=10, color_1=Color(255, 0, 21), color_2=Color(11, 53, 255), brightness=0.2,
+                      scroll_speed=0.01)
+GRADIENT_2 = Gradient(seconds=20, color_1=Color(0, 30, 255), color_2=Color(255, 255, 0), brightness=1.0,
+                      scroll_speed=0)
+
+
+def test_color_validation_is_explicit():
+    assert Color.validated(0, 128, 255) == Color(0, 128, 255)
+
+    with pytest.raises(ValueError):
+        Color.validated(0, 256, 0)
+    with pytest.raises(ValueError):
+        Color.validated(-1, 0, 0)
+
+
+def test_gradients_are_immutable():
+    with pytest.raises(AttributeError):
+        GRADIENT_1.seconds = 5
+
+    assert GRADIENT_1._replace(seconds=5).seconds == 5
+    assert GRADIENT_1.seconds == 10
+
+
+def test_interpolate_into_buffer_matches_interpolate():
+    buffer = GradientBuffer()
+
+    for ratio in [0, 0.25, 0.5, 0.99, 1]:
+        expected = interpolate_gradients(GRADIENT_1, GRADIENT_2, ratio)
+        result = interpolate_gradients_into(buffer, GRADIENT_1, GRADIENT_2, ratio)
+
+        assert result is buffer
+        assert buffer.seconds == expected.seconds
+        assert buffer.color_1.to_rgb_tuple() == expected.color_1.to_rgb_tuple()
+        assert buffer.color_2.to_rgb_tuple() == expected.color_2.to_rgb_tuple()
+        assert (buffer.brightness, buffer.scroll_speed, buffer.effect) == (
+            expected.brightness, expected.scroll_speed, expected.effect)
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from lib.layout import Layout, parse_layout_csv, parse_layout_json, snake_layout
+
+np = pytest.importorskip('numpy')
+
+from lib.frame import mirror_indices
+
+
+def test_snake_layout_matches_mirrored_frame():
+    for num_pixels in [120, 7]:
+        layout = snake_layout(num_pixels)
+        samples = np.random.RandomState(num_pixels).randint(0, 256, (layout.resolution, 3)).astype(np.uint8)
+
+        assert layout.exact
+        assert (layout.apply(samples) == samples[mirror_indices(num_pixels)]).all()
+
+
+def test_json_segments_across_strips():
+    pixel_map = {
+        'resolution': 60,
+        'segments': [
+            {'count': 60, 'start': 0, 'end': 59},
+            {'count': 60, 'start': 59, 'end': 0},
+            {'count': 3, 'start': 10, 'end': 11, 'strip': 1},
+        ],
+    }
+    layout = parse_layout_json(json.dumps(pixel_map))
+
+    assert layout.num_pixels == 123
+    assert layout.strip_numbers == [0, 1]
+    assert not layout.exact
+
+    strip_0 = layout.strip(0)
+    assert strip_0.exact
+    assert (strip_0.indices == snake_layout(120).indices).all()
+
+    strip_1 = layout.strip(1)
+    samples = np.zeros((60, 3), dtype=np.uint8)
+    samples[11] = 200
+    assert strip_1.apply(samples)[:, 0].tolist() == [0, 100, 200]
+    assert strip_1.apply_colors([tuple(rgb) for rgb in samples.tolist()]) == [(0, 0, 0), (100,) * 3, (200,) * 3]
+
+
+def test_csv_positions_wrap_around():
+    layout = parse_layout_csv('position\n0\n3.5\n7\n')
+
+    assert layout.resolution == 8
+    assert layout.indices.tolist() == [0, 3, 7]
+    assert layout.next_indices.tolist() == [1, 4, 0]
+
+
+def test_bad_layouts():
+    with pytest.raises(ValueError):
+        Layout([], resolution=10)
+    with pytest.raises(ValueError):
+        parse_layout_csv('position\nnan\n')
+    with pytest.raises(KeyError):
+        parse_layout_json('{"segments": [{"start": 0}]}')
@@ -0,0 +1,36 @@
+from lib.metrics import FrameMetrics, LatencyHistogram
+
+
+def test_histogram_recent_window_rolls_over():
+    histogram = LatencyHistogram(buckets=(0.001, 0.01), window=4)
+
+    for _ in range(4):
+        histogram.observe(0.0005)
+    assert histogram.recent_quantile(0.99) == 0.001
+
+    for _ in range(4):
+        histogram.observe(0.005)
+    assert histogram.recent_quantile(0.5) == 0.01
+    assert histogram.counts == [4, 4, 0]
+    assert histogram.count == 8
+
+    histogram.observe(1.0)
+    assert histogram.recent_quantile(0.99) == float('inf')
+
+
+def test_prometheus_text():
+    metrics = FrameMetrics()
+    metrics.observe('render', 0.002)
+    metrics.observe('render', 0.02)
+    metrics.frame(0.01)
+    metrics.frame(0.01)
+    metrics.state_version = 3
+
+    text = metrics.to_prometheus()
+
+    assert 'lighthaus_stage_latency_seconds_bucket{stage="render",le="0.0025"} 1' in text
+    assert 'lighthaus_stage_latency_seconds_bucket{stage="render",le="+Inf"} 2' in text
+    assert 'lighthaus_stage_latency_seconds_count{stage="show"} 0' in text
+    assert 'lighthaus_frames_total 2' in text
+    assert 'lighthaus_state_version 3' in text
+    assert abs(metrics.fps - 100) < 1e-6
@@ -0,0 +1,48 @@
+import pytest
+
+from lib.output_lut import FRACTION_BITS, OutputLUT, get_output_levels, get_output_table
+
+np = pytest.importorskip('numpy')
+
+
+def test_table_applies_brightness_and_gamma():
+    table = get_output_table(1024, 1.0)
+    assert table == bytes(range(256))
+
+    table = get_output_table(512, 2.0)
+    assert table[0] == 0
+    assert table[255] == 128
+    assert table[128] == round(255 * 0.5 * (128 / 255) ** 2)
+
+
+def test_without_dithering_frames_are_rounded():
+    lut = OutputLUT(gamma=1.0, dither=False)
+
+    assert lut.apply(bytes([0, 100, 255]), brightness=0.5) == bytes([0, 50, 128])
+    assert not lut.needs_refresh
+
+
+def test_dithering_averages_to_the_exact_level():
+    lut = OutputLUT(brightness=0.05, gamma=2.2)
+    rgb = bytes(range(0, 256, 5)) * 3
+
+    frames = [lut.apply(rgb)] + [lut.refresh() for _ in range(255)]
+    assert lut.needs_refresh
+
+    average = np.mean([np.frombuffer(frame, dtype=np.uint8) for frame in frames], axis=0)
+    exact = get_output_levels(51, 2.2)[np.frombuffer(rgb, dtype=np.uint8)] / (1 << FRACTION_BITS)
+    assert np.abs(average - exact).max() < 1 / 256 + 1e-9
+
+    # rounding alone shows far fewer distinct levels than dithering does on average
+    rounded = np.frombuffer(OutputLUT(brightness=0.05, dither=False).apply(rgb), dtype=np.uint8)
+    assert len(set(rounded.tolist())) < len(set(np.round(average, 2).tolist()))
+
+
+def test_settled_frame_is_rounded():
+    lut = OutputLUT(brightness=0.05, gamma=2.2)
+    rgb = bytes(range(0, 256, 5)) * 3
+
+    lut.apply(rgb)
+    lut.refresh()
+    assert lut.settle() == OutputLUT(brightness=0.05, gamma=2.2, dither=False).apply(rgb)
+    assert not lut.needs_refresh
@@ -0,0 +1,148 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from lib.color import Color
+from lib.gradient import Gradient
+from lib.layout import snake_layout
+from lib.pipeline import FrameRing, RenderPipeline, RingWriter, _receive_snapshots, _snapshot_message
+from lib.state import SharedState, initial_control_state
+
+pytest.importorskip('multiprocessing.shared_memory')
+
+
+def test_ring_hands_over_newest_frame():
+    ring = FrameRing(6, slots=2)
+    reader = FrameRing(6, slots=2, name=ring.name)
+    frame = bytearray(6)
+
+    try:
+        assert reader.read_latest(0, frame) == 0
+
+        ring.write(bytes([1] * 6))
+        ring.write(bytes([2] * 6))
+        assert reader.read_latest(0, frame) == 2
+        assert frame == bytes([2] * 6)
+        assert reader.read_latest(2, frame) == 0
+    finally:
+        reader.close()
+        ring.close()
+
+
+def _write_frames(ring_name, count):
+    ring = FrameRing(3, name=ring_name)
+    for i in range(1, count + 1):
+        ring.write(bytes([i, i, i]))
+
+
+def test_ring_across_processes():
+    ring = FrameRing(3)
+    try:
+        process = multiprocessing.Process(target=_write_frames, args=(ring.name, 10))
+        process.start()
+        process.join()
+
+        frame = bytearray(3)
+        assert ring.read_latest(0, frame) == 10
+        assert frame == bytes([10, 10, 10])
+    finally:
+        ring.close()
+
+
+def test_ring_writer_publishes_rendered_frames():
+    layout = snake_layout(8)
+    ring = FrameRing(layout.num_pixels * 3)
+    writer = RingWriter(ring, layout)
+    gradient = Gradient(seconds=0, color_1=Color(255, 0, 0), color_2=Color(0, 0, 255), brightness=1.0,
+                        scroll_speed=0)
+
+    try:
+        writer.write_gradient(gradient, offset=0.1)
+
+        frame = bytearray(ring.frame_size)
+        assert ring.read_latest(0, frame) == 1
+        assert frame == writer.render_gradient(gradient, offset=0.1)
+    finally:
+        ring.close()
+
+
+def test_snapshots_keep_fields_unless_they_changed():
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    state = SharedState(initial_control_state())
+    initial = state.current
+
+    first = initial._replace(version=1, schedule='schedule')
+    second = first._replace(version=2, fast_mode_ref=1)
+    sender.send(_snapshot_message(initial, first))
+    sender.send(_snapshot_message(first, second))
+    sender.close()
+
+    with pytest.raises(EOFError):
+        _receive_snapshots(receiver, state)
+
+    assert state.current.version == 2
+    assert state.current.schedule == 'schedule'
+    assert state.current.fast_mode_ref == 1
+
+
+def test_forwarded_snapshots_do_not_repeat_user_gradients():
+    from lighthaus import LighthausController
+    from lib.clock import SimulatedClock
+    from lib.writer import NullWriter
+
+    controller = LighthausController(writer=NullWriter(8), initial_color_1=Color(255, 0, 0),
+                                     initial_color_2=Color(0, 0, 255), clock=SimulatedClock(12 * 3600.0))
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+
+    def receive():
+        with pytest.raises(EOFError):
+            _receive_snapshots(receiver, controller.state)
+
+    thread = threading.Thread(target=receive, daemon=True)
+    thread.start()
+
+    # the control plane of the main process, its snapshots reach the controller only through the pipe
+    state = SharedState(controller.state.current)
+    gradient = Gradient(seconds=0, color_1=Color(0, 255, 0), color_2=Color(0, 255, 0), brightness=0.5,
+                        scroll_speed=0)
+
+    previous = state.current
+    frame_clocks = []
+    for changes in [dict(user_gradient=gradient), dict(fast_mode_ref=1), dict(fade_in_duration=1.0),
+                    dict(schedule=None)]:
+        snapshot = state.publish(**changes)
+        sender.send(_snapshot_message(previous, snapshot))
+        previous = snapshot
+
+        assert controller.state.wait_for_change(snapshot.version - 1, timeout=5.0)
+        controller.render_frame(0.01)
+        frame_clocks.append(controller.frame_clock)
+
+    assert len(controller.compositor.layers) == 1
+    # fast mode started once and was not restarted by the publishes after it
+    assert frame_clocks[0] is controller.clock
+    assert frame_clocks[1] is frame_clocks[2] is frame_clocks[3] is not controller.clock
+
+    sender.close()
+    thread.join(timeout=5.0)
+
+
+def test_first_frame_is_signalled_once():
+    layout = snake_layout(8)
+    ring = FrameRing(layout.num_pixels * 3)
+    first_frame = multiprocessing.Event()
+    writer = RingWriter(ring, layout, first_frame=first_frame)
+    gradient = Gradient(seconds=0, color_1=Color(255, 0, 0), color_2=Color(0, 0, 255), brightness=1.0,
+                        scroll_speed=0)
+
+    pipeline = RenderPipeline(None, 'null', [layout])
+    pipeline.first_frames.append(first_frame)
+    try:
+        assert not pipeline.wait_for_first_frame(timeout=0.01)
+
+        writer.write_gradient(gradient, offset=0.1)
+        assert pipeline.wait_for_first_frame(timeout=0.01)
+        assert writer.first_frame is None
+    finally:
+        ring.close()
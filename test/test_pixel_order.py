@@ -0,0 +1,18 @@
+from lib.pixel_order import get_channel_offsets, pack_frame
+
+
+RGB = bytes([255, 128, 0, 1, 2, 3])
+
+
+def test_channel_offsets():
+    assert get_channel_offsets('RGB') == (0, 1, 2)
+    assert get_channel_offsets('GRB') == (1, 0, 2)
+    assert get_channel_offsets('GRBW') == (1, 0, 2, 3)
+    assert get_channel_offsets((1, 0, 2)) == (1, 0, 2)
+
+
+def test_pack_frame_reorders_channels():
+    assert pack_frame(RGB, get_channel_offsets('RGB')) == RGB
+    assert pack_frame(RGB, get_channel_offsets('GRB')) == bytes([128, 255, 0, 2, 1, 3])
+    assert pack_frame(memoryview(RGB), get_channel_offsets('BGR')) == bytes([0, 128, 255, 3, 2, 1])
+    assert pack_frame(RGB, get_channel_offsets('GRBW')) == bytes([128, 255, 0, 0, 2, 1, 3, 0])
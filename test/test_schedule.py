@@ -0,0 +1,114 @@
+import datetime
+import os
+
+from lib.color import Color
+from lib.gradient import Gradient, interpolate_gradients
+from lib.schedule import ScheduleLoader, compile_schedule, get_scheduled_gradient
+
+SCHEDULE = '''timeslot,red_1,green_1,blue_1,red_2,green_2,blue_2,scroll_speed,brightness
+3:00,255,0,21,255,0,234,0.01,20
+SR,11,53,255,255,0,234,0.002,80
+SS,255,0,126,0,0,125,0.008,50
+'''
+
+DATE = datetime.date(2019, 6, 21)
+
+
+def write_schedule(path, text, mtime):
+    path.write_text(text)
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_loader_only_recompiles_on_change(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+
+    loader = ScheduleLoader(str(schedule_path))
+    assert loader.poll(DATE)
+    compiled = loader.schedule
+    assert len(compiled.gradients) == 3
+    assert [g.seconds for g in compiled.gradients] == sorted(g.seconds for g in compiled.gradients)
+
+    assert not loader.poll(DATE)
+
+    # touched but same content
+    write_schedule(schedule_path, SCHEDULE, 2000)
+    assert not loader.poll(DATE)
+    assert loader.schedule is compiled
+
+    # new day moves sunrise and sunset
+    assert loader.poll(DATE + datetime.timedelta(days=1))
+
+    write_schedule(schedule_path, SCHEDULE.replace('0.01,20', '0.01,30'), 3000)
+    assert loader.poll(DATE + datetime.timedelta(days=1))
+    assert loader.schedule.gradients[0].brightness == 0.3
+
+
+def test_loader_keeps_last_good_schedule(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+
+    loader = ScheduleLoader(str(schedule_path))
+    assert loader.poll(DATE)
+    good = loader.schedule
+
+    write_schedule(schedule_path, SCHEDULE + 'noon,1,2,3\n', 2000)
+    assert not loader.poll(DATE)
+    assert loader.schedule is good
+    assert loader.error is not None
+
+    write_schedule(schedule_path, SCHEDULE.replace('255,0,21', '256,0,21'), 3000)
+    assert not loader.poll(DATE)
+    assert loader.schedule is good
+
+    os.remove(str(schedule_path))
+    assert not loader.poll(DATE)
+    assert loader.schedule is good
+
+
+def reference_scheduled_gradient(gradients, seconds_into_day):
+    # linear scan over the keyframes, wrapping around midnight
+    day = 24 * 60 * 60
+    earlier = [g for g in gradients if g.seconds <= seconds_into_day]
+    later = [g for g in gradients if g.seconds > seconds_into_day]
+
+    gradient_1 = earlier[-1] if earlier else gradients[-1]
+    gradient_2 = later[0] if later else gradients[0]
+
+    start = gradient_1.seconds if earlier else gradient_1.seconds - day
+    end = gradient_2.seconds if later else gradient_2.seconds + day
+    ratio = (seconds_into_day - start) / (end - start) if end > start else 0
+
+    return interpolate_gradients(gradient_1, gradient_2, ratio)
+
+
+def test_keyframe_lookup_matches_linear_scan():
+    gradients = tuple(
+        Gradient(
+            seconds=minute * 60,
+            color_1=Color(minute % 256, 0, 0),
+            color_2=Color(0, (minute * 7) % 256, 0),
+            brightness=(minute % 100) / 100.0,
+            scroll_speed=0.001 * (minute % 5),
+        )
+        for minute in range(3, 24 * 60, 7)
+    )
+    schedule = compile_schedule(gradients)
+
+    for seconds_into_day in [0, 1, 179.5, 180, 181, 43210.25, 86000, 86399.9] + list(range(0, 86400, 997)):
+        actual = get_scheduled_gradient(schedule, seconds_into_day)
+        expected = reference_scheduled_gradient(gradients, seconds_into_day)
+
+        assert actual.color_1.to_rgb_tuple() == expected.color_1.to_rgb_tuple()
+        assert actual.color_2.to_rgb_tuple() == expected.color_2.to_rgb_tuple()
+        assert abs(actual.brightness - expected.brightness) < 1e-9
+        assert abs(actual.scroll_speed - expected.scroll_speed) < 1e-9
+
+
+def test_keyframe_lookup_single_keyframe():
+    gradient = Gradient(seconds=3600, color_1=Color(1, 2, 3), color_2=Color(4, 5, 6), brightness=0.5,
+                        scroll_speed=0)
+    schedule = compile_schedule((gradient,))
+
+    for seconds_into_day in [0, 3600, 80000]:
+        assert get_scheduled_gradient(schedule, seconds_into_day).color_1.to_rgb_tuple() == (1, 2, 3)
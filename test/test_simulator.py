@@ -0,0 +1,80 @@
+from functools import partial
+
+import pytest
+
+from lighthaus import LighthausController
+from lib.color import Color
+from lib.gradient import Gradient
+from lib.schedule import compile_schedule
+from lib.simulator import StripImage, UserInput, count_samples, parse_time_of_day, simulate
+
+SCHEDULE = compile_schedule((
+    Gradient(seconds=0, color_1=Color(0, 0, 0), color_2=Color(0, 0, 0), brightness=1.0, scroll_speed=0.0),
+    Gradient(seconds=7200, color_1=Color(200, 0, 0), color_2=Color(0, 0, 200), brightness=1.0,
+             scroll_speed=0.0),
+))
+
+make_controller = partial(LighthausController, initial_color_1=Color(0, 0, 0), initial_color_2=Color(0, 0, 0))
+
+
+def test_parse_time_of_day():
+    assert parse_time_of_day('1:30') == 5400
+    assert parse_time_of_day('24:00') == 86400
+    with pytest.raises(ValueError):
+        parse_time_of_day('25:00')
+
+
+def test_simulated_hour_with_user_input(tmp_path):
+    samples = []
+    user_gradient = Gradient(seconds=0, color_1=Color(0, 255, 0), color_2=Color(0, 255, 0), brightness=1.0,
+                             scroll_speed=0.0)
+
+    result = simulate(
+        make_controller, SCHEDULE, start=0, end=3600, fps=2, sample_interval=10, num_pixels=4,
+        user_inputs=[UserInput(600, user_gradient)],
+        on_sample=lambda seconds, gradient, offset, frame: samples.append(
+            (seconds, gradient.color_1.to_rgb_tuple(), frame)),
+    )
+
+    assert result.frames == 7200
+    assert result.samples == len(samples) == count_samples(0, 3600, 2, 10) == 360
+    assert samples[0][0] == 0
+    assert samples[180][:2] == (1800, (50, 0, 0))
+
+    # faded in after 5 seconds, sustained for 30 and faded out over 20
+    assert samples[60][1] != (0, 255, 0)
+    assert samples[61][1] == (0, 255, 0)
+    assert samples[61][2] == bytes([0, 255, 0] * 4)
+    assert samples[66][1] == (18, 0, 0)
+
+
+def test_simulation_runs_across_midnight():
+    samples = []
+    user_gradient = Gradient(seconds=0, color_1=Color(0, 255, 0), color_2=Color(0, 255, 0), brightness=1.0,
+                             scroll_speed=0.0)
+
+    result = simulate(
+        make_controller, SCHEDULE, start=23 * 3600, end=3600, fps=1, sample_interval=600, num_pixels=4,
+        user_inputs=[UserInput(1790, user_gradient), UserInput(84590, user_gradient._replace(brightness=0.9))],
+        on_sample=lambda seconds, gradient, offset, frame: samples.append((seconds, frame)),
+    )
+
+    assert result.frames == 7200
+    assert result.simulated_seconds == 7200
+    assert len(samples) == count_samples(23 * 3600, 3600, 1, 600) == 12
+    assert [seconds for seconds, frame in samples[5:8]] == [85800, 0, 600]
+    # the input before 23:30 shows before midnight, the one before 0:30 after it
+    assert samples[3][1] == bytes([0, 230, 0] * 4)
+    assert samples[9][1] == bytes([0, 255, 0] * 4)
+    assert samples[4][1][1] == samples[10][1][1] == 0
+
+
+def test_strip_image_ppm(tmp_path):
+    path = str(tmp_path / 'day.ppm')
+    image = StripImage(path, 2, 2)
+    image.add_row(bytes([1] * 6))
+    image.add_row(bytes([2] * 6))
+    image.close()
+
+    with open(path, 'rb') as image_file:
+        assert image_file.read() == b'P6\n2 2\n255\n' + bytes([1] * 6) + bytes([2] * 6)
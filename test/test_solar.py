@@ -0,0 +1,46 @@
+import datetime
+
+import pytest
+
+from lib.solar import Location, get_sun_times
+
+
+PDT = datetime.timezone(datetime.timedelta(hours=-7))
+PST = datetime.timezone(datetime.timedelta(hours=-8))
+
+
+def hours_and_minutes(seconds):
+    return seconds // 3600, (seconds % 3600) // 60
+
+
+def assert_close_to(seconds, hour, minute, tolerance_minutes=2):
+    assert abs(seconds - (hour * 3600 + minute * 60)) <= tolerance_minutes * 60, hours_and_minutes(seconds)
+
+
+def test_san_francisco_summer_solstice():
+    sunrise, sunset = get_sun_times(datetime.date(2019, 6, 21), Location(37.7749, -122.4194, PDT))
+
+    assert_close_to(sunrise, 5, 48)
+    assert_close_to(sunset, 20, 35)
+
+
+def test_san_francisco_winter_solstice():
+    sunrise, sunset = get_sun_times(datetime.date(2019, 12, 21), Location(37.7749, -122.4194, PST))
+
+    assert_close_to(sunrise, 7, 21)
+    assert_close_to(sunset, 16, 54)
+
+
+def test_polar_night_does_not_raise():
+    sunrise, sunset = get_sun_times(datetime.date(2019, 12, 21), Location(78.22, 15.65, datetime.timezone.utc))
+
+    assert sunrise <= sunset
+
+
+def test_timezone_name():
+    pytest.importorskip('dateutil')
+
+    by_name = get_sun_times(datetime.date(2019, 6, 21), Location(37.7749, -122.4194, 'US/Pacific'))
+    by_offset = get_sun_times(datetime.date(2019, 6, 21), Location(37.7749, -122.4194, PDT))
+
+    assert by_name == by_offset
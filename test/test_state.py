@@ -0,0 +1,28 @@
+import threading
+
+from lib.state import SharedState, initial_control_state
+
+
+def test_publish_swaps_in_a_new_snapshot():
+    state = SharedState(initial_control_state())
+    before = state.current
+
+    after = state.publish(user_gradient='gradient')
+
+    assert state.current is after
+    assert after.version == 1
+    assert after.user_gradient == 'gradient'
+    assert before.user_gradient is None
+    assert after.fade_in_duration == before.fade_in_duration
+
+
+def test_wait_for_change():
+    state = SharedState(initial_control_state())
+    assert not state.wait_for_change(0, timeout=0.01)
+
+    timer = threading.Timer(0.01, state.publish, kwargs={'fast_mode_ref': 1})
+    timer.start()
+    assert state.wait_for_change(0, timeout=5)
+    timer.join()
+
+    assert state.current.fast_mode_ref == 1
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from lib.color import Color
+from lib.gradient import Gradient
+from lib.metrics import FrameMetrics
+from lib.stream import StreamReceiver, StreamSender, pack_frame, pack_params
+from lib.writer import Writer
+
+
+class ListWriter(Writer):
+    def __init__(self, num_pixels):
+        super().__init__(num_pixels)
+        self.frames = []
+
+    def write_rgb(self, rgb):
+        self.frames.append(bytes(rgb))
+
+
+def frame(value, num_pixels=4):
+    return bytes([value]) * (num_pixels * 3)
+
+
+def test_frames_are_written_in_order_and_time_out(clock):
+    writer = ListWriter(4)
+    metrics = FrameMetrics()
+    receiver = StreamReceiver(writer, timeout=1.0, metrics=metrics, clock=clock, wall_clock=lambda: 50.25)
+    assert not receiver.is_active()
+
+    assert receiver.handle(memoryview(pack_frame(1, frame(10), sent=50.0)), clock())
+    assert receiver.handle(memoryview(pack_frame(3, frame(30))), clock())
+    # late and repeated packets are dropped
+    assert not receiver.handle(memoryview(pack_frame(2, frame(20))), clock())
+    assert not receiver.handle(memoryview(pack_frame(3, frame(30))), clock())
+    # wrong size, garbage
+    assert not receiver.handle(memoryview(pack_frame(4, frame(40, num_pixels=5))), clock())
+    assert not receiver.handle(memoryview(b'nonsense' * 4), clock())
+
+    assert writer.frames == [frame(10), frame(30)]
+    assert receiver.is_active()
+    assert (metrics.stream_frames, metrics.stream_dropped_packets, metrics.stream_bad_packets) == (2, 2, 2)
+    assert metrics.stream_latency['input_to_photon'].count == 1
+    assert metrics.stream_latency['input_to_photon'].sum == pytest.approx(0.25)
+    assert metrics.stream_latency['receive_to_show'].count == 2
+
+    # the sequence wraps around, and after the timeout a restarted sender is accepted from anywhere
+    assert receiver.handle(memoryview(pack_frame(2 ** 32 + 5, frame(50))), clock())
+    clock.now += 1.0
+    assert not receiver.is_active()
+    assert receiver.handle(memoryview(pack_frame(1, frame(60))), clock())
+    assert writer.frames[-2:] == [frame(50), frame(60)]
+
+
+def test_params_render_like_a_gradient(clock):
+    pytest.importorskip('numpy')
+
+    writer = ListWriter(4)
+    receiver = StreamReceiver(writer, clock=clock)
+    gradient = Gradient(seconds=0, color_1=Color(255, 0, 0), color_2=Color(0, 0, 255), brightness=0.5,
+                        scroll_speed=0.0, effect='chase')
+
+    assert receiver.handle(memoryview(pack_params(1, gradient, 0.25)), 0.0)
+    assert writer.frames == [writer.render_gradient(gradient, 0.25)]
+
+    assert not receiver.handle(memoryview(pack_params(2, gradient._replace(effect='strobe'), 0.25)), 0.0)
+    assert not receiver.handle(memoryview(pack_params(3, gradient, float('nan'))), 0.0)
+
+
+def test_controller_leaves_the_strip_to_the_stream(clock):
+    from test_controller import make_controller
+    from lib.writer import NullWriter
+
+    writer = NullWriter(4)
+    controller = make_controller(writer)
+    controller.stream = StreamReceiver(writer, timeout=1.0, lock=controller.write_lock, clock=clock)
+
+    controller.render_frame(0.01)
+    assert writer.frames == 1
+
+    controller.stream.handle(memoryview(pack_frame(1, frame(10))), clock())
+    controller.render_frame(0.01)
+    assert writer.frames == 2
+
+    # the scene comes back after the timeout
+    clock.now += 1.0
+    assert controller.render_frame(0.01)
+    assert writer.frames == 3
+
+
+def test_udp_round_trip():
+    writer = ListWriter(4)
+    receiver = StreamReceiver(writer, port=0, host='127.0.0.1')
+    try:
+        receiver.bind()
+    except OSError:
+        pytest.skip('no udp sockets')
+    receiver.start()
+
+    sender = StreamSender('127.0.0.1', receiver.port)
+    sender.send_frame(frame(7))
+    deadline = time.monotonic() + 2.0
+    while not writer.frames and time.monotonic() < deadline:
+        time.sleep(0.001)
+    sender.close()
+    receiver.close()
+
+    assert writer.frames == [frame(7)]
@@ -0,0 +1,88 @@
+import os
+import pickle
+
+from test_schedule import DATE, SCHEDULE, write_schedule
+
+from lib.gradient import GradientBuffer
+from lib.schedule import ScheduleLoader, get_scheduled_gradient
+from lib.timeline import build_timeline, load_timeline
+
+
+def test_timeline_matches_interpolated_schedule(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+
+    loader = ScheduleLoader(str(schedule_path), timeline_resolution=60)
+    assert loader.poll(DATE)
+    timeline = loader.schedule.timeline
+    interpolated = loader.schedule._replace(timeline=None)
+
+    assert timeline.num_records == 24 * 60
+    buffer = GradientBuffer()
+    for seconds_into_day in [0, 59.9, 60, 10800, 43210.5, 86399]:
+        expected = get_scheduled_gradient(interpolated, seconds_into_day // 60 * 60)
+        actual = get_scheduled_gradient(loader.schedule, seconds_into_day, target=buffer)
+
+        assert actual.seconds == seconds_into_day
+        assert actual.color_1.to_rgb_tuple() == expected.color_1.to_rgb_tuple()
+        assert actual.color_2.to_rgb_tuple() == expected.color_2.to_rgb_tuple()
+        assert abs(actual.brightness - expected.brightness) < 1e-6
+        assert abs(actual.scroll_speed - expected.scroll_speed) < 1e-6
+
+
+def test_restart_maps_existing_timeline(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+    timeline_path = str(schedule_path) + '.timeline'
+
+    assert ScheduleLoader(str(schedule_path), timeline_resolution=60).poll(DATE)
+    os.utime(timeline_path, (1, 1))
+
+    loader = ScheduleLoader(str(schedule_path), timeline_resolution=60)
+    assert loader.poll(DATE)
+    assert os.stat(timeline_path).st_mtime == 1
+
+    schedule = loader.schedule
+    assert load_timeline(timeline_path, schedule.content_hash, DATE, schedule.sun_times, 30) is None
+    assert load_timeline(timeline_path, '0' * 40, DATE, schedule.sun_times, 60) is None
+
+    # other processes map the same file
+    copy = pickle.loads(pickle.dumps(schedule))
+    assert copy.timeline.file_name == timeline_path
+    assert copy.timeline.gradient_at(5000) == schedule.timeline.gradient_at(5000)
+
+
+def test_rebuild_replaces_file(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+    loader = ScheduleLoader(str(schedule_path), timeline_resolution=None)
+    assert loader.poll(DATE)
+    assert loader.schedule.timeline is None
+
+    timeline_path = str(tmp_path / 'day.timeline')
+    old = build_timeline(timeline_path, loader.schedule, resolution=3600)
+    new = build_timeline(timeline_path, loader.schedule, resolution=1800)
+
+    assert old.num_records == 24
+    assert new.num_records == 48
+    assert old.gradient_at(7200) == new.gradient_at(7200)
+
+
+def test_deferred_timeline_is_built_later_and_restored_on_restart(tmp_path):
+    schedule_path = tmp_path / 'schedule.csv'
+    write_schedule(schedule_path, SCHEDULE, 1000)
+    timeline_path = str(schedule_path) + '.timeline'
+
+    loader = ScheduleLoader(str(schedule_path), timeline_resolution=60, defer_timeline=True)
+    assert loader.poll(DATE)
+    assert loader.schedule.timeline is None and loader.timeline_pending
+    assert not os.path.exists(timeline_path)
+
+    assert loader.build_pending_timeline()
+    assert loader.schedule.timeline.num_records == 24 * 60
+    assert not loader.build_pending_timeline()
+
+    # a restart on the same day maps the cached day right away
+    restarted = ScheduleLoader(str(schedule_path), timeline_resolution=60, defer_timeline=True)
+    assert restarted.poll(DATE)
+    assert restarted.schedule.timeline is not None and not restarted.timeline_pending
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from lib.color import Color
+from lib.gradient import Gradient
+from lib.state import SharedState, initial_control_state
+from lib.user_input import GradientInbox, RateLimiter
+
+
+def gradient(green):
+    return Gradient(seconds=0, color_1=Color(0, green, 0), color_2=Color(0, green, 0), brightness=1.0,
+                    scroll_speed=0.0)
+
+
+def test_rate_limiter_refills_per_client(clock):
+    limiter = RateLimiter(rate=10, burst=2, clock=clock)
+
+    assert [limiter.allow('a') for _ in range(3)] == [True, True, False]
+    assert limiter.allow('b')
+    assert limiter.limited == 1
+
+    clock.now = 0.1
+    assert limiter.allow('a')
+    assert not limiter.allow('a')
+
+
+def test_inbox_publishes_latest_gradient_once_per_window(clock):
+    state = SharedState(initial_control_state())
+    inbox = GradientInbox(state, window=0.05, clock=clock)
+
+    inbox.submit(gradient(1))
+    assert inbox.flush() is None
+    assert state.current.user_gradient == gradient(1)
+
+    clock.now = 0.01
+    for green in range(2, 10):
+        inbox.submit(gradient(green))
+    assert inbox.flush() == pytest.approx(0.05)
+    assert state.current.version == 1
+
+    clock.now = 0.05
+    inbox.flush()
+    assert state.current.version == 2
+    assert state.current.user_gradient == gradient(9)
+    assert inbox.coalesced == 7
+
+
+def test_inbox_plays_sequence_and_new_submission_replaces_it(clock):
+    state = SharedState(initial_control_state())
+    inbox = GradientInbox(state, window=0.05, clock=clock)
+
+    inbox.submit_sequence([(0, gradient(1)), (1, gradient(2)), (2, gradient(3))])
+    assert inbox.flush() == 1
+    assert state.current.user_gradient == gradient(1)
+
+    clock.now = 1
+    assert inbox.flush() == 2
+    assert state.current.user_gradient == gradient(2)
+
+    inbox.submit(gradient(4))
+    clock.now = 1.5
+    assert inbox.flush() is None
+    assert state.current.user_gradient == gradient(4)
+
+
+def test_gradient_endpoint_answers_202_and_limits(clock):
+    flask = pytest.importorskip('flask')
+    from lib.server import add_routes
+
+    state = SharedState(initial_control_state())
+    inbox = GradientInbox(state, clock=clock)
+    app = flask.Flask(__name__)
+    add_routes(app, state, inbox=inbox, limiter=RateLimiter(rate=1, burst=2, clock=clock))
+    client = app.test_client()
+
+    body = {'color': [{'r': 0, 'g': 10, 'b': 0}, {'r': 0, 'g': 20, 'b': 0}], 'brightness': 1}
+    assert client.post('/', json=body).status_code == 202
+    assert client.post('/', json={'color': [{'r': 300, 'g': 0, 'b': 0}]}).status_code == 400
+    assert client.post('/', json=body).status_code == 429
+
+    inbox.flush()
+    assert state.current.user_gradient.color_2 == Color(0, 20, 0)
+
+    clock.now = 10
+    batch = {'gradients': [dict(body, delay=0), dict(body, delay=2)]}
+    response = client.post('/batch', json=batch)
+    assert response.status_code == 202
+    assert response.get_json()['queued'] == 2
+
+    clock.now = 11
+    bad_batch = {'gradients': [dict(body, delay=1), dict(body, delay=0)]}
+    assert client.post('/batch', json=bad_batch).status_code == 400
+
+    clock.now = 12
+    assert client.post('/batch', json={'gradients': [1, 2]}).status_code == 400
+    clock.now = 13
+    assert client.post('/', json=[1, 2]).status_code == 400
+    assert client.post('/', json=dict(body, brightness=float('nan'))).status_code == 400
+
+    for now, delay in [(15, 1e300), (17, 'nan')]:
+        clock.now = now
+        assert client.post('/batch', json={'gradients': [dict(body, delay=delay)]}).status_code == 400
+        assert client.post('/batch', json={'gradients': [dict(body, scroll_speed=float('inf'))]}).status_code == 400
+
+    clock.now = 20
+    alert = dict(body, effect='sparkle', duration=5)
+    assert client.post('/alert', json=alert).status_code == 202
+    assert state.current.alert.duration == 5
+    assert state.current.alert.gradient.effect == 'sparkle'
+    assert client.post('/alert', json=dict(alert, effect='strobe')).status_code == 400
+
+    clock.now = 30
+    assert client.post('/alert', json=dict(alert, duration='nan')).status_code == 400
+    assert client.post('/alert', json=dict(alert, duration='inf')).status_code == 400
+
+
+def test_inbox_thread_survives_gradients_due_far_ahead():
+    state = SharedState(initial_control_state())
+    inbox = GradientInbox(state, window=0.0)
+    inbox.submit_sequence([(1e300, gradient(1))])
+    inbox.start()
+    # let the thread go to sleep until the gradient is due
+    time.sleep(0.1)
+
+    version = state.current.version
+    inbox.submit(gradient(2))
+    assert state.wait_for_change(version, timeout=5.0)
+    assert state.current.user_gradient == gradient(2)
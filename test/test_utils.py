@@ -0,0 +1,27 @@
+from lib.utils import generate_ratios, get_ratio_table, line_to_triangle, shift, sigmoid
+
+
+def exact_ratios(num_steps, offset, exponent=20.0):
+    return [
+        sigmoid(line_to_triangle(shift(step / num_steps, offset)), exponent)
+        for step in range(num_steps)
+    ]
+
+
+def test_ratio_table_matches_exact_profile():
+    for num_steps in [1, 7, 60, 500]:
+        for offset in [0, 0.013, 0.25, 0.5, 0.777, 0.999]:
+            for exact, ratio in zip(exact_ratios(num_steps, offset), generate_ratios(num_steps, offset)):
+                assert abs(exact - ratio) < 1e-4
+
+
+def test_ratio_table_exact_on_table_entries():
+    for exact, ratio in zip(exact_ratios(60, 0.5, exponent=10.0), generate_ratios(60, 0.5, exponent=10.0)):
+        assert abs(exact - ratio) < 1e-12
+
+
+def test_ratio_table_cache_is_bounded():
+    for num_steps in range(1, 100):
+        get_ratio_table(num_steps)
+
+    assert get_ratio_table.cache_info().currsize <= get_ratio_table.cache_info().maxsize
@@ -0,0 +1,38 @@
+import io
+
+from lib.color import Color
+from lib.gradient import Gradient
+from lib.terminal_writer import TerminalWriter
+from lib.writer import NullWriter, create_writer
+
+GRADIENT = Gradient(seconds=0, color_1=Color(255, 0, 0), color_2=Color(0, 0, 255), brightness=1.0,
+                    scroll_speed=0)
+
+
+def test_null_writer_counts_frames():
+    writer = create_writer('null', num_pixels=10)
+    assert isinstance(writer, NullWriter)
+
+    for _ in range(5):
+        writer.write_gradient(GRADIENT, offset=0.1)
+
+    assert writer.frames == 5
+    assert writer.bytes == 5 * 10 * 3
+
+
+def test_terminal_writer_redraws_changed_pixels_only():
+    out = io.StringIO()
+    writer = TerminalWriter(4, out=out, columns=4)
+
+    writer.write_rgb(bytes([255, 0, 0] * 4))
+    first = out.getvalue()
+    assert first.count('█') == 4
+    assert '\x1b[38;2;255;0;0m' in first
+
+    writer.write_rgb(bytes([255, 0, 0] * 3 + [0, 0, 255]))
+    second = out.getvalue()[len(first):]
+    assert second.count('█') == 1
+    assert '\x1b[38;2;0;0;255m' in second
+
+    writer.write_rgb(bytes([255, 0, 0] * 3 + [0, 0, 255]))
+    assert out.getvalue()[len(first) + len(second):] == ''